@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'DDSPosts.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,7 +59,8 @@ ROOT_URLCONF = 'DDS.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с замером времени рендеринга для метрик
+        'BACKEND': 'DDSPosts.templating.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -73,13 +78,95 @@ WSGI_APPLICATION = 'DDS.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
-
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+#
+# Бэкенд выбирается переменной окружения DDS_DATABASE:
+#   sqlite (по умолчанию) — файл db.sqlite3 для разработки;
+#   postgresql — рабочая конфигурация, параметры из DDS_DB_* (см. README).
+
+def env_bool(name, default=False):
+    """Логическое значение переменной окружения (1/true/yes/on)"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def env_int(name, default):
+    """Целое значение переменной окружения"""
+    value = os.environ.get(name)
+    return default if value in (None, '') else int(value)
+
+
+DDS_DATABASE = os.environ.get('DDS_DATABASE', 'sqlite')
+
+if DDS_DATABASE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DDS_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # Пишущая транзакция сразу берёт блокировку записи: ожидание
+                # идёт по busy_timeout, а не заканчивается «database is locked»
+                # при попытке повысить блокировку чтения до записи
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+elif DDS_DATABASE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DDS_DB_NAME', 'dds'),
+            'USER': os.environ.get('DDS_DB_USER', 'dds'),
+            'PASSWORD': os.environ.get('DDS_DB_PASSWORD', ''),
+            'HOST': os.environ.get('DDS_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DDS_DB_PORT', '5432'),
+            # Проверять постоянное соединение перед повторным использованием
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+            'TEST': {
+                'NAME': os.environ.get('DDS_DB_TEST_NAME', 'test_dds'),
+            },
+        }
+    }
+    if env_bool('DDS_DB_POOL'):
+        # Пул соединений psycopg (Django 5.1+): соединения общие для потоков
+        # процесса. С пулом CONN_MAX_AGE должен оставаться 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': env_int('DDS_DB_POOL_MIN_SIZE', 2),
+            'max_size': env_int('DDS_DB_POOL_MAX_SIZE', 10),
+            'timeout': env_int('DDS_DB_POOL_TIMEOUT', 10),
+        }
+    else:
+        # Постоянные соединения: одно на поток, живёт CONN_MAX_AGE секунд
+        DATABASES['default']['CONN_MAX_AGE'] = env_int('DDS_DB_CONN_MAX_AGE', 60)
+else:
+    raise ImproperlyConfigured(f'DDS_DATABASE: неизвестный бэкенд {DDS_DATABASE!r} (sqlite или postgresql)')
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# Версии справочников (DDSPosts/dictionaries.py) должны быть общими для всех
+# процессов: веб-процессов, import_transactions, run_workers. Кэш в памяти
+# процесса (LocMemCache) не подходит — изменения из другого процесса в нём
+# не видны. По умолчанию — файловый кэш (общий для процессов одной машины);
+# для нескольких машин — Redis: DDS_REDIS_URL=redis://host:6379/0 (пакет redis).
+
+if os.environ.get('DDS_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['DDS_REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('DDS_CACHE_DIR', BASE_DIR / 'cache'),
+        }
     }
-}
 
 
 # Password validation
@@ -122,3 +209,77 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Настройки приложения DDSPosts
+
+# Курсорная пагинация главной страницы по (-date, -id) вместо OFFSET
+DDS_CURSOR_PAGINATION = False
+
+# Считать общее число записей в курсорном режиме (COUNT(*) на каждый запрос)
+DDS_CURSOR_WITH_COUNT = False
+
+# Кэш справочников: алиас из CACHES (общий для всех процессов, см. CACHES
+# выше; о кэше в памяти процесса предупреждает проверка DDSPosts.W001) и время
+# жизни дерева одной версии, секунды
+DDS_DICTIONARY_CACHE = 'default'
+DDS_DICTIONARY_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Сколько секунд браузер и прокси могут отдавать JSON-дерево справочников
+# без перепроверки (после — условный запрос по ETag)
+DDS_DICTIONARY_MAX_AGE = 60
+
+# Кэш отрисованной таблицы главной страницы (DDSPosts/fragments.py): алиас из
+# CACHES (None — кэш выключен) и время жизни записи, секунды
+DDS_FRAGMENT_CACHE = 'default'
+DDS_FRAGMENT_CACHE_TIMEOUT = 300
+
+# Сколько секунд после отрисовки устаревшую таблицу можно отдавать, пока она
+# перерисовывается после ответа (0 — устаревшая таблица всегда перерисовывается сразу)
+DDS_FRAGMENT_STALE_SECONDS = 0
+
+# Читать список и выгрузку (без поиска) из витрины TransactionListing, где
+# названия справочников хранятся в строке, — без JOIN (DDSPosts/listing.py).
+# Витрина поддерживается при любом значении настройки
+DDS_LISTING_READ_MODEL = env_bool('DDS_LISTING_READ_MODEL')
+
+# Наибольшее число строк пакетного ввода транзакций за один запрос (/create/batch/)
+DDS_BATCH_MAX_ROWS = 500
+
+# Размер порции серверного курсора при потоковой выгрузке
+DDS_EXPORT_CHUNK_SIZE = 2000
+
+# Асинхронные представления для чтения (главная, AJAX, отчёт) — при запуске
+# под ASGI (uvicorn DDS.asgi:application). Под WSGI оставлять выключенным:
+# каждое асинхронное представление запускало бы свой цикл событий
+DDS_ASYNC_VIEWS = env_bool('DDS_ASYNC_VIEWS')
+
+# PRAGMA для каждого нового соединения SQLite — DDSPosts.sqlite.DEFAULT_PRAGMAS.
+# Переопределить отдельные значения: DDS_SQLITE_PRAGMAS = {'busy_timeout': 10000};
+# None — оставить значения SQLite по умолчанию
+
+# Метрики запросов (DDSPosts/metrics.py) и бюджет, сверх которого запрос
+# пишется в лог DDSPosts.metrics: время ответа, мс, и число запросов к БД
+DDS_METRICS_ENABLED = True
+DDS_METRICS_LATENCY_BUDGET_MS = 500
+DDS_METRICS_QUERY_BUDGET = 20
+
+# Токен для /metrics/ (заголовок Authorization: Bearer <токен>);
+# пустой — эндпоинт открыт
+DDS_METRICS_TOKEN = os.environ.get('DDS_METRICS_TOKEN', '')
+
+# JSON API (/api/, DDSPosts/api.py): токен (заголовок Authorization: Bearer
+# <токен>; пустой — токен не нужен, но запись требует CSRF-токен, как у форм),
+# размер страницы списка по умолчанию и наибольший
+DDS_API_TOKEN = os.environ.get('DDS_API_TOKEN', '')
+DDS_API_PAGE_SIZE = 100
+DDS_API_MAX_PAGE_SIZE = 1000
+
+# Фоновые задачи (DDSPosts/jobs.py, команда run_workers): каталог файлов
+# выгрузок и импорта, число попыток, пауза перед повтором (удваивается с
+# каждой попыткой), секунды; через сколько секунд без отчёта обработчика
+# задача возвращается в очередь
+DDS_JOB_RESULT_DIR = BASE_DIR / 'job_results'
+DDS_JOB_MAX_ATTEMPTS = 3
+DDS_JOB_RETRY_DELAY = 10
+DDS_JOB_TIMEOUT = 60 * 60
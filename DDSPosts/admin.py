@@ -7,15 +7,18 @@
 - Подкатегории
 - Статусы
 - Транзакции
+- Фоновые задачи
 """
 from django.contrib import admin
-from .models import Status, Type, Category, Subcategory, Transaction
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from .models import Status, Type, Category, Subcategory, Transaction, TransactionQuerySet, Job
+from .search import search_transactions
 
 
 @admin.register(Type)
 class TypeAdmin(admin.ModelAdmin):
     """Админка для модели Type (Тип операции)"""
-    list_display = ['name']  # Отображать имя в списке
+    list_display = ['name', 'kind']  # Отображать имя и направление в списке
 
 
 @admin.register(Category)
@@ -32,12 +35,37 @@ class SubcategoryAdmin(admin.ModelAdmin):
     list_filter = ['category__type']              # Фильтрация по типу через категорию
 
 
+class TransactionChangeList(ChangeList):
+    """Список транзакций: при поиске без явной сортировки — сначала самые релевантные"""
+
+    def get_queryset(self, request, exclude_parameters=None):
+        # Сортировка применяется до поиска, поэтому рейтинг добавляется после
+        qs = super().get_queryset(request, exclude_parameters)
+        if self.query.strip() and ORDER_VAR not in self.params:
+            qs = qs.order_by('-search_rank', *qs.query.order_by)
+        return qs
+
+
 @admin.register(Transaction)
 class TransactionAdmin(admin.ModelAdmin):
     """Админка для модели Transaction (Транзакция)"""
     list_display = ['formatted_date', 'operation', 'status', 'category', 'subcategory', 'amount']
+    list_select_related = TransactionQuerySet.LISTING_RELATED  # JOIN справочников одним запросом
     list_filter = ['operation', 'status', 'category']
-    search_fields = ['comment']  # Поиск по полю "комментарий"
+    search_fields = ['comment']  # Поиск по полю "комментарий" (полнотекстовый, см. get_search_results)
+
+    def get_queryset(self, request):
+        """Та же выборка, что и на главной странице: без N+1 по справочникам"""
+        return super().get_queryset(request).for_listing()
+
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по полнотекстовому индексу вместо LIKE '%…%'"""
+        if not search_term.strip():
+            return queryset, False
+        return search_transactions(queryset, search_term), False
+
+    def get_changelist(self, request, **kwargs):
+        return TransactionChangeList
 
     def formatted_date(self, obj):
         """
@@ -52,3 +80,11 @@ class TransactionAdmin(admin.ModelAdmin):
 class StatusAdmin(admin.ModelAdmin):
     """Админка для модели Status (Статус операции)"""
     list_display = ['name']
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """Админка для модели Job (Фоновая задача)"""
+    list_display = ['id', 'kind', 'status', 'attempts', 'progress', 'total', 'worker', 'created_at', 'finished_at']
+    list_filter = ['status', 'kind']
+    readonly_fields = ['worker', 'heartbeat', 'started_at', 'finished_at', 'error']
@@ -0,0 +1,304 @@
+"""
+JSON API транзакций для скриптов и интеграций (/api/).
+
+Маршруты:
+- GET /api/transactions/ — список с фильтрами главной страницы и курсором
+  (?cursor=, ?limit=); в ответе results и токены next / previous;
+- POST /api/transactions/ — создание (объект);
+- POST /api/transactions/bulk/ — создание пачкой (массив), одна вставка;
+- GET /api/transactions/<id>/ — одна транзакция;
+- PUT / PATCH /api/transactions/<id>/ — изменение (PATCH — только переданные поля);
+- DELETE /api/transactions/<id>/ — удаление.
+
+?fields=id,date,amount — только перечисленные поля. Чтение идёт через
+values() по нужным колонкам, JOIN со справочником — только если запрошено
+его название. Число запросов к БД не зависит от числа строк.
+
+Запись проверяется TransactionForm: правила и сообщения те же, что у
+HTML-форм. Тело POST, PUT и PATCH — только application/json (иначе 415).
+Ответы сериализуются orjson, если он установлен, иначе стандартным json.
+
+Если задан DDS_API_TOKEN, нужен заголовок Authorization: Bearer <токен>,
+и проверка CSRF не выполняется: запрос с чужого сайта токена не знает.
+Без токена API защищён от CSRF так же, как HTML-формы (cookie и заголовок
+X-CSRFToken), — иначе любой сайт мог бы писать от имени браузера
+пользователя.
+
+Содержит:
+- FIELDS: поля ответа и колонки, из которых они читаются
+- TransactionCollectionView: список и создание
+- TransactionItemView: чтение, изменение и удаление
+- TransactionBulkCreateView: создание пачкой
+"""
+
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import method_decorator
+from django.utils.http import urlencode
+from django.views import View
+from django.middleware.csrf import CsrfViewMiddleware
+from django.views.decorators.csrf import csrf_exempt
+
+from .filters import filter_transactions, get_filter_params
+from .forms import StaleDictionaryError, TransactionForm, create_transactions, row_errors, validate_transaction_rows
+from .models import Transaction
+from .pagination import InvalidCursor, ValuesCursorPaginator
+
+try:
+    import orjson
+except ImportError:  # необязательная зависимость
+    orjson = None
+
+# Поле ответа -> колонка для values() (через __ — поле связанного справочника)
+FIELDS = {
+    'id': 'id',
+    'date': 'date',
+    'operation': 'operation_id',
+    'operation_name': 'operation__name',
+    'category': 'category_id',
+    'category_name': 'category__name',
+    'subcategory': 'subcategory_id',
+    'subcategory_name': 'subcategory__name',
+    'status': 'status_id',
+    'status_name': 'status__name',
+    'amount': 'amount',
+    'comment': 'comment',
+    'updated_at': 'updated_at',
+}
+
+# Методы, тело которых читается как JSON
+BODY_METHODS = ('POST', 'PUT', 'PATCH')
+
+# Поля TransactionForm: PATCH дополняет ими переданные значения
+FORM_FIELDS = ('date', 'operation', 'category', 'subcategory', 'status', 'amount', 'comment')
+
+
+class ApiError(Exception):
+    """Ошибка запроса: ответ с кодом status и телом {"error": ...} или {"errors": ...}"""
+
+    def __init__(self, status, error=None, errors=None):
+        super().__init__(error)
+        self.status = status
+        self.body = {'errors': errors} if errors is not None else {'error': error}
+
+
+class ApiJSONEncoder(json.JSONEncoder):
+    """Даты и суммы так же, как у orjson ниже: ISO 8601 с Z и строки"""
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat().replace('+00:00', 'Z')
+        if isinstance(o, Decimal):
+            return str(o)
+        return super().default(o)
+
+
+def _orjson_default(o):
+    if isinstance(o, Decimal):
+        return str(o)
+    raise TypeError
+
+
+def dumps(data):
+    """JSON ответа в байтах"""
+    if orjson is not None:
+        return orjson.dumps(data, default=_orjson_default, option=orjson.OPT_UTC_Z)
+    return json.dumps(data, cls=ApiJSONEncoder, ensure_ascii=False).encode()
+
+
+def loads(body):
+    """Тело запроса; некорректный JSON — ошибка 400"""
+    try:
+        return orjson.loads(body) if orjson is not None else json.loads(body)
+    except ValueError:
+        raise ApiError(400, 'Некорректный JSON')
+
+
+def json_response(data, status=200):
+    return HttpResponse(dumps(data), status=status, content_type='application/json')
+
+
+def requested_fields(request):
+    """Поля ответа из ?fields= (по умолчанию — все)"""
+    value = request.GET.get('fields')
+    if not value:
+        return list(FIELDS)
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in FIELDS]
+    if unknown or not fields:
+        raise ApiError(400, f'Неизвестные поля: {", ".join(unknown)}. Доступны: {", ".join(FIELDS)}')
+    return fields
+
+
+def columns(fields, *required):
+    """Колонки для values(): поля ответа и обязательные колонки, без повторов"""
+    return list(dict.fromkeys([*(FIELDS[name] for name in fields), *required]))
+
+
+def project(row, fields):
+    """Строка values() -> объект ответа с полями fields"""
+    return {name: row[FIELDS[name]] for name in fields}
+
+
+def read(pks, fields):
+    """
+    Объекты ответа для транзакций pks одним запросом — после записи значения
+    (округление суммы, updated_at) те же, что при чтении
+    """
+    rows = Transaction.objects.filter(pk__in=pks).order_by('id').values(*columns(fields, 'id'))
+    return [project(row, fields) for row in rows]
+
+
+def csrf_rejected(request):
+    """
+    Проверка CSRF, как у CsrfViewMiddleware для обычного представления:
+    True, если запрос отклонён
+    """
+    middleware = CsrfViewMiddleware(lambda request: None)
+    middleware.process_request(request)
+    return middleware.process_view(request, None, (), {}) is not None
+
+
+# CsrfViewMiddleware пропускает API: проверку выполняет dispatch, только
+# если токен не задан
+@method_decorator(csrf_exempt, name='dispatch')
+class ApiView(View):
+    """Основа представлений API: токен или CSRF, тип тела, ошибки в JSON"""
+
+    def dispatch(self, request, *args, **kwargs):
+        token = getattr(settings, 'DDS_API_TOKEN', '')
+        if token:
+            if not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+                return json_response({'error': 'Нужен токен API'}, status=403)
+        elif csrf_rejected(request):
+            return json_response({'error': 'Ошибка проверки CSRF'}, status=403)
+        # Неподдерживаемый метод — 405 из View.dispatch, а не 415
+        if (request.method in BODY_METHODS and hasattr(self, request.method.lower())
+                and request.content_type != 'application/json'):
+            return json_response({'error': 'Тело запроса должно быть application/json'}, status=415)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except ApiError as e:
+            return json_response(e.body, status=e.status)
+
+    def http_method_not_allowed(self, request, *args, **kwargs):
+        response = json_response({'error': 'Метод не поддерживается'}, status=405)
+        response['Allow'] = ', '.join(self._allowed_methods())
+        return response
+
+    def save(self, form, status):
+        """
+        Сохраняет проверенную форму; ответ — транзакция с полями из ?fields=.
+        ?fields= проверяется до записи: ответ с ошибкой ничего не сохраняет
+        """
+        fields = requested_fields(self.request)
+        if not form.is_valid():
+            raise ApiError(400, errors=form.errors.get_json_data())
+        try:
+            obj = form.save()
+        except StaleDictionaryError:
+            raise ApiError(400, errors=form.errors.get_json_data())
+        return json_response(read([obj.pk], fields)[0], status=status)
+
+
+class TransactionCollectionView(ApiView):
+    """Список транзакций и создание одной"""
+
+    def get(self, request):
+        fields = requested_fields(request)
+        params = get_filter_params(request.GET)
+        qs = filter_transactions(Transaction.objects.all(), params)
+        paginator = ValuesCursorPaginator(
+            # date и id нужны курсору, даже если не запрошены
+            qs.values(*columns(fields, 'date', 'id')),
+            self.get_limit(),
+            fingerprint=urlencode(params),
+        )
+        try:
+            page = paginator.page(request.GET.get('cursor'))
+        except InvalidCursor as e:
+            raise ApiError(400, str(e))
+        return json_response({
+            'results': [project(row, fields) for row in page.object_list],
+            'next': page.next_token,
+            'previous': page.previous_token,
+        })
+
+    def get_limit(self):
+        """Размер страницы из ?limit= в пределах DDS_API_MAX_PAGE_SIZE"""
+        limit = self.request.GET.get('limit') or getattr(settings, 'DDS_API_PAGE_SIZE', 100)
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ApiError(400, 'limit должен быть целым числом')
+        return max(1, min(limit, getattr(settings, 'DDS_API_MAX_PAGE_SIZE', 1000)))
+
+    def post(self, request):
+        data = loads(request.body)
+        if not isinstance(data, dict):
+            raise ApiError(400, 'Ожидался объект')
+        return self.save(TransactionForm(data=data), status=201)
+
+
+class TransactionBulkCreateView(ApiView):
+    """
+    Создание пачкой: массив объектов проверяется по одному дереву справочников
+    и вставляется одним bulk_create; при ошибках не вставляется ни одна строка
+    """
+
+    def post(self, request):
+        rows = loads(request.body)
+        max_rows = getattr(settings, 'DDS_BATCH_MAX_ROWS', 500)
+        if not isinstance(rows, list) or not rows:
+            raise ApiError(400, 'Ожидался непустой массив')
+        if len(rows) > max_rows:
+            raise ApiError(400, f'Не больше {max_rows} строк за запрос')
+        forms, errors = validate_transaction_rows(rows)
+        if errors:
+            raise ApiError(400, errors=errors)
+        fields = requested_fields(request)
+        try:
+            created = create_transactions(forms)
+        except StaleDictionaryError:
+            raise ApiError(400, errors=row_errors(forms))
+        return json_response({'results': read([obj.pk for obj in created], fields)}, status=201)
+
+
+class TransactionItemView(ApiView):
+    """Чтение, изменение и удаление одной транзакции"""
+
+    def get_object(self, pk):
+        try:
+            return Transaction.objects.get(pk=pk)
+        except Transaction.DoesNotExist:
+            raise ApiError(404, 'Транзакция не найдена')
+
+    def get(self, request, pk):
+        fields = requested_fields(request)
+        row = Transaction.objects.filter(pk=pk).values(*columns(fields)).first()
+        if row is None:
+            raise ApiError(404, 'Транзакция не найдена')
+        return json_response(project(row, fields))
+
+    def put(self, request, pk):
+        data = loads(request.body)
+        if not isinstance(data, dict):
+            raise ApiError(400, 'Ожидался объект')
+        return self.save(TransactionForm(data=data, instance=self.get_object(pk)), status=200)
+
+    def patch(self, request, pk):
+        data = loads(request.body)
+        if not isinstance(data, dict):
+            raise ApiError(400, 'Ожидался объект')
+        obj = self.get_object(pk)
+        current = {name: getattr(obj, Transaction._meta.get_field(name).attname) for name in FORM_FIELDS}
+        return self.save(TransactionForm(data={**current, **data}, instance=obj), status=200)
+
+    def delete(self, request, pk):
+        self.get_object(pk).delete()
+        return HttpResponse(status=204)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class DdspostsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'DDSPosts'
+
+    def ready(self):
+        # Регистрация обработчиков сигналов и системных проверок
+        from . import checks, signals  # noqa: F401
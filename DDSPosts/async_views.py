@@ -0,0 +1,129 @@
+"""
+Асинхронные представления для чтения (для запуска через DDS/asgi.py).
+
+Под ASGI-сервером (uvicorn, daphne) синхронное представление выполняется в
+пуле потоков; эти версии работают в цикле событий: запросы к БД — через
+асинхронный ORM (aiterator, acount), кэш справочников — через aget/aset.
+Поведение и шаблоны те же, что у синхронных представлений из views.py.
+Маршруты переключаются на них настройкой DDS_ASYNC_VIEWS (см. urls.py).
+
+Содержит:
+- AsyncTransactionListView: главная страница (обычная и курсорная пагинация, кэш таблицы)
+- load_categories / load_subcategories: AJAX-списки категорий и подкатегорий
+- load_dictionary_tree: JSON-дерево справочников с ETag
+- transaction_report: отчёт о движении средств (HTML и JSON)
+
+Список и отчёт отвечают на условные запросы (см. conditional.py).
+"""
+
+from django.conf import settings
+from django.core.paginator import InvalidPage
+from django.http import Http404, JsonResponse
+from django.shortcuts import render
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response
+from django.utils.decorators import method_decorator
+from django.utils.http import quote_etag
+from django.utils.translation import gettext as _
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import require_GET
+
+from . import fragments
+from .conditional import aconditional_ledger, aledger_state
+from .dictionaries import aget_dictionaries
+from .filters import get_filter_params
+from .pagination import InvalidCursor
+from .reports import acashflow_report
+from .views import TransactionListView, dictionary_branch, dictionary_branch_etag, report_response
+
+
+@method_decorator(aconditional_ledger, name='get')
+class AsyncTransactionListView(TransactionListView):
+    """Главная страница: асинхронная версия TransactionListView"""
+
+    async def get(self, request, *args, **kwargs):
+        self.object_list = self.get_queryset()
+        self.table_context = {}
+        table, revalidate = await fragments.acached_fragment(
+            self.get_fragment_key(), self.arender_table, self.render_table, await aledger_state(request)
+        )
+        return self.table_response(table, await aget_dictionaries(), revalidate)
+
+    async def arender_table(self):
+        """Асинхронный render_table()"""
+        table_context = self.get_table_context(
+            *await self.apaginate_queryset(self.object_list, self.get_paginate_by(self.object_list))
+        )
+        return render_to_string(self.table_template_name, table_context, self.request)
+
+    async def apaginate_queryset(self, queryset, page_size):
+        """Асинхронный paginate_queryset: строки страницы и COUNT(*) — через асинхронный ORM"""
+        if self.use_cursor_pagination():
+            paginator = self.get_cursor_paginator(queryset, page_size)
+            try:
+                page = await paginator.apage(self.request.GET.get('cursor'))
+            except InvalidCursor as e:
+                raise Http404(str(e))
+            await paginator.acount()
+            return paginator, page, page.object_list, page.has_other_pages()
+
+        paginator = self.get_paginator(queryset, page_size, allow_empty_first_page=self.get_allow_empty())
+        # count — cached_property: подсчитанное заранее значение Paginator не пересчитывает
+        paginator.count = await queryset.acount()
+        page_number = self.kwargs.get(self.page_kwarg) or self.request.GET.get(self.page_kwarg) or 1
+        try:
+            page_number = int(page_number)
+        except ValueError:
+            if page_number != 'last':
+                raise Http404(_('Page is not “last”, nor can it be converted to an int.'))
+            page_number = paginator.num_pages
+        try:
+            page = paginator.page(page_number)
+        except InvalidPage as e:
+            raise Http404(_('Invalid page (%(page_number)s): %(message)s') % {
+                'page_number': page_number, 'message': str(e)})
+        page.object_list = [obj async for obj in page.object_list.aiterator()]
+        return paginator, page, page.object_list, page.has_other_pages()
+
+
+async def load_categories(request):
+    """AJAX: категории выбранного типа (асинхронная версия)"""
+    tree = await aget_dictionaries()
+    categories = tree.categories_of(request.GET.get('type_id'))
+    return render(request, 'DDSPosts/dropdown_category.html', {'categories': categories})
+
+
+async def load_subcategories(request):
+    """AJAX: подкатегории выбранной категории (асинхронная версия)"""
+    tree = await aget_dictionaries()
+    subcategories = tree.subcategories_of(request.GET.get('category_id'))
+    return render(request, 'DDSPosts/dropdown_subcategory.html', {'subcategories': subcategories})
+
+
+@require_GET
+@cache_control(public=True, max_age=getattr(settings, 'DDS_DICTIONARY_MAX_AGE', 60))
+async def load_dictionary_tree(request):
+    """
+    AJAX: дерево справочников в JSON (асинхронная версия).
+    Декоратор condition вызывает etag_func синхронно, поэтому условный
+    запрос проверяется здесь же, по версии из асинхронного кэша.
+    """
+    tree = await aget_dictionaries()
+    etag = dictionary_branch_etag(request, tree.version)
+    if etag is not None:
+        etag = quote_etag(etag)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        type_id, category_id = dictionary_branch(request)
+        response = JsonResponse(tree.as_data(type_id=type_id, category_id=category_id),
+                                json_dumps_params={'ensure_ascii': False})
+    if etag is not None:
+        response.headers.setdefault('ETag', etag)
+    return response
+
+
+@aconditional_ledger
+async def transaction_report(request):
+    """Отчёт о движении средств (асинхронная версия)"""
+    report = await acashflow_report(get_filter_params(request.GET))
+    return report_response(request, report, await aget_dictionaries())
@@ -0,0 +1,87 @@
+"""
+Массовая запись транзакций и удаление справочников.
+
+bulk_create, QuerySet.update и DELETE без сборщика удаления не вызывают
+save() и сигналы моделей, поэтому всё, что при обычном сохранении делают
+обработчики сигналов, для пачки выполняется здесь.
+
+Содержит:
+- bulk_create_transactions: вставка пачки транзакций в одной транзакции БД
+- reassign_transactions: перенос всех транзакций справочника на другой одним UPDATE
+- delete_dictionary: удаление справочника с его ветвью по DELETE на таблицу
+"""
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import conditional, dictionaries, listing, rollups
+from .models import Category, DailyCashFlow, Status, Subcategory, Transaction, Type
+from .usage import TRANSACTION_FIELDS
+
+
+def bulk_create_transactions(objs, batch_size=None):
+    """
+    Вставляет транзакции пачкой внутри одной транзакции БД
+    и учитывает их в дневных сводках, витрине и версии журнала
+    """
+    with transaction.atomic():
+        created = Transaction.objects.bulk_create(objs, batch_size=batch_size)
+        rollups.add_transactions(created)
+        listing.sync_transactions(created, batch_size=batch_size)
+        transaction.on_commit(conditional.bump_ledger_version)
+    conditional.bump_ledger_version()
+    return created
+
+
+def target_chain(target):
+    """Справочники, которые получает перенесённая транзакция: статус или тип, категория и подкатегория"""
+    if isinstance(target, Status):
+        return [target]
+    return [target.category.type, target.category, target]
+
+
+def reassign_transactions(obj, target):
+    """
+    Переносит все транзакции справочника obj на target одним UPDATE: статус —
+    на другой статус, тип, категорию или подкатегорию — на подкатегорию
+    (вместе с её категорией и типом, цепочка остаётся согласованной).
+    Сводки переносятся по своим строкам, витрина — одним UPDATE; поисковый
+    индекс обновлять не нужно (комментарии не меняются). Возвращает число
+    перенесённых транзакций
+    """
+    lookup = {f'{TRANSACTION_FIELDS[type(obj)]}_id': obj.pk}
+    chain = target_chain(target)
+    values = {f'{TRANSACTION_FIELDS[type(item)]}_id': item.pk for item in chain}
+    with transaction.atomic():
+        # auto_now при update() не срабатывает: время изменения — явно
+        moved = Transaction.objects.filter(**lookup).update(updated_at=timezone.now(), **values)
+        if moved:
+            rollups.move(lookup, values)
+            listing.move(lookup, chain)
+            transaction.on_commit(conditional.bump_ledger_version)
+    if moved:
+        conditional.bump_ledger_version()
+    return moved
+
+
+def delete_dictionary(obj):
+    """
+    Удаляет справочник obj вместе с ветвью (категории типа, подкатегории
+    категории) и её строками сводок: по одному DELETE на таблицу, начиная с
+    ссылающихся, без сборщика удаления Django, который загружает каждую
+    строку ветви и ищет ссылки на неё. Транзакций у ветви быть не должно
+    (см. usage.count_usage и reassign_transactions); добавленную после
+    проверки отклонит внешний ключ (IntegrityError при фиксации)
+    """
+    field = TRANSACTION_FIELDS[type(obj)]
+    querysets = [DailyCashFlow.objects.filter(**{field: obj})]
+    if isinstance(obj, Type):
+        querysets += [Subcategory.objects.filter(category__type=obj), Category.objects.filter(type=obj)]
+    elif isinstance(obj, Category):
+        querysets.append(Subcategory.objects.filter(category=obj))
+    querysets.append(type(obj).objects.filter(pk=obj.pk))
+    with transaction.atomic():
+        for qs in querysets:
+            qs.order_by()._raw_delete(qs.db)
+        transaction.on_commit(dictionaries.invalidate)
+    dictionaries.invalidate()
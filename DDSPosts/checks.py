@@ -0,0 +1,31 @@
+"""
+Системные проверки приложения (manage.py check).
+
+Содержит:
+- check_shared_cache: кэш справочников должен быть общим для процессов
+"""
+
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Warning, register
+
+from .dictionaries import get_cache
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Версия справочников хранится в кэше DDS_DICTIONARY_CACHE. В кэше памяти
+    процесса изменения справочников из другого процесса (второй веб-процесс,
+    import_transactions, run_workers) не видны: процесс продолжит проверять
+    формы по устаревшему дереву
+    """
+    if isinstance(get_cache(), LocMemCache):
+        return [Warning(
+            'Кэш справочников (DDS_DICTIONARY_CACHE = %r) хранится в памяти процесса: '
+            'изменения справочников из других процессов не будут видны.'
+            % getattr(settings, 'DDS_DICTIONARY_CACHE', 'default'),
+            hint='Используйте общий бэкенд CACHES: файловый кэш, Redis или Memcached.',
+            id='DDSPosts.W001',
+        )]
+    return []
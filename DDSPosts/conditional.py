@@ -0,0 +1,145 @@
+"""
+Условные GET-запросы (ETag / Last-Modified) для списка, выгрузки и отчёта.
+
+Валидатор — версия журнала: счётчик в общем кэше (тот же бэкенд, что у
+версии справочников, см. dictionaries.py), который увеличивается при любом
+изменении транзакций: сигналы модели (signals.py), пакетная запись
+(bulk.py), пересчёт сводок и витрины. Вместе со счётчиком хранится время
+последнего изменения — Last-Modified. Проверка условного запроса читает
+только кэш, без запросов к БД. Версия общая для всех фильтров: изменение
+любой транзакции меняет ETag всех страниц.
+
+К версии журнала добавляется версия справочников: на страницах выводятся
+их названия.
+
+Изменения в обход приложения (SQL, загрузка дампа) версию не меняют: после
+них нужна команда rebuild_cashflow или rebuild_listing (они увеличивают
+версию). Last-Modified с точностью до секунды: клиенты, присылающие
+If-None-Match, получают точный ответ, а только If-Modified-Since — может
+быть, устаревший.
+
+Содержит:
+- ledger_state / aledger_state: версия журнала и время последнего изменения
+- bump_ledger_version: увеличение версии после изменения транзакций
+- ledger_etag / ledger_last_modified: функции для декоратора condition
+- conditional_ledger: condition() для синхронных представлений
+- aconditional_ledger: то же для асинхронных представлений
+"""
+
+import hashlib
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
+
+from .dictionaries import aget_version, get_cache, get_version
+
+LEDGER_VERSION_KEY = 'dds:ledger:version'
+LEDGER_MODIFIED_KEY = 'dds:ledger:modified'
+
+# Атрибут запроса, в котором запоминается состояние: condition вызывает
+# функции ETag и Last-Modified по отдельности, а таблица кэшируется по той же
+# версии, что указана в ETag
+STATE_ATTR = '_dds_ledger_state'
+
+
+def _initial_version():
+    # Отметка времени: после очистки кэша версия не повторит ранее выданные
+    return int(time.time() * 1000)
+
+
+def _state(values):
+    modified = values.get(LEDGER_MODIFIED_KEY)
+    return {
+        'version': values[LEDGER_VERSION_KEY],
+        'modified': datetime.fromtimestamp(modified, tz=timezone.utc) if modified is not None else None,
+    }
+
+
+def read_ledger_state():
+    """Текущие {'version', 'modified'} журнала из кэша"""
+    cache = get_cache()
+    values = cache.get_many([LEDGER_VERSION_KEY, LEDGER_MODIFIED_KEY])
+    if LEDGER_VERSION_KEY not in values:
+        cache.add(LEDGER_VERSION_KEY, _initial_version(), timeout=None)
+        values = cache.get_many([LEDGER_VERSION_KEY, LEDGER_MODIFIED_KEY])
+    return _state(values)
+
+
+async def aread_ledger_state():
+    """Асинхронный read_ledger_state()"""
+    cache = get_cache()
+    values = await cache.aget_many([LEDGER_VERSION_KEY, LEDGER_MODIFIED_KEY])
+    if LEDGER_VERSION_KEY not in values:
+        await cache.aadd(LEDGER_VERSION_KEY, _initial_version(), timeout=None)
+        values = await cache.aget_many([LEDGER_VERSION_KEY, LEDGER_MODIFIED_KEY])
+    return _state(values)
+
+
+def bump_ledger_version():
+    """Увеличивает версию журнала: все страницы и таблицы в кэше устаревают"""
+    cache = get_cache()
+    cache.set(LEDGER_MODIFIED_KEY, time.time(), timeout=None)
+    try:
+        cache.incr(LEDGER_VERSION_KEY)
+    except ValueError:
+        # Ключа нет (кэш очищен) — следующее чтение создаст новую версию
+        pass
+
+
+def ledger_state(request):
+    """Состояние журнала на время запроса: {'version', 'modified'}"""
+    if not hasattr(request, STATE_ATTR):
+        setattr(request, STATE_ATTR, read_ledger_state())
+    return getattr(request, STATE_ATTR)
+
+
+async def aledger_state(request):
+    """Асинхронный ledger_state()"""
+    if not hasattr(request, STATE_ATTR):
+        setattr(request, STATE_ATTR, await aread_ledger_state())
+    return getattr(request, STATE_ATTR)
+
+
+def make_etag(state, dictionary_version):
+    """ETag (без кавычек) по версии журнала и версии справочников"""
+    value = f'{state["version"]}:{dictionary_version}'
+    return hashlib.md5(value.encode()).hexdigest()
+
+
+def ledger_etag(request, *args, **kwargs):
+    return make_etag(ledger_state(request), get_version())
+
+
+def ledger_last_modified(request, *args, **kwargs):
+    return ledger_state(request)['modified']
+
+
+conditional_ledger = condition(etag_func=ledger_etag, last_modified_func=ledger_last_modified)
+
+
+def aconditional_ledger(view):
+    """
+    Аналог conditional_ledger для асинхронных представлений: condition
+    вызывает функции валидаторов синхронно, здесь версии читаются через
+    асинхронный кэш
+    """
+    @wraps(view)
+    async def inner(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return await view(request, *args, **kwargs)
+
+        state = await aledger_state(request)
+        etag = quote_etag(make_etag(state, await aget_version()))
+        last_modified = int(state['modified'].timestamp()) if state['modified'] else None
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = await view(request, *args, **kwargs)
+        if last_modified and not response.has_header('Last-Modified'):
+            response.headers['Last-Modified'] = http_date(last_modified)
+        response.headers.setdefault('ETag', etag)
+        return response
+    return inner
@@ -0,0 +1,215 @@
+"""
+Кэш справочников.
+
+Статусы, типы, категории и подкатегории меняются редко, а читаются на каждой
+странице. Дерево справочников целиком хранится в кэше (бэкенд задаётся
+настройкой DDS_DICTIONARY_CACHE) под ключом с номером версии; номер версии
+увеличивается при любом изменении справочника (см. signals.py). Каждый процесс
+дополнительно держит последнее дерево в памяти, поэтому в установившемся
+режиме чтение справочников не обращается ни к БД, ни к самому дереву в кэше —
+только к номеру версии.
+
+Содержит:
+- DictionaryTree: дерево справочников с индексами по id
+- get_dictionaries / aget_dictionaries: текущее дерево справочников
+- get_version / aget_version: текущая версия справочников
+- invalidate: сброс кэша после изменения справочника
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Status, Type, Category, Subcategory
+
+VERSION_KEY = 'dds:dictionaries:version'
+TREE_KEY = 'dds:dictionaries:tree:%s'
+
+# Последнее дерево, прочитанное этим процессом: (версия, дерево)
+_process = {'entry': (None, None)}
+
+
+class DictionaryTree:
+    """
+    Дерево справочников: тип -> категория -> подкатегория, и статусы.
+
+    Объекты — обычные экземпляры моделей; связи category.type и
+    subcategory.category заполнены, поэтому обращение к ним не выполняет
+    запросов.
+    """
+
+    # Версия справочников, из которой получено дерево (None — кэш отключён)
+    version = None
+
+    def __init__(self, statuses, types, categories, subcategories):
+        self.statuses = statuses
+        self.types = types
+        self.categories = categories
+        self.subcategories = subcategories
+
+        self.status_by_id = {s.pk: s for s in statuses}
+        self.type_by_id = {t.pk: t for t in types}
+        self.category_by_id = {c.pk: c for c in categories}
+        self.subcategory_by_id = {sc.pk: sc for sc in subcategories}
+
+        self._categories_of = {}
+        for c in sorted(categories, key=lambda c: c.name):
+            self._categories_of.setdefault(c.type_id, []).append(c)
+        self._subcategories_of = {}
+        for sc in sorted(subcategories, key=lambda sc: sc.name):
+            self._subcategories_of.setdefault(sc.category_id, []).append(sc)
+
+    @classmethod
+    def load(cls):
+        """Читает справочники из БД: по одному запросу на таблицу"""
+        return cls.link(
+            list(Status.objects.order_by('pk')),
+            list(Type.objects.order_by('pk')),
+            list(Category.objects.order_by('pk')),
+            list(Subcategory.objects.order_by('pk')),
+        )
+
+    @classmethod
+    async def aload(cls):
+        """Асинхронный load()"""
+        return cls.link(
+            [s async for s in Status.objects.order_by('pk').aiterator()],
+            [t async for t in Type.objects.order_by('pk').aiterator()],
+            [c async for c in Category.objects.order_by('pk').aiterator()],
+            [sc async for sc in Subcategory.objects.order_by('pk').aiterator()],
+        )
+
+    @classmethod
+    def link(cls, statuses, types, categories, subcategories):
+        """Дерево из прочитанных объектов: заполняет связи категорий и подкатегорий"""
+        type_by_id = {t.pk: t for t in types}
+        category_by_id = {c.pk: c for c in categories}
+        for c in categories:
+            c.type = type_by_id[c.type_id]
+        for sc in subcategories:
+            sc.category = category_by_id[sc.category_id]
+
+        return cls(statuses, types, categories, subcategories)
+
+    def categories_of(self, type_id):
+        """Категории типа операции, по алфавиту"""
+        return self._categories_of.get(_to_int(type_id), [])
+
+    def subcategories_of(self, category_id):
+        """Подкатегории категории, по алфавиту"""
+        return self._subcategories_of.get(_to_int(category_id), [])
+
+    def as_data(self, type_id=None, category_id=None):
+        """
+        Дерево (или одна его ветвь) в виде словарей для JSON:
+        category_id — подкатегории категории, type_id — категории типа
+        с подкатегориями, без параметров — статусы и все типы.
+        """
+        def node(obj, **children):
+            return dict({'id': obj.pk, 'name': obj.name}, **children)
+
+        def category_node(c):
+            return node(c, subcategories=[node(sc) for sc in self.subcategories_of(c.pk)])
+
+        if category_id is not None:
+            return {'subcategories': [node(sc) for sc in self.subcategories_of(category_id)]}
+        if type_id is not None:
+            return {'categories': [category_node(c) for c in self.categories_of(type_id)]}
+        return {
+            'statuses': [node(s) for s in self.statuses],
+            'types': [node(t, categories=[category_node(c) for c in self.categories_of(t.pk)])
+                      for t in self.types],
+        }
+
+
+def _to_int(value):
+    """id из параметра запроса или формы (None, если это не число)"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_cache():
+    """Бэкенд кэша справочников"""
+    return caches[getattr(settings, 'DDS_DICTIONARY_CACHE', 'default')]
+
+
+def get_version():
+    """
+    Текущая версия справочников.
+
+    Начальное значение — отметка времени: после очистки кэша версия не
+    повторит ранее выданные (важно для ETag).
+    """
+    cache = get_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+async def aget_version():
+    """Асинхронный get_version()"""
+    cache = get_cache()
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        await cache.aadd(VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = await cache.aget(VERSION_KEY)
+    return version
+
+
+def _cache_timeout():
+    return getattr(settings, 'DDS_DICTIONARY_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+def _remember(version, tree):
+    """Запоминает дерево версии version в памяти процесса"""
+    tree.version = version
+    _process['entry'] = (version, tree)
+    return tree
+
+
+def get_dictionaries():
+    """Текущее дерево справочников (из памяти процесса, кэша или БД)"""
+    version = get_version()
+    cached_version, tree = _process['entry']
+    if version is not None and cached_version == version:
+        return tree
+
+    cache = get_cache()
+    tree = cache.get(TREE_KEY % version) if version is not None else None
+    if tree is None:
+        tree = DictionaryTree.load()
+        if version is not None:
+            cache.set(TREE_KEY % version, tree, _cache_timeout())
+    return _remember(version, tree)
+
+
+async def aget_dictionaries():
+    """Асинхронный get_dictionaries(): кэш через aget/aset, БД — асинхронным ORM"""
+    version = await aget_version()
+    cached_version, tree = _process['entry']
+    if version is not None and cached_version == version:
+        return tree
+
+    cache = get_cache()
+    tree = await cache.aget(TREE_KEY % version) if version is not None else None
+    if tree is None:
+        tree = await DictionaryTree.aload()
+        if version is not None:
+            await cache.aset(TREE_KEY % version, tree, _cache_timeout())
+    return _remember(version, tree)
+
+
+def invalidate():
+    """Увеличивает версию справочников: все процессы перечитают дерево"""
+    cache = get_cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # Ключа нет (кэш очищен) — следующее чтение создаст новую версию
+        pass
+    _process['entry'] = (None, None)
@@ -0,0 +1,171 @@
+"""
+Потоковая выгрузка транзакций в CSV и XLSX.
+
+Строки читаются серверным итератором по values_list (без создания объектов
+моделей) и сразу отдаются клиенту, поэтому выгрузка любого объёма занимает
+постоянный объём памяти. При DDS_LISTING_READ_MODEL строки читаются из
+витрины TransactionListing без JOIN со справочниками.
+
+Содержит:
+- EXPORT_COLUMNS: колонки выгрузки
+- export_rows: строки выгрузки по фильтрам главной страницы
+- stream_csv: генератор CSV
+- stream_xlsx: генератор XLSX (zip пишется потоково, без временных файлов)
+"""
+
+import csv
+import io
+import re
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.utils import timezone
+
+from .filters import filter_transactions
+from .listing import EXPORT_FIELDS, use_listing
+from .models import Transaction, TransactionListing
+
+# Заголовок колонки -> поле для values_list
+EXPORT_COLUMNS = [
+    ('Дата', 'date'),
+    ('Тип', 'operation__name'),
+    ('Категория', 'category__name'),
+    ('Подкатегория', 'subcategory__name'),
+    ('Статус', 'status__name'),
+    ('Сумма', 'amount'),
+    ('Комментарий', 'comment'),
+]
+
+DATE_FORMAT = '%d.%m.%Y %H:%M'
+
+
+def export_rows(params, chunk_size=None):
+    """Итератор строк выгрузки (кортежи) для фильтров params"""
+    if chunk_size is None:
+        chunk_size = getattr(settings, 'DDS_EXPORT_CHUNK_SIZE', 2000)
+    fields = [field for _, field in EXPORT_COLUMNS]
+    if use_listing(params):
+        qs = filter_transactions(TransactionListing.objects.all(), params)
+        fields = [EXPORT_FIELDS.get(field, field) for field in fields]
+    else:
+        qs = filter_transactions(Transaction.objects.all(), params)
+    for row in qs.order_by('-date', '-id').values_list(*fields).iterator(chunk_size=chunk_size):
+        yield (timezone.localtime(row[0]).strftime(DATE_FORMAT),) + row[1:]
+
+
+class _Echo:
+    """Псевдофайл для csv.writer: write() возвращает строку, а не пишет её"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    """Генератор CSV: заголовок и по строке на транзакцию"""
+    writer = csv.writer(_Echo())
+    # BOM — чтобы Excel распознал UTF-8
+    yield '\ufeff' + writer.writerow([title for title, _ in EXPORT_COLUMNS])
+    for row in rows:
+        yield writer.writerow(row)
+
+
+class _StreamBuffer(io.RawIOBase):
+    """Несмещаемый буфер, куда zipfile пишет архив; содержимое забирается кусками"""
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        self.size = 0
+        return data
+
+
+# Символы, недопустимые в XML 1.0
+_XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Транзакции" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _xlsx_row(values):
+    """Строка листа: числа — числовые ячейки, остальное — строки"""
+    cells = []
+    for value in values:
+        if isinstance(value, (int, float, Decimal)):
+            cells.append(f'<c t="n"><v>{value}</v></c>')
+        else:
+            text = escape(_XML_ILLEGAL.sub('', str(value)))
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return f'<row>{"".join(cells)}</row>'
+
+
+def stream_xlsx(rows, flush_size=64 * 1024):
+    """
+    Генератор XLSX. Лист пишется в zip потоково (с дескрипторами данных),
+    готовые куски архива отдаются по мере накопления flush_size байт.
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS.items():
+            archive.writestr(name, content)
+        yield buffer.pop()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xlsx_row([title for title, _ in EXPORT_COLUMNS]).encode())
+            for row in rows:
+                sheet.write(_xlsx_row(row).encode())
+                if buffer.size >= flush_size:
+                    yield buffer.pop()
+            sheet.write(b'</sheetData></worksheet>')
+    yield buffer.pop()
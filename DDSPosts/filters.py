@@ -0,0 +1,101 @@
+"""
+Фильтрация списка транзакций.
+
+Содержит:
+- FILTER_PARAMS: GET-параметры, по которым фильтруется список
+- get_filter_params: выборка и нормализация активных фильтров из запроса
+- get_date_range: границы периода [начало, конец) по фильтрам даты
+- filter_transactions: применение фильтров к QuerySet транзакций
+  (включая полнотекстовый поиск по комментарию)
+"""
+
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .search import SEARCH_PARAM, search_transactions
+
+# Фильтры по справочникам: GET-параметр -> поле модели Transaction
+FIELD_FILTERS = {
+    'status': 'status_id',
+    'type': 'operation_id',
+    'category': 'category_id',
+    'subcategory': 'subcategory_id',
+}
+
+# Фильтры по дате: один день или период «с ... по ...» включительно
+DATE_FILTERS = ('date', 'date_from', 'date_to')
+
+FILTER_PARAMS = DATE_FILTERS + tuple(FIELD_FILTERS) + (SEARCH_PARAM,)
+
+
+def get_filter_params(query):
+    """
+    Возвращает словарь активных фильтров из QueryDict.
+    Пустые значения отбрасываются, ключи упорядочены — результат
+    пригоден для построения ссылок и ключей кэша.
+    """
+    params = {}
+    for name in FILTER_PARAMS:
+        value = query.get(name)
+        if value:
+            params[name] = value.strip()
+    return params
+
+
+def parse_day(value):
+    """Дата из строки 'ГГГГ-ММ-ДД' (или None, если строка некорректна)"""
+    try:
+        return parse_date(value)
+    except ValueError:
+        return None
+
+
+def day_start(day):
+    """Начало календарного дня в часовом поясе TIME_ZONE"""
+    return timezone.make_aware(datetime.combine(day, time.min), timezone.get_current_timezone())
+
+
+def get_date_range(params):
+    """
+    Полуоткрытый период [начало, конец) по фильтрам даты.
+
+    date — один день; date_from/date_to — границы периода, оба дня
+    включаются. Некорректные даты игнорируются.
+    """
+    first = last = None
+
+    if params.get('date'):
+        first = last = parse_day(params['date'])
+
+    date_from = parse_day(params.get('date_from') or '')
+    if date_from is not None and (first is None or date_from > first):
+        first = date_from
+
+    date_to = parse_day(params.get('date_to') or '')
+    if date_to is not None and (last is None or date_to < last):
+        last = date_to
+
+    start = day_start(first) if first is not None else None
+    end = day_start(last + timedelta(days=1)) if last is not None else None
+    return start, end
+
+
+def filter_transactions(qs, params):
+    """Фильтрация QuerySet транзакций по параметрам из формы"""
+    # Диапазон вместо точного сравнения: использует индексы (…, -date, -id)
+    start, end = get_date_range(params)
+    if start is not None:
+        qs = qs.filter(date__gte=start)
+    if end is not None:
+        qs = qs.filter(date__lt=end)
+
+    for name, field in FIELD_FILTERS.items():
+        if params.get(name):
+            qs = qs.filter(**{field: params[name]})
+
+    # Поиск добавляет аннотацию search_rank для сортировки по релевантности
+    if params.get(SEARCH_PARAM):
+        qs = search_transactions(qs, params[SEARCH_PARAM])
+    return qs
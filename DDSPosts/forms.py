@@ -2,17 +2,28 @@
 Формы для приложения.
 
 Содержит формы для:
-- Транзакции
+- Транзакции (и набор форм для пакетного ввода)
 - Типа операции
 - Категории
 - Подкатегории
 - Статуса
+- Удаления справочника (с переносом транзакций)
+
+Справочники транзакции проверяются по кэшу, без запросов к БД. Справочник,
+удалённый после загрузки кэша, не пропускает внешний ключ при фиксации:
+TransactionForm.save() и create_transactions() превращают эту ошибку
+целостности в ошибку поля (StaleDictionaryError).
 
 Формы используют Bootstrap-классы и поддерживают каскадную фильтрацию.
 """
 
 from django import forms
+from django.db import IntegrityError, transaction
+
+from .bulk import bulk_create_transactions
+from .dictionaries import get_dictionaries
 from .models import Transaction, Category, Subcategory, Status, Type
+from .usage import in_branch
 
 
 class SubcategoryForm(forms.ModelForm):
@@ -41,9 +52,10 @@ class TypeForm(forms.ModelForm):
     """Форма для создания и редактирования типа операции"""
     class Meta:
         model = Type
-        fields = ['name']
+        fields = ['name', 'kind']
         widgets = {
             'name': forms.TextInput(attrs={'class': 'form-control'}),
+            'kind': forms.Select(attrs={'class': 'form-select'}),
         }
 
 
@@ -57,23 +69,71 @@ class StatusForm(forms.ModelForm):
         }
 
 
+class DictionaryChoiceField(forms.ModelChoiceField):
+    """
+    Выбор справочника, проверяемый по объектам из кэша справочников (см.
+    TransactionForm.set_choices), без запроса к БД. Сообщение об ошибке то
+    же, что у ModelChoiceField.
+    """
+    objects = {}  # id -> объект справочника, допустимые значения поля
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            obj = self.objects.get(int(getattr(value, 'pk', value)))
+        except (TypeError, ValueError):
+            obj = None
+        if obj is None:
+            raise forms.ValidationError(
+                self.error_messages['invalid_choice'],
+                code='invalid_choice',
+                params={'value': value},
+            )
+        return obj
+
+
 class TransactionForm(forms.ModelForm):
     """
     Форма для создания и редактирования транзакции.
     Реализует каскадную фильтрацию: тип -> категория -> подкатегория.
+
+    Варианты выбора и проверка всей цепочки (статус, тип, категория этого
+    типа, подкатегория этой категории) идут по кэшу справочников, поэтому
+    ни отображение, ни проверка формы не обращаются к БД. Справочник,
+    удалённый после загрузки кэша, не пропустит внешний ключ при сохранении:
+    save() добавит ошибку поля и поднимет StaleDictionaryError.
     """
+    # Обычные поля вместо виджетов smart_selects: каскад на странице
+    # реализован своим AJAX, а варианты подставляются из кэша
+    category = DictionaryChoiceField(queryset=Category.objects.none(), label='Категория')
+    subcategory = DictionaryChoiceField(queryset=Subcategory.objects.none(), label='Подкатегория')
+
+    # Поля, проверенные по кэшу: повторная проверка моделью (запрос на каждый
+    # внешний ключ) не нужна
+    DICTIONARY_FIELDS = ('status', 'operation', 'category', 'subcategory')
+
     class Meta:
         model = Transaction
         fields = ['date', 'operation', 'category', 'subcategory', 'status', 'amount', 'comment']
+        field_classes = {
+            'operation': DictionaryChoiceField,
+            'status': DictionaryChoiceField,
+        }
         widgets = {
             'date': forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
             'amount': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
             'comment': forms.Textarea(attrs={'class': 'form-control', 'rows': 2}),
         }
 
-    def __init__(self, *args, **kwargs):
-        """Инициализация формы с каскадной логикой фильтрации полей"""
+    def __init__(self, *args, tree=None, **kwargs):
+        """
+        Инициализация формы с каскадной логикой фильтрации полей.
+        tree — дерево справочников, общее для нескольких форм (пакетный ввод)
+        """
         super().__init__(*args, **kwargs)
+        if tree is None:
+            tree = get_dictionaries()
 
         # Применение Bootstrap-стилей к select-полям
         for field in self.fields:
@@ -81,26 +141,177 @@ class TransactionForm(forms.ModelForm):
                 self.fields[field].widget.attrs['class'] = 'form-select'
 
         # Изначально скрываем категории и подкатегории
-        self.fields['category'].queryset = Category.objects.none()
-        self.fields['subcategory'].queryset = Subcategory.objects.none()
+        categories = subcategories = []
 
-        # Если в POST-запросе передан выбранный тип
-        if 'operation' in self.data:
+        # Если в POST-запросе передан выбранный тип (с префиксом формы в наборе)
+        if self.add_prefix('operation') in self.data:
             try:
-                operation_id = int(self.data.get('operation'))
-                self.fields['category'].queryset = Category.objects.filter(type_id=operation_id)
+                categories = tree.categories_of(int(self.data.get(self.add_prefix('operation'))))
             except (ValueError, TypeError):
                 pass
         elif self.instance.pk:
             # Если редактируем существующую транзакцию
-            self.fields['category'].queryset = Category.objects.filter(type=self.instance.operation)
+            categories = tree.categories_of(self.instance.operation_id)
 
         # Если в POST-запросе передана выбранная категория
-        if 'category' in self.data:
+        if self.add_prefix('category') in self.data:
             try:
-                category_id = int(self.data.get('category'))
-                self.fields['subcategory'].queryset = Subcategory.objects.filter(category_id=category_id)
+                subcategories = tree.subcategories_of(int(self.data.get(self.add_prefix('category'))))
             except (ValueError, TypeError):
                 pass
         elif self.instance.pk:
-            self.fields['subcategory'].queryset = Subcategory.objects.filter(category=self.instance.category)
+            subcategories = tree.subcategories_of(self.instance.category_id)
+
+        # Категории — только выбранного типа, подкатегории — только выбранной
+        # категории: чужие значения не проходят проверку
+        self.set_choices('status', tree.statuses)
+        self.set_choices('operation', tree.types)
+        self.set_choices('category', categories)
+        self.set_choices('subcategory', subcategories)
+
+    def set_choices(self, name, objects):
+        """Подставляет варианты выбора поля и допустимые значения из списка объектов справочника"""
+        field = self.fields[name]
+        field.choices = [('', field.empty_label)] + [(obj.pk, str(obj)) for obj in objects]
+        field.objects = {obj.pk: obj for obj in objects}
+
+    def _get_validation_exclusions(self):
+        """
+        Справочники уже проверены по кэшу: модель их не перепроверяет
+        (удалённый с тех пор справочник обнаружит save())
+        """
+        exclude = super()._get_validation_exclusions()
+        exclude.update(self.DICTIONARY_FIELDS)
+        return exclude
+
+    def save(self, commit=True):
+        """
+        Сохраняет транзакцию в своей транзакции БД: внешние ключи проверяются
+        при её фиксации. Если справочник удалён после загрузки кэша — ошибка
+        поля и StaleDictionaryError вместо IntegrityError
+        """
+        if not commit:
+            return super().save(commit=False)
+        try:
+            with transaction.atomic():
+                return super().save()
+        except IntegrityError:
+            if not flag_missing_dictionaries([self]):
+                raise
+            raise StaleDictionaryError
+
+
+class StaleDictionaryError(Exception):
+    """Справочник удалён после загрузки кэша; ошибки добавлены в поля форм"""
+
+
+def flag_missing_dictionaries(forms_):
+    """
+    После ошибки целостности: какие из выбранных в формах справочников уже
+    удалены (по запросу на справочник). К таким полям добавляется та же
+    ошибка, что у неверного выбора. Возвращает True, если удалённые нашлись
+    """
+    flagged = False
+    for name in TransactionForm.DICTIONARY_FIELDS:
+        model = Transaction._meta.get_field(name).related_model
+        ids = {form.cleaned_data[name].pk for form in forms_ if form.cleaned_data.get(name)}
+        existing = set(model.objects.filter(pk__in=ids).values_list('pk', flat=True))
+        for form in forms_:
+            obj = form.cleaned_data.get(name)
+            if obj is not None and obj.pk not in existing:
+                field = form.fields[name]
+                form.add_error(name, forms.ValidationError(
+                    field.error_messages['invalid_choice'], code='invalid_choice', params={'value': obj.pk},
+                ))
+                flagged = True
+    return flagged
+
+
+def create_transactions(forms_):
+    """
+    Вставляет транзакции проверенных форм одним bulk_create_transactions.
+    Если справочник удалён после загрузки кэша — ошибки полей и
+    StaleDictionaryError; не вставляется ни одна строка
+    """
+    try:
+        return bulk_create_transactions([form.instance for form in forms_])
+    except IntegrityError:
+        if not flag_missing_dictionaries(forms_):
+            raise
+        raise StaleDictionaryError
+
+
+class DictionaryDeleteForm(forms.Form):
+    """
+    Подтверждение удаления справочника. Если на него ссылаются транзакции,
+    нужно выбрать, куда их перенести: статус — на другой статус, тип,
+    категорию или подкатегорию — на подкатегорию вне удаляемой ветви.
+    Варианты берутся из кэша справочников
+    """
+    target = DictionaryChoiceField(queryset=Subcategory.objects.none(), required=False,
+                                   label='Перенести транзакции в')
+
+    def __init__(self, *args, instance, usage, tree=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.usage = usage
+        if tree is None:
+            tree = get_dictionaries()
+
+        if isinstance(instance, Status):
+            targets = [(s, s.name) for s in tree.statuses if s.pk != instance.pk]
+        else:
+            targets = sorted(
+                ((sc, f'{sc.category.type.name} / {sc.category.name} / {sc.name}')
+                 for sc in tree.subcategories if not in_branch(sc, instance)),
+                key=lambda item: item[1],
+            )
+        field = self.fields['target']
+        field.widget.attrs['class'] = 'form-select'
+        field.choices = [('', field.empty_label)] + [(obj.pk, label) for obj, label in targets]
+        field.objects = {obj.pk: obj for obj, _ in targets}
+
+    def clean_target(self):
+        target = self.cleaned_data['target']
+        if self.usage and target is None:
+            raise forms.ValidationError(
+                'Справочник используется в транзакциях (%(count)s): выберите, куда их перенести.',
+                code='in_use',
+                params={'count': self.usage},
+            )
+        return target
+
+
+def validate_transaction_rows(rows, tree=None):
+    """
+    Проверяет строки (словари полей TransactionForm) по одному дереву справочников.
+    Возвращает (формы, ошибки): ошибки — [{'row': номер, 'errors': ошибки полей}]
+    """
+    if tree is None:
+        tree = get_dictionaries()
+    forms_ = [TransactionForm(data=row if isinstance(row, dict) else {}, tree=tree) for row in rows]
+    return forms_, row_errors(forms_)
+
+
+def row_errors(forms_):
+    """Ошибки форм по строкам: [{'row': номер, 'errors': ошибки полей}]"""
+    return [
+        {'row': index, 'errors': form.errors.get_json_data()}
+        for index, form in enumerate(forms_) if not form.is_valid()
+    ]
+
+
+def transaction_formset(extra, max_rows):
+    """
+    Набор форм TransactionForm для пакетного ввода: extra пустых строк,
+    не больше max_rows строк; пустые строки пропускаются, нужна хотя бы одна
+    заполненная
+    """
+    return forms.formset_factory(
+        TransactionForm,
+        extra=extra,
+        min_num=1,
+        validate_min=True,
+        max_num=max_rows,
+        absolute_max=max_rows,
+        validate_max=True,
+    )
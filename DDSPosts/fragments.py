@@ -0,0 +1,147 @@
+"""
+Кэш отрисованной таблицы транзакций главной страницы.
+
+Ключ фрагмента строится по нормализованным фильтрам, номеру страницы или
+курсору и параметрам пагинации. Запись помнит версии, для которых она
+отрисована: версию журнала (та же, что в ETag условных запросов, см.
+conditional.py) и версию справочников (в таблице выводятся их названия).
+Запись с другими версиями устарела и перерисовывается. Обе версии — в
+общем кэше, поэтому попадание не обращается к БД, а изменения из любого
+процесса (другой веб-процесс, импорт, фоновые задачи) делают запись
+устаревшей.
+
+При DDS_FRAGMENT_STALE_SECONDS > 0 устаревшая запись, отрисованная не
+раньше этого срока, отдаётся сразу, а таблица перерисовывается после
+отправки ответа. Перерисовку выполняет один запрос (блокировка в кэше),
+остальные до её окончания получают прежний фрагмент.
+
+Содержит:
+- fragment_key: ключ фрагмента по параметрам страницы
+- cached_fragment / acached_fragment: фрагмент из кэша или отрисованный заново
+"""
+
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import urlencode
+
+from . import metrics
+from .dictionaries import aget_version, get_version
+
+logger = logging.getLogger('DDSPosts.fragments')
+
+FRAGMENT_KEY = 'DDSPosts:fragment:%s'
+LOCK_KEY = 'DDSPosts:fragment:%s:lock'
+COUNTER = 'dds_fragment_cache_total'
+
+
+def get_cache():
+    """Бэкенд кэша фрагментов или None, если кэш выключен"""
+    alias = getattr(settings, 'DDS_FRAGMENT_CACHE', 'default')
+    return caches[alias] if alias else None
+
+
+def fragment_key(**params):
+    """Ключ фрагмента: хэш параметров страницы в фиксированном порядке"""
+    query = urlencode(sorted((name, value) for name, value in params.items() if value not in (None, '')))
+    return FRAGMENT_KEY % hashlib.sha1(query.encode()).hexdigest()
+
+
+def _timeout():
+    return getattr(settings, 'DDS_FRAGMENT_CACHE_TIMEOUT', 300)
+
+
+def _stale_seconds():
+    return getattr(settings, 'DDS_FRAGMENT_STALE_SECONDS', 0)
+
+
+def _fresh(entry, versions):
+    return entry is not None and entry['versions'] == versions
+
+
+def _stale(entry):
+    """Можно ли отдать устаревшую запись, пока она перерисовывается"""
+    stale_seconds = _stale_seconds()
+    return entry is not None and stale_seconds > 0 and time.time() - entry['rendered'] <= stale_seconds
+
+
+def _entry(versions, html):
+    return {'versions': versions, 'html': html, 'rendered': time.time()}
+
+
+def _versions(state, dictionary_version):
+    """Версии записи: версия журнала и версия справочников"""
+    return (state['version'], dictionary_version)
+
+
+def _revalidator(cache, key, render, versions):
+    """
+    Перерисовка фрагмента после отправки ответа. Запись помечается версиями,
+    прочитанными до отрисовки: если данные успели измениться, следующий
+    запрос увидит другую версию и перерисует таблицу
+    """
+    def revalidate():
+        try:
+            cache.set(key, _entry(versions, render()), _timeout())
+        except Exception:
+            logger.exception('Не удалось перерисовать фрагмент %s', key)
+        finally:
+            cache.delete(LOCK_KEY % key)
+    return revalidate
+
+
+def cached_fragment(key, render, state):
+    """
+    Фрагмент по ключу key: из кэша или результат render().
+    state — состояние журнала на время запроса (conditional.ledger_state).
+
+    Возвращает (html, revalidate): revalidate — функция перерисовки, которую
+    нужно вызвать после отправки ответа (если отдан устаревший фрагмент), или None.
+    """
+    cache = get_cache()
+    if cache is None:
+        return render(), None
+    # Версии читаются до отрисовки: изменения во время неё сделают запись устаревшей
+    versions = _versions(state, get_version())
+    entry = cache.get(key)
+    if _fresh(entry, versions):
+        metrics.increment(COUNTER, result='hit')
+        return entry['html'], None
+    if _stale(entry):
+        metrics.increment(COUNTER, result='stale')
+        if cache.add(LOCK_KEY % key, 1, timeout=_stale_seconds()):
+            return entry['html'], _revalidator(cache, key, render, versions)
+        return entry['html'], None
+
+    metrics.increment(COUNTER, result='miss')
+    html = render()
+    cache.set(key, _entry(versions, html), _timeout())
+    return html, None
+
+
+async def acached_fragment(key, arender, render, state):
+    """
+    Асинхронный cached_fragment(): arender — корутина отрисовки при промахе,
+    render — синхронная отрисовка для перерисовки после ответа.
+    """
+    cache = get_cache()
+    if cache is None:
+        return await arender(), None
+    versions = _versions(state, await aget_version())
+    entry = await cache.aget(key)
+    if _fresh(entry, versions):
+        metrics.increment(COUNTER, result='hit')
+        return entry['html'], None
+    if _stale(entry):
+        metrics.increment(COUNTER, result='stale')
+        if await cache.aadd(LOCK_KEY % key, 1, timeout=_stale_seconds()):
+            return entry['html'], _revalidator(cache, key, render, versions)
+        return entry['html'], None
+
+    metrics.increment(COUNTER, result='miss')
+    html = await arender()
+    await cache.aset(key, _entry(versions, html), _timeout())
+    return html, None
@@ -0,0 +1,195 @@
+"""
+Очередь фоновых задач в БД (модель Job), без внешнего брокера.
+
+Представление ставит задачу в очередь (enqueue) и сразу отвечает; команда
+run_workers в отдельном процессе захватывает задачи и выполняет их.
+Захват — условный UPDATE ... WHERE status = 'queued': из нескольких
+обработчиков задачу получает ровно один, на SQLite и PostgreSQL одинаково.
+
+Задача — функция, зарегистрированная декоратором @task('имя'); получает
+объект Job (параметры в job.params, отчёт о ходе — report()) и возвращает
+результат, пригодный для JSON. При исключении задача повторяется позже
+(DDS_JOB_RETRY_DELAY, с удвоением), после max_attempts попыток — ошибка.
+Задача, обработчик которой перестал отчитываться дольше DDS_JOB_TIMEOUT
+секунд, возвращается в очередь.
+
+Содержит:
+- task: регистрация функции задачи
+- enqueue: постановка в очередь
+- claim: захват следующей задачи обработчиком
+- run: выполнение захваченной задачи с повторами
+- report: отчёт о ходе выполнения
+- requeue_stale: возврат брошенных задач в очередь
+- задачи export, import, rebuild
+"""
+
+import logging
+import os
+import traceback
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db.models import F
+from django.utils import timezone
+
+from . import conditional, listing, rollups
+from .export import export_rows, stream_csv, stream_xlsx
+from .filters import filter_transactions
+from .management.commands import import_transactions
+from .models import Job, Transaction
+
+logger = logging.getLogger('DDSPosts.jobs')
+
+# Имя задачи -> функция
+TASKS = {}
+
+# Как часто (в строках) задача выгрузки отчитывается о ходе
+REPORT_EVERY = 1000
+
+
+def task(name):
+    """Регистрирует функцию задачи под именем name"""
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+def _retry_delay(attempts):
+    return getattr(settings, 'DDS_JOB_RETRY_DELAY', 10) * 2 ** (attempts - 1)
+
+
+def result_dir():
+    """Каталог файлов-результатов задач (выгрузки, загруженные файлы импорта)"""
+    path = Path(getattr(settings, 'DDS_JOB_RESULT_DIR', Path(settings.BASE_DIR) / 'job_results'))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def enqueue(kind, max_attempts=None, **params):
+    """Ставит задачу kind с параметрами params в очередь"""
+    if kind not in TASKS:
+        raise ValueError(f'Неизвестная задача: {kind}')
+    if max_attempts is None:
+        max_attempts = getattr(settings, 'DDS_JOB_MAX_ATTEMPTS', 3)
+    return Job.objects.create(kind=kind, params=params, max_attempts=max_attempts)
+
+
+def claim(worker):
+    """Захватывает следующую готовую задачу для обработчика worker; None — очередь пуста"""
+    now = timezone.now()
+    candidates = (
+        Job.objects
+        .filter(status=Job.QUEUED, run_after__lte=now)
+        .order_by('id')
+        .values_list('id', flat=True)
+    )
+    # Задачу мог захватить другой обработчик между SELECT и UPDATE — тогда следующая
+    for pk in candidates[:10]:
+        claimed = Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+            status=Job.RUNNING, worker=worker, heartbeat=now, started_at=now, attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def report(job, progress, total=None, message=None):
+    """Сохраняет ход выполнения задачи (и отметку, что обработчик жив)"""
+    job.progress = progress
+    fields = {'progress': progress, 'heartbeat': timezone.now()}
+    if total is not None:
+        job.total = fields['total'] = total
+    if message is not None:
+        job.message = fields['message'] = message[:255]
+    Job.objects.filter(pk=job.pk).update(**fields)
+
+
+def run(job):
+    """Выполняет захваченную задачу; при ошибке — повтор позже или состояние «ошибка»"""
+    func = TASKS.get(job.kind)
+    try:
+        if func is None:
+            raise LookupError(f'Неизвестная задача: {job.kind}')
+        result = func(job)
+    except Exception as e:
+        retry = job.attempts < job.max_attempts
+        logger.warning('Задача %s, попытка %s из %s: %s', job, job.attempts, job.max_attempts, e)
+        fields = {'error': traceback.format_exc(), 'message': str(e)[:255]}
+        if retry:
+            fields.update(status=Job.QUEUED, run_after=timezone.now() + timedelta(seconds=_retry_delay(job.attempts)))
+        else:
+            fields.update(status=Job.FAILED, finished_at=timezone.now())
+        Job.objects.filter(pk=job.pk).update(**fields)
+    else:
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.DONE, result=result, error='', finished_at=timezone.now(),
+            progress=job.total if job.total is not None else job.progress,
+        )
+    job.refresh_from_db()
+    return job
+
+
+def requeue_stale():
+    """Возвращает в очередь задачи, обработчик которых перестал отчитываться"""
+    deadline = timezone.now() - timedelta(seconds=getattr(settings, 'DDS_JOB_TIMEOUT', 3600))
+    return Job.objects.filter(status=Job.RUNNING, heartbeat__lt=deadline).update(
+        status=Job.QUEUED, worker='', run_after=timezone.now(), message='Возвращена в очередь'
+    )
+
+
+# ---------- Задачи ----------
+
+@task('export')
+def export_job(job):
+    """Выгрузка по фильтрам job.params['filters'] в файл формата job.params['format']"""
+    fmt = job.params.get('format', 'csv')
+    stream = {'csv': stream_csv, 'xlsx': stream_xlsx}[fmt]
+    filters = job.params.get('filters', {})
+    total = filter_transactions(Transaction.objects.order_by(), filters).count()
+    report(job, 0, total, 'Выгрузка')
+
+    def counted(rows):
+        for count, row in enumerate(rows, start=1):
+            if count % REPORT_EVERY == 0:
+                report(job, count)
+            yield row
+
+    path = result_dir() / f'export-{job.pk}.{fmt}'
+    with open(path, 'wb') as f:
+        for chunk in stream(counted(export_rows(filters))):
+            f.write(chunk.encode() if isinstance(chunk, str) else chunk)
+    return {'file': path.name, 'rows': total}
+
+
+@task('import')
+def import_job(job):
+    """
+    Импорт файла job.params['file'] из каталога результатов (CSV или JSONL);
+    файл удаляется после импорта. Ход — число прочитанных строк: он
+    сохраняется вместе с каждой пачкой, и повтор после ошибки продолжает
+    со следующей строки, не вставляя сохранённые пачки ещё раз
+    """
+    path = result_dir() / job.params['file']
+    out, err = StringIO(), StringIO()
+    skip = job.progress
+    report(job, skip, message=f'Импорт со строки {skip + 1}' if skip else 'Импорт')
+    command = import_transactions.Command(on_batch=lambda read: report(job, read))
+    call_command(command, str(path), skip=skip, stdout=out, stderr=err,
+                 **{key: value for key, value in job.params.items() if key in ('format', 'batch_size')})
+    os.remove(path)
+    return {'output': out.getvalue().strip(), 'errors': err.getvalue().strip().splitlines()}
+
+
+@task('rebuild')
+def rebuild_job(job):
+    """Пересчёт дневных сводок и витрины списка"""
+    report(job, 0, 2, 'Пересчёт сводок')
+    rows = rollups.rebuild()
+    report(job, 1, message='Пересчёт витрины')
+    listing_rows = listing.rebuild()
+    conditional.bump_ledger_version()
+    return {'rollups': rows, 'listing': listing_rows}
@@ -0,0 +1,140 @@
+"""
+Денормализованная витрина таблицы транзакций (TransactionListing).
+
+Строка витрины содержит всё, что выводится в таблице главной страницы и в
+выгрузке, включая названия справочников, а также ключи фильтров и дату.
+Список и выгрузка, если включена настройка DDS_LISTING_READ_MODEL, читают
+одну таблицу без JOIN со справочниками.
+
+Витрина поддерживается всегда, независимо от настройки, поэтому её можно
+включить без пересчёта:
+- сохранение транзакции — upsert одной строки (названия из кэша справочников);
+- удаление транзакции — удаление строки;
+- пачка bulk_create_transactions — одна вставка пачкой;
+- переименование справочника — один UPDATE всех строк с этим справочником;
+- перенос транзакций на другой справочник — один UPDATE строк.
+Каждое из этих обновлений выполняется в той же транзакции БД, что и
+запись, которая его вызвала (models.AtomicModel, bulk.py). Изменения в
+обход моделей исправляет полный пересчёт (rebuild_listing).
+
+Поиск по комментарию по-прежнему идёт по таблице транзакций: полнотекстовый
+индекс построен по ней.
+
+Содержит:
+- use_listing: читать ли список с данными фильтрами из витрины
+- EXPORT_FIELDS: поля выгрузки в витрине вместо полей через JOIN
+- sync_transactions / remove_transactions: учёт изменённых и удалённых транзакций
+- rename: обновление названия справочника во всех строках
+- move: перенос строк на другие справочники
+- rebuild: полный пересчёт витрины по таблице транзакций
+"""
+
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+
+from .dictionaries import get_dictionaries
+from .models import Category, Status, Subcategory, Transaction, TransactionListing, Type
+from .search import SEARCH_PARAM
+
+# Справочник -> (поле id, поле названия) в витрине
+NAME_FIELDS = {
+    Status: ('status_id', 'status_name'),
+    Type: ('operation_id', 'operation_name'),
+    Category: ('category_id', 'category_name'),
+    Subcategory: ('subcategory_id', 'subcategory_name'),
+}
+
+# Поле выгрузки через JOIN -> поле витрины
+EXPORT_FIELDS = {
+    'operation__name': 'operation_name',
+    'category__name': 'category_name',
+    'subcategory__name': 'subcategory_name',
+    'status__name': 'status_name',
+}
+
+UPDATE_FIELDS = [
+    'date', 'status_id', 'status_name', 'operation_id', 'operation_name', 'category_id', 'category_name',
+    'subcategory_id', 'subcategory_name', 'amount', 'comment',
+]
+
+
+def use_listing(params):
+    """Читать ли список с фильтрами params из витрины"""
+    return getattr(settings, 'DDS_LISTING_READ_MODEL', False) and not params.get(SEARCH_PARAM)
+
+
+def _name(index, pk, related):
+    """Название справочника из кэша; если кэш ещё не знает id — из связанного объекта"""
+    obj = index.get(pk)
+    return obj.name if obj is not None else related().name
+
+
+def listing_row(obj, tree):
+    """Строка витрины для транзакции obj"""
+    return TransactionListing(
+        id=obj.pk,
+        date=obj.date,
+        status_id=obj.status_id,
+        status_name=_name(tree.status_by_id, obj.status_id, lambda: obj.status),
+        operation_id=obj.operation_id,
+        operation_name=_name(tree.type_by_id, obj.operation_id, lambda: obj.operation),
+        category_id=obj.category_id,
+        category_name=_name(tree.category_by_id, obj.category_id, lambda: obj.category),
+        subcategory_id=obj.subcategory_id,
+        subcategory_name=_name(tree.subcategory_by_id, obj.subcategory_id, lambda: obj.subcategory),
+        amount=obj.amount,
+        comment=obj.comment,
+    )
+
+
+def sync_transactions(objs, batch_size=None):
+    """Вставляет или обновляет строки витрины для транзакций objs одним upsert на пачку"""
+    tree = get_dictionaries()
+    TransactionListing.objects.bulk_create(
+        [listing_row(obj, tree) for obj in objs],
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['id'],
+        update_fields=UPDATE_FIELDS,
+    )
+
+
+def remove_transactions(ids):
+    """Удаляет строки витрины удалённых транзакций"""
+    TransactionListing.objects.filter(pk__in=ids).delete()
+
+
+def rename(obj):
+    """Переносит название справочника obj во все строки витрины, где оно другое"""
+    id_field, name_field = NAME_FIELDS[type(obj)]
+    return (
+        TransactionListing.objects
+        .filter(**{id_field: obj.pk})
+        .exclude(**{name_field: obj.name})
+        .update(**{name_field: obj.name})
+    )
+
+
+def move(lookup, objs):
+    """Переносит строки, выбранные lookup, на справочники objs (id и названия) одним UPDATE"""
+    values = {}
+    for obj in objs:
+        id_field, name_field = NAME_FIELDS[type(obj)]
+        values.update({id_field: obj.pk, name_field: obj.name})
+    return TransactionListing.objects.filter(**lookup).update(**values)
+
+
+def rebuild(batch_size=1000):
+    """Полный пересчёт витрины по таблице транзакций"""
+    tree = get_dictionaries()
+    count = 0
+    with transaction.atomic():
+        TransactionListing.objects.all().delete()
+        rows = Transaction.objects.for_listing().order_by().iterator(chunk_size=batch_size)
+        # Вставка пачками по мере чтения: вся таблица в память не загружается
+        while batch := [listing_row(obj, tree) for obj in islice(rows, batch_size)]:
+            TransactionListing.objects.bulk_create(batch)
+            count += len(batch)
+    return count
@@ -0,0 +1,261 @@
+"""
+Замеры времени ключевых страниц на текущей базе (например, после seed_ledger).
+
+Запросы выполняются тестовым клиентом Django в этом же процессе, без
+HTTP-сервера: замеряется обработка запроса приложением — представление,
+запросы к БД, рендеринг шаблона. Сценарии:
+- главная страница без фильтров и с каждым фильтром, поиск по комментарию;
+- глубокая страница: последняя страница OFFSET и курсор в конце списка;
+- каскадная AJAX-подгрузка категорий, подкатегорий и дерева справочников;
+- POST создания и редактирования транзакции;
+- панель справочников и список транзакций в админке.
+
+Каждый сценарий выполняется --warmup раз без замера и --repeat раз с замером.
+Изменения (POST, служебный пользователь админки, сессия) откатываются: вся
+серия идёт внутри транзакции БД, которая в конце отменяется.
+
+Результаты сохраняются в JSON (--json); с --compare сравниваются с прошлым
+прогоном, и команда завершается с ошибкой, если медиана времени выросла
+больше чем на --threshold (и больше чем на --min-delta-ms) или выросло
+число запросов к БД.
+
+Запуск:
+    python manage.py seed_ledger --transactions 1000000 --clear
+    python manage.py benchmark --json before.json
+    python manage.py benchmark --json after.json --compare before.json
+"""
+
+import json
+import platform
+import statistics
+import subprocess
+import time
+from datetime import timedelta
+from fnmatch import fnmatch
+
+import django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max, Min, Sum
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from DDSPosts.management.commands.load_test import percentile
+from DDSPosts.models import DailyCashFlow, Transaction
+from DDSPosts.pagination import CursorPaginator
+from DDSPosts.views import TransactionListView
+
+
+class Rollback(Exception):
+    """Отмена транзакции БД после серии замеров"""
+
+
+class Scenario:
+    """Один замеряемый запрос"""
+
+    def __init__(self, name, url, params=None, data=None, status=200):
+        self.name = name
+        self.url = url
+        self.params = params or {}
+        self.data = data  # тело POST; None — запрос GET
+        self.status = status
+
+    def request(self, client):
+        if self.data is None:
+            response = client.get(self.url, self.params)
+        else:
+            # Сохранение отменяется, чтобы повторы работали с теми же данными
+            with transaction.atomic():
+                response = client.post(self.url, self.data)
+                transaction.set_rollback(True)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+
+class Command(BaseCommand):
+    help = 'Замеряет ключевые страницы и сравнивает результаты с прошлым прогоном'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Замеров на сценарий')
+        parser.add_argument('--warmup', type=int, default=1, help='Прогонов без замера на сценарий')
+        parser.add_argument('--only', action='append', default=[],
+                            help='Только сценарии, подходящие под шаблон (можно несколько)')
+        parser.add_argument('--json', dest='json_path', help='Сохранить результаты в JSON')
+        parser.add_argument('--compare', help='JSON прошлого прогона для сравнения')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='Допустимый относительный рост медианы (0.25 = 25%%)')
+        parser.add_argument('--min-delta-ms', type=float, default=2.0,
+                            help='Рост медианы меньше этого значения не считается регрессией')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1 or options['warmup'] < 0:
+            raise CommandError('--repeat должен быть не меньше 1, --warmup — не меньше 0')
+        if not Transaction.objects.exists():
+            raise CommandError('Нет транзакций: сначала выполните seed_ledger')
+
+        results = {}
+        try:
+            # Тестовый клиент обращается к хосту testserver
+            with transaction.atomic(), override_settings(ALLOWED_HOSTS=['testserver']):
+                client = Client()
+                client.force_login(User.objects.create_superuser('__benchmark__', password=None))
+                for scenario in self.scenarios():
+                    if options['only'] and not any(fnmatch(scenario.name, p) for p in options['only']):
+                        continue
+                    results[scenario.name] = self.measure(client, scenario, options)
+                    self.report(scenario.name, results[scenario.name])
+                raise Rollback
+        except Rollback:
+            pass
+
+        run = {'meta': self.meta(), 'results': results}
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as f:
+                json.dump(run, f, ensure_ascii=False, indent=2)
+        if options['compare']:
+            self.compare(run, options)
+
+    def scenarios(self):
+        """Сценарии с параметрами, подобранными по данным в базе"""
+        # Самые частые значения справочников — по дневным сводкам, без чтения транзакций
+        popular = {
+            field: DailyCashFlow.objects.values(field).annotate(n=Sum('count')).order_by('-n')[0][field]
+            for field in ('status_id', 'operation_id', 'category_id', 'subcategory_id')
+        }
+        last_day = timezone.localdate(Transaction.objects.aggregate(last=Max('date'))['last'])
+        first_day = timezone.localdate(Transaction.objects.aggregate(first=Min('date'))['first'])
+        month_ago = max(first_day, last_day - timedelta(days=30))
+        word = (Transaction.objects.exclude(comment='').values_list('comment', flat=True).first()
+                or 'оплата').split()[0]
+
+        # Курсор на последней полной странице списка без фильтров
+        count = Transaction.objects.count()
+        paginate_by = TransactionListView.paginate_by
+        tail = Transaction.objects.order_by(*CursorPaginator.ordering)[max(count - paginate_by - 1, 0)]
+        deep_cursor = CursorPaginator(Transaction.objects.all(), paginate_by).encode(tail)
+
+        sample = Transaction.objects.order_by('-id').first()
+        form = {
+            'date': timezone.localdate(sample.date).isoformat(),
+            'operation': sample.operation_id,
+            'category': sample.category_id,
+            'subcategory': sample.subcategory_id,
+            'status': sample.status_id,
+            'amount': '123.45',
+            'comment': 'benchmark',
+        }
+
+        home = reverse('transaction_list')
+        return [
+            Scenario('list', home),
+            Scenario('list_status', home, {'status': popular['status_id']}),
+            Scenario('list_type', home, {'type': popular['operation_id']}),
+            Scenario('list_category', home, {'category': popular['category_id']}),
+            Scenario('list_subcategory', home, {'subcategory': popular['subcategory_id']}),
+            Scenario('list_date', home, {'date': last_day.isoformat()}),
+            Scenario('list_period', home, {'date_from': month_ago.isoformat(), 'date_to': last_day.isoformat()}),
+            Scenario('list_search', home, {'q': word}),
+            Scenario('list_combined', home, {'type': popular['operation_id'], 'category': popular['category_id'],
+                                             'date_from': month_ago.isoformat()}),
+            Scenario('page_deep_offset', home, {'page': 'last'}),
+            Scenario('page_deep_cursor', home, {'cursor': deep_cursor}),
+            Scenario('ajax_categories', reverse('ajax_load_categories'), {'type_id': popular['operation_id']}),
+            Scenario('ajax_subcategories', reverse('ajax_load_subcategories'),
+                     {'category_id': popular['category_id']}),
+            Scenario('ajax_dictionary_tree', reverse('ajax_dictionary_tree')),
+            Scenario('create_post', reverse('create'), data=form, status=302),
+            Scenario('edit_post', reverse('edit', args=[sample.pk]), data=form, status=302),
+            Scenario('directory_panel', reverse('directory_panel')),
+            Scenario('admin_changelist', reverse('admin:DDSPosts_transaction_changelist')),
+            Scenario('admin_changelist_filtered', reverse('admin:DDSPosts_transaction_changelist'),
+                     {'category__id__exact': popular['category_id']}),
+        ]
+
+    def measure(self, client, scenario, options):
+        """Прогон сценария: время (мс) и число запросов к БД"""
+        queries = 0
+
+        def count_queries(execute, *args):
+            nonlocal queries
+            queries += 1
+            return execute(*args)
+
+        for _ in range(options['warmup']):
+            scenario.request(client)
+        timings = []
+        for _ in range(options['repeat']):
+            queries = 0
+            with connection.execute_wrapper(count_queries):
+                started = time.perf_counter()
+                response = scenario.request(client)
+                timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != scenario.status:
+                raise CommandError(
+                    f'{scenario.name}: код ответа {response.status_code}, ожидался {scenario.status}'
+                )
+
+        timings.sort()
+        return {
+            'url': scenario.url,
+            'params': {key: str(value) for key, value in scenario.params.items()},
+            'queries': queries,
+            'min_ms': round(timings[0], 2),
+            'median_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+        }
+
+    def meta(self):
+        """Условия прогона: без них результаты разных машин и баз несравнимы"""
+        try:
+            commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                    text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'commit': commit,
+            'created': timezone.now().isoformat(timespec='seconds'),
+            'transactions': Transaction.objects.count(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+        }
+
+    def report(self, name, result):
+        self.stdout.write(
+            f'{name:<28} медиана {result["median_ms"]:>9.2f} мс, p95 {result["p95_ms"]:>9.2f} мс, '
+            f'запросов {result["queries"]}'
+        )
+
+    def compare(self, run, options):
+        """Сравнение с прошлым прогоном; при регрессии — ошибка"""
+        with open(options['compare'], encoding='utf-8') as f:
+            previous = json.load(f)
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'Сравнение с {options["compare"]} (коммит {previous["meta"].get("commit") or "?"})'
+        ))
+        if previous['meta'].get('transactions') != run['meta']['transactions']:
+            self.stdout.write(self.style.WARNING(
+                f'Разный объём данных: {previous["meta"].get("transactions")} и {run["meta"]["transactions"]} транзакций'
+            ))
+
+        regressions = []
+        for name, result in run['results'].items():
+            before = previous['results'].get(name)
+            if before is None:
+                continue
+            delta = result['median_ms'] - before['median_ms']
+            ratio = result['median_ms'] / before['median_ms'] - 1 if before['median_ms'] else 0
+            line = (f'{name:<28} {before["median_ms"]:>9.2f} -> {result["median_ms"]:>9.2f} мс ({ratio:+.0%}), '
+                    f'запросов {before["queries"]} -> {result["queries"]}')
+            slower = ratio > options['threshold'] and delta > options['min_delta_ms']
+            if slower or result['queries'] > before['queries']:
+                regressions.append(name)
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
+
+        if regressions:
+            raise CommandError(f'Регрессия производительности: {", ".join(regressions)}')
+        self.stdout.write(self.style.SUCCESS('Регрессий нет'))
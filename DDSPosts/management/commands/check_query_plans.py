@@ -0,0 +1,140 @@
+"""
+Проверка планов запросов главной страницы.
+
+Для каждой комбинации фильтров, которую может построить TransactionListView,
+выполняет EXPLAIN запроса страницы (OFFSET- и курсорного режима) и завершается
+с ошибкой, если план содержит полное сканирование таблицы транзакций или
+сортировку во временной структуре. Запросы с поиском по комментарию
+сортируются по релевантности, для них проверяется только отсутствие
+полного сканирования: отбор должен идти по полнотекстовому индексу.
+
+Запуск:
+    python manage.py check_query_plans [-v 2]
+"""
+
+import re
+from itertools import combinations
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from DDSPosts.filters import DATE_FILTERS, FIELD_FILTERS, FILTER_PARAMS, filter_transactions
+from DDSPosts.models import Transaction
+from DDSPosts.pagination import CursorPaginator
+from DDSPosts.search import SEARCH_PARAM
+from DDSPosts.views import TransactionListView
+
+FULL_SCAN = 'полное сканирование'
+
+# Признаки плохого плана для каждого поддерживаемого бэкенда
+PLAN_PROBLEMS = {
+    'sqlite': [
+        (re.compile(r'\bSCAN "?%s"?\b' % re.escape(Transaction._meta.db_table)), FULL_SCAN),
+        (re.compile(r'TEMP B-TREE FOR (ORDER|GROUP) BY'), 'сортировка во временном B-дереве'),
+    ],
+    'postgresql': [
+        (re.compile(r'Seq Scan on "?%s"?' % re.escape(Transaction._meta.db_table)), FULL_SCAN),
+        (re.compile(r'(^|->\s+)Sort\b', re.M), 'сортировка'),
+    ],
+}
+
+# Без фильтров допустим проход по индексу даты в порядке сортировки:
+# LIMIT останавливает его на первой странице
+UNFILTERED_SCAN = {
+    'sqlite': re.compile(r'\bSCAN "?%s"? USING (COVERING )?INDEX transaction_date_idx' % re.escape(Transaction._meta.db_table)),
+}
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN для всех комбинаций фильтров главной страницы'
+
+    def sample_params(self):
+        """Пример значения для каждого GET-параметра фильтра"""
+        params = {name: '1' for name in FIELD_FILTERS}
+        for name in DATE_FILTERS:
+            params[name] = timezone.localdate().isoformat()
+        params[SEARCH_PARAM] = 'оплата'
+        return params
+
+    def page_querysets(self, params):
+        """Запросы страницы, которые строит представление при данных фильтрах"""
+        qs = filter_transactions(Transaction.objects.for_listing(), params)
+        page_size = TransactionListView.paginate_by
+        cursor = CursorPaginator(qs, page_size)
+        return {
+            'offset': qs[:page_size],
+            'cursor': cursor.page_queryset(),
+            'cursor-next': cursor.page_queryset(timezone.now(), 1),
+            'cursor-prev': cursor.page_queryset(timezone.now(), 1, backwards=True),
+        }
+
+    def search_querysets(self, params):
+        """Запрос страницы результатов поиска (сортировка по релевантности)"""
+        qs = filter_transactions(Transaction.objects.for_listing(), params)
+        return {'search': qs.order_by('-search_rank', '-date', '-id')[:TransactionListView.paginate_by]}
+
+    def set_planner(self, ordered_index):
+        """
+        PostgreSQL: на маленькой таблице планировщик выбирает Seq Scan или
+        Bitmap Scan с сортировкой независимо от индексов. Запрещаем их, чтобы
+        проверить, что план вообще существует: для страниц — проход по
+        индексу в порядке сортировки, для поиска (GIN-индекс доступен только
+        через Bitmap Scan, результат сортируется по релевантности) — отбор
+        по индексу без полного сканирования.
+        """
+        if connection.vendor != 'postgresql':
+            return
+        settings = {'enable_seqscan': 'off'}
+        settings['enable_bitmapscan'] = settings['enable_sort'] = 'off' if ordered_index else 'on'
+        with connection.cursor() as cursor:
+            for name, value in settings.items():
+                cursor.execute(f'SET LOCAL {name} = {value}')
+
+    def check_plan(self, label, mode, qs, problems, verbosity):
+        """EXPLAIN запроса; возвращает True, если план без проблем"""
+        plan = qs.explain()
+        if label == '(без фильтров)' and connection.vendor in UNFILTERED_SCAN:
+            plan_checked = UNFILTERED_SCAN[connection.vendor].sub('', plan)
+        else:
+            plan_checked = plan
+        found = [reason for pattern, reason in problems if pattern.search(plan_checked)]
+        if found:
+            self.stdout.write(self.style.ERROR(f'FAIL {label} [{mode}]: {", ".join(found)}'))
+            self.stdout.write(plan)
+            return False
+        self.stdout.write(f'OK   {label} [{mode}]')
+        if verbosity > 1:
+            self.stdout.write(plan)
+        return True
+
+    def handle(self, *args, **options):
+        problems = PLAN_PROBLEMS.get(connection.vendor)
+        if problems is None:
+            raise CommandError(f'Бэкенд {connection.vendor} не поддерживается')
+        scan_problems = [(pattern, reason) for pattern, reason in problems if reason == FULL_SCAN]
+
+        sample = self.sample_params()
+        names = [name for name in FILTER_PARAMS if name != SEARCH_PARAM]
+        failures = 0
+
+        with transaction.atomic():
+            for size in range(len(names) + 1):
+                for combo in combinations(names, size):
+                    params = {name: sample[name] for name in combo}
+                    label = '+'.join(combo) or '(без фильтров)'
+                    self.set_planner(ordered_index=True)
+                    for mode, qs in self.page_querysets(params).items():
+                        if not self.check_plan(label, mode, qs, problems, options['verbosity']):
+                            failures += 1
+
+                    params[SEARCH_PARAM] = sample[SEARCH_PARAM]
+                    label = '+'.join(combo + (SEARCH_PARAM,))
+                    self.set_planner(ordered_index=False)
+                    for mode, qs in self.search_querysets(params).items():
+                        if not self.check_plan(label, mode, qs, scan_problems, options['verbosity']):
+                            failures += 1
+
+        if failures:
+            raise CommandError(f'Планов с полным сканированием или сортировкой: {failures}')
+        self.stdout.write(self.style.SUCCESS('Все планы используют индексы'))
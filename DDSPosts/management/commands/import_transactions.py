@@ -0,0 +1,216 @@
+"""
+Массовый импорт транзакций из CSV или JSONL.
+
+Файл читается потоково, построчно: память не зависит от размера файла.
+Названия статуса, типа, категории и подкатегории сопоставляются с id по
+словарям в памяти (из кэша справочников); цепочка тип -> категория ->
+подкатегория проверяется так же, как в TransactionForm. Корректные строки
+вставляются пачками через bulk_create, каждая пачка — в своей транзакции БД.
+
+Прерванный импорт продолжается с --skip N, где N — число строк, прочитанных
+до последней сохранённой пачки: уже вставленные строки не повторяются.
+Фоновая задача import (jobs.py) передаёт обработчик on_batch, который
+сохраняет это число в той же транзакции, что и пачку.
+
+Колонки: date, status, type (или operation), category, subcategory, amount,
+comment (необязательная).
+
+Запуск:
+    python manage.py import_transactions выписка.csv [--batch-size 5000]
+    python manage.py import_transactions выписка.jsonl --rejects rejected.csv
+    python manage.py import_transactions выписка.csv --skip 120000
+"""
+
+import csv
+import json
+import sys
+import time
+
+from django import forms
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from DDSPosts.bulk import bulk_create_transactions
+from DDSPosts.dictionaries import get_dictionaries
+from DDSPosts.models import Transaction
+
+# Сообщение об ошибке выбора — то же, что у полей выбора TransactionForm
+INVALID_CHOICE = forms.ModelChoiceField.default_error_messages['invalid_choice']
+REQUIRED = forms.Field.default_error_messages['required']
+
+
+class RowError(Exception):
+    """Строка файла не прошла проверку"""
+
+
+class TransactionResolver:
+    """Сопоставление названий справочников с объектами и проверка строки"""
+
+    def __init__(self, tree):
+        self.statuses = {s.name: s for s in tree.statuses}
+        self.types = {t.name: t for t in tree.types}
+        self.categories = {(c.type_id, c.name): c for c in tree.categories}
+        self.subcategories = {(sc.category_id, sc.name): sc for sc in tree.subcategories}
+        self.date_field = forms.DateTimeField()
+        self.amount_field = Transaction._meta.get_field('amount')
+
+    def value(self, row, *names):
+        """Значение первой найденной колонки из names, без пробелов по краям"""
+        for name in names:
+            value = row.get(name)
+            if value not in (None, ''):
+                return str(value).strip()
+        raise RowError(f'{names[0]}: {REQUIRED}')
+
+    def choice(self, mapping, key, field):
+        """Объект справочника по ключу или ошибка, как у поля формы"""
+        try:
+            return mapping[key]
+        except KeyError:
+            raise RowError(f'{field}: {INVALID_CHOICE}')
+
+    def resolve(self, row):
+        """Проверяет строку и возвращает несохранённую транзакцию"""
+        status = self.choice(self.statuses, self.value(row, 'status'), 'status')
+        operation = self.choice(self.types, self.value(row, 'type', 'operation'), 'type')
+        category = self.choice(self.categories, (operation.pk, self.value(row, 'category')), 'category')
+        subcategory = self.choice(self.subcategories, (category.pk, self.value(row, 'subcategory')), 'subcategory')
+        try:
+            date = self.date_field.clean(self.value(row, 'date'))
+        except ValidationError as e:
+            raise RowError(f'date: {" ".join(e.messages)}')
+        try:
+            amount = self.amount_field.clean(self.value(row, 'amount'), None)
+        except ValidationError as e:
+            raise RowError(f'amount: {" ".join(e.messages)}')
+
+        return Transaction(
+            date=date,
+            status=status,
+            operation=operation,
+            category=category,
+            subcategory=subcategory,
+            amount=amount,
+            comment=str(row.get('comment') or '').strip(),
+        )
+
+
+class Command(BaseCommand):
+    help = 'Потоковый импорт транзакций из CSV или JSONL'
+
+    def __init__(self, *args, on_batch=None, **kwargs):
+        """
+        on_batch(read) вызывается после вставки каждой пачки внутри её
+        транзакции БД; read — число прочитанных строк данных, включая
+        пропущенные и отклонённые
+        """
+        super().__init__(*args, **kwargs)
+        self.on_batch = on_batch
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу (- для stdin)')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Формат файла (по умолчанию — по расширению)')
+        parser.add_argument('--delimiter', default=',', help='Разделитель CSV')
+        parser.add_argument('--encoding', default='utf-8-sig', help='Кодировка файла')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Строк в одном bulk_create и одной транзакции БД')
+        parser.add_argument('--skip', type=int, default=0,
+                            help='Пропустить первые N строк данных (продолжение прерванного импорта)')
+        parser.add_argument('--rejects', help='CSV-файл для отклонённых строк')
+        parser.add_argument('--max-errors', type=int, default=20,
+                            help='Сколько ошибок вывести в отчёт')
+
+    def read_rows(self, stream, fmt, delimiter):
+        """Генератор (номер строки, словарь колонок)"""
+        if fmt == 'csv':
+            reader = csv.DictReader(stream, delimiter=delimiter)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_num, line in enumerate(stream, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    yield line_num, e
+                    continue
+                yield line_num, row if isinstance(row, dict) else ValueError('ожидался объект JSON')
+
+    def save_batch(self, batch, read):
+        """Вставляет пачку и сообщает on_batch число прочитанных строк — в одной транзакции БД"""
+        with transaction.atomic():
+            created = bulk_create_transactions(batch)
+            if self.on_batch is not None:
+                self.on_batch(read)
+        return len(created)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size должен быть положительным')
+        skip = options['skip']
+        if skip < 0:
+            raise CommandError('--skip не может быть отрицательным')
+
+        try:
+            stream = sys.stdin if path == '-' else open(path, encoding=options['encoding'], newline='')
+        except OSError as e:
+            raise CommandError(f'Не удалось открыть файл: {e}')
+
+        rejects_file = rejects = None
+        if options['rejects']:
+            rejects_file = open(options['rejects'], 'w', encoding='utf-8', newline='')
+            rejects = csv.writer(rejects_file)
+            rejects.writerow(['line', 'error', 'row'])
+
+        resolver = TransactionResolver(get_dictionaries())
+        started = time.monotonic()
+        total = imported = rejected = 0
+        errors = []
+        batch = []
+
+        try:
+            for line_num, row in self.read_rows(stream, fmt, options['delimiter']):
+                total += 1
+                if total <= skip:
+                    continue
+                try:
+                    if isinstance(row, Exception):
+                        raise RowError(f'JSON: {row}')
+                    batch.append(resolver.resolve(row))
+                except RowError as e:
+                    rejected += 1
+                    if len(errors) < options['max_errors']:
+                        errors.append(f'строка {line_num}: {e}')
+                    if rejects:
+                        rejects.writerow([line_num, str(e), json.dumps(row, ensure_ascii=False, default=str)])
+                    continue
+
+                if len(batch) >= batch_size:
+                    imported += self.save_batch(batch, total)
+                    batch = []
+
+            if batch:
+                imported += self.save_batch(batch, total)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if rejects_file:
+                rejects_file.close()
+
+        elapsed = time.monotonic() - started
+        rate = imported / elapsed if elapsed else 0
+        for error in errors:
+            self.stderr.write(error)
+        if rejected > len(errors):
+            self.stderr.write(f'... и ещё {rejected - len(errors)} ошибок')
+        skipped = f', пропущено: {min(skip, total)}' if skip else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано строк: {total}{skipped}, импортировано: {imported}, отклонено: {rejected}. '
+            f'Время: {elapsed:.2f} с, {rate:.0f} строк/с'
+        ))
@@ -0,0 +1,188 @@
+"""
+Нагрузочный тест HTTP-сервера: N одновременных клиентов с keep-alive.
+
+Клиенты — корутины asyncio на «сырых» соединениях HTTP/1.1, без сторонних
+библиотек, поэтому сам тест выдерживает 1000 клиентов в одном процессе.
+Для сравнения WSGI и ASGI тест запускается против двух серверов с одинаковым
+числом процессов, например:
+
+    gunicorn DDS.wsgi -w 4 --threads 8 -b 127.0.0.1:8001
+    DDS_ASYNC_VIEWS=1 uvicorn DDS.asgi:application --workers 4 --port 8002
+
+    python manage.py load_test http://127.0.0.1:8001/ --clients 100,500,1000 --json wsgi.json
+    python manage.py load_test http://127.0.0.1:8002/ --clients 100,500,1000 --json asgi.json --compare wsgi.json
+
+(для 1000 соединений может понадобиться ulimit -n 4096).
+
+Запуск:
+    python manage.py load_test URL [--clients 100,500,1000] [--duration 10]
+"""
+
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def percentile(values, q):
+    """q-й процентиль (0..100) отсортированного списка"""
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))
+    return values[index]
+
+
+class HttpClient:
+    """Одно keep-alive соединение HTTP/1.1"""
+
+    def __init__(self, host, port, request):
+        self.host = host
+        self.port = port
+        self.request = request
+        self.reader = self.writer = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.reader = self.writer = None
+
+    async def get(self):
+        """Отправляет запрос и читает ответ целиком; возвращает код статуса"""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(self.request)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('Соединение закрыто сервером')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if 'content-length' in headers:
+            await self.reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        else:
+            await self.reader.read()
+            await self.close()
+        if headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return status
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный тест: задержки и пропускная способность при N одновременных клиентах'
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='Адрес страницы, например http://127.0.0.1:8000/')
+        parser.add_argument('--clients', default='100,500,1000',
+                            help='Число одновременных клиентов, через запятую')
+        parser.add_argument('--duration', type=float, default=10,
+                            help='Длительность каждого прогона, секунд')
+        parser.add_argument('--json', dest='json_path', help='Сохранить результаты в JSON')
+        parser.add_argument('--compare', help='JSON предыдущего прогона для сравнения')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('Поддерживаются только адреса http://')
+        try:
+            levels = [int(value) for value in options['clients'].split(',')]
+        except ValueError:
+            raise CommandError('--clients: список чисел через запятую')
+
+        path = (url.path or '/') + (f'?{url.query}' if url.query else '')
+        host_header = url.netloc
+        request = (f'GET {path} HTTP/1.1\r\nHost: {host_header}\r\n'
+                   f'Connection: keep-alive\r\nAccept: */*\r\n\r\n').encode()
+
+        results = []
+        for clients in levels:
+            result = asyncio.run(self.run_level(url.hostname, url.port or 80, request, clients,
+                                                options['duration']))
+            results.append(result)
+            self.report(result)
+
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as f:
+                json.dump({'url': options['url'], 'results': results}, f, ensure_ascii=False, indent=2)
+        if options['compare']:
+            self.compare(results, options['compare'])
+
+    async def run_level(self, host, port, request, clients, duration):
+        """Один прогон: clients корутин шлют запросы до истечения duration"""
+        latencies, errors, statuses = [], 0, {}
+        deadline = time.monotonic() + duration
+
+        async def worker():
+            nonlocal errors
+            client = HttpClient(host, port, request)
+            while time.monotonic() < deadline:
+                started = time.monotonic()
+                try:
+                    status = await client.get()
+                except (OSError, ValueError, IndexError, asyncio.IncompleteReadError):
+                    errors += 1
+                    await client.close()
+                    continue
+                latencies.append(time.monotonic() - started)
+                statuses[status] = statuses.get(status, 0) + 1
+            await client.close()
+
+        started = time.monotonic()
+        await asyncio.gather(*(worker() for _ in range(clients)))
+        elapsed = time.monotonic() - started
+
+        latencies.sort()
+        ms = lambda value: round(value * 1000, 1) if value is not None else None  # noqa: E731
+        return {
+            'clients': clients,
+            'requests': len(latencies),
+            'errors': errors,
+            'statuses': {str(code): count for code, count in sorted(statuses.items())},
+            'rps': round(len(latencies) / elapsed, 1),
+            'mean_ms': ms(statistics.fmean(latencies)) if latencies else None,
+            'p50_ms': ms(percentile(latencies, 50)),
+            'p95_ms': ms(percentile(latencies, 95)),
+            'p99_ms': ms(percentile(latencies, 99)),
+        }
+
+    def report(self, result):
+        self.stdout.write(
+            f'{result["clients"]:>5} клиентов: {result["requests"]} запросов, {result["rps"]} запр/с, '
+            f'p50 {result["p50_ms"]} мс, p95 {result["p95_ms"]} мс, p99 {result["p99_ms"]} мс, '
+            f'ошибок {result["errors"]}, коды {result["statuses"]}'
+        )
+
+    def compare(self, results, path):
+        """Сравнение с предыдущим прогоном по числу клиентов"""
+        with open(path, encoding='utf-8') as f:
+            previous = {row['clients']: row for row in json.load(f)['results']}
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Сравнение с {path}'))
+        for result in results:
+            before = previous.get(result['clients'])
+            if before is None or not before['rps'] or before['p95_ms'] is None or result['p95_ms'] is None:
+                continue
+            self.stdout.write(
+                f'{result["clients"]:>5} клиентов: запр/с {before["rps"]} -> {result["rps"]} '
+                f'({result["rps"] / before["rps"] - 1:+.0%}), '
+                f'p95 {before["p95_ms"]} -> {result["p95_ms"]} мс'
+            )
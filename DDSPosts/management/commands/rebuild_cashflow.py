@@ -0,0 +1,31 @@
+"""
+Полный пересчёт дневных сводок DailyCashFlow по таблице транзакций.
+
+Нужен после изменений в обход моделей (SQL, загрузка дампа) или для
+проверки: обычные изменения учитываются в сводках автоматически.
+
+Запуск:
+    python manage.py rebuild_cashflow
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from DDSPosts import conditional, rollups
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает дневные сводки движения средств'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Строк сводки в одном INSERT')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = rollups.rebuild(batch_size=options['batch_size'])
+        conditional.bump_ledger_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'Строк сводки: {count}. Время: {time.monotonic() - started:.2f} с'
+        ))
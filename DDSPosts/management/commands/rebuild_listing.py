@@ -0,0 +1,31 @@
+"""
+Полный пересчёт витрины списка TransactionListing по таблице транзакций.
+
+Нужен после изменений в обход моделей (SQL, загрузка дампа) или для
+проверки: обычные изменения учитываются в витрине автоматически.
+
+Запуск:
+    python manage.py rebuild_listing
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from DDSPosts import conditional, listing
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает витрину списка транзакций'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Строк витрины в одном INSERT')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = listing.rebuild(batch_size=options['batch_size'])
+        conditional.bump_ledger_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'Строк витрины: {count}. Время: {time.monotonic() - started:.2f} с'
+        ))
@@ -0,0 +1,134 @@
+"""
+Обработчики очереди фоновых задач (модель Job, см. DDSPosts/jobs.py).
+
+Каждый обработчик в цикле захватывает следующую задачу и выполняет её;
+если очередь пуста — ждёт --poll секунд. Обработчики работают в потоках
+(--mode thread) или в отдельных процессах (--mode process): потоки легче,
+процессы не делят GIL и подходят для тяжёлых выгрузок. При одном
+обработчике задачи выполняются в текущем потоке.
+
+SIGINT / SIGTERM останавливают обработчики после текущей задачи. С --burst
+команда завершается, когда очередь опустеет (например, для cron).
+
+Запуск:
+    python manage.py run_workers [--workers 4] [--mode process] [--poll 1]
+    python manage.py run_workers --burst
+"""
+
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+import django
+from django.core.management.base import BaseCommand, CommandError, OutputWrapper
+from django.db import connection, connections
+
+from DDSPosts import jobs
+
+
+def work(worker, options, stop, write):
+    """Цикл одного обработчика: захват и выполнение задач до остановки"""
+    processed = 0
+    jobs.requeue_stale()
+    while not stop.is_set():
+        job = jobs.claim(worker)
+        if job is None:
+            if options['burst']:
+                break
+            stop.wait(options['poll'])
+            jobs.requeue_stale()
+            continue
+
+        started = time.monotonic()
+        job = jobs.run(job)
+        processed += 1
+        write(f'{worker}: задача #{job.pk} {job.kind} — {job.get_status_display().lower()}, '
+              f'попытка {job.attempts}, {time.monotonic() - started:.2f} с')
+        if options['max_jobs'] and processed >= options['max_jobs']:
+            break
+    return processed
+
+
+def thread_main(worker, options, stop, write):
+    """Точка входа потока-обработчика: соединение потока с БД само не закрывается"""
+    try:
+        work(worker, options, stop, write)
+    finally:
+        connection.close()
+
+
+def process_main(worker, options, stop):
+    """Точка входа процесса-обработчика"""
+    django.setup()
+    stdout = OutputWrapper(sys.stdout)
+
+    def write(message):
+        stdout.write(message)
+        # Вывод процесса в канал буферизуется блоками — сбрасываем построчно
+        stdout.flush()
+
+    try:
+        work(worker, options, stop, write)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Запускает обработчики очереди фоновых задач'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Число обработчиков')
+        parser.add_argument('--mode', choices=['thread', 'process'], default='thread',
+                            help='Обработчики в потоках или в процессах')
+        parser.add_argument('--poll', type=float, default=1.0,
+                            help='Пауза при пустой очереди, секунды')
+        parser.add_argument('--burst', action='store_true',
+                            help='Завершиться, когда очередь опустеет')
+        parser.add_argument('--max-jobs', type=int, default=0,
+                            help='Задач на обработчик до выхода (0 — без ограничения)')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers должен быть не меньше 1')
+        # Только нужные циклу параметры: options передаются в дочерние процессы
+        options = {key: options[key] for key in ('burst', 'poll', 'max_jobs', 'mode')} | {'workers': options['workers']}
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        names = [f'{prefix}:{i}' for i in range(1, options['workers'] + 1)]
+
+        if options['mode'] == 'process':
+            context = multiprocessing.get_context()
+            stop = context.Event()
+            # Дочерние процессы не должны унаследовать открытые соединения
+            connections.close_all()
+            workers = [context.Process(target=process_main, args=(name, options, stop), name=name)
+                       for name in names]
+        else:
+            stop = threading.Event()
+            workers = [threading.Thread(target=thread_main, args=(name, options, stop, self.log), name=name)
+                       for name in names[1:]]
+
+        def shutdown(signum, frame):
+            self.log('Остановка после текущих задач...')
+            stop.set()
+
+        previous = {sig: signal.signal(sig, shutdown) for sig in (signal.SIGINT, signal.SIGTERM)}
+        self.log(f'Обработчиков: {len(names)} ({options["mode"]})')
+        try:
+            for worker in workers:
+                worker.start()
+            if options['mode'] == 'thread':
+                # Первый обработчик — в текущем потоке
+                work(names[0], options, stop, self.log)
+            for worker in workers:
+                worker.join()
+        finally:
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+        self.stdout.write(self.style.SUCCESS('Обработчики остановлены'))
+
+    def log(self, message):
+        self.stdout.write(message)
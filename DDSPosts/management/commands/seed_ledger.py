@@ -0,0 +1,180 @@
+"""
+Генерация синтетического журнала транзакций для замеров производительности.
+
+Создаёт дерево справочников (статусы, типы, категории, подкатегории) и
+заданное число транзакций. Распределения неравномерные, как в реальном
+журнале:
+- даты: чем ближе к концу периода, тем больше записей;
+- справочники: частота убывает по закону Ципфа — несколько подкатегорий
+  дают основную массу записей, остальные встречаются редко.
+
+При одинаковых --seed и --end данные совпадают, поэтому результаты
+benchmark можно сравнивать между коммитами. Транзакции вставляются через
+bulk_create пачками, каждая пачка — в своей транзакции БД; дневные сводки
+и витрина списка пересчитываются один раз в конце.
+
+Запуск:
+    python manage.py seed_ledger [--transactions 1000000] [--seed 42] [--clear]
+"""
+
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from DDSPosts import conditional, dictionaries, listing, rollups
+from DDSPosts.models import Category, DailyCashFlow, Status, Subcategory, Transaction, TransactionListing, Type
+
+# Порядок очистки таблиц в --clear: ссылающиеся раньше тех, на которые ссылаются
+CLEAR_ORDER = (DailyCashFlow, TransactionListing, Transaction, Subcategory, Category, Type, Status)
+
+# Слова комментариев: поиск по комментариям работает на осмысленном тексте
+COMMENT_WORDS = (
+    'оплата', 'аренда', 'реклама', 'зарплата', 'поставщик', 'клиент', 'возврат',
+    'комиссия', 'налог', 'услуги', 'договор', 'счёт', 'доставка', 'офис',
+    'маркетинг', 'сервер', 'подписка', 'премия', 'аванс', 'закупка',
+)
+
+
+def zipf_weights(count, exponent):
+    """Накопленные веса закона Ципфа для count элементов"""
+    return list(accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+class Command(BaseCommand):
+    help = 'Генерирует справочники и транзакции с неравномерным распределением для замеров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transactions', type=int, default=1_000_000, help='Число транзакций')
+        parser.add_argument('--statuses', type=int, default=3, help='Число статусов')
+        parser.add_argument('--types', type=int, default=4, help='Число типов операций')
+        parser.add_argument('--categories', type=int, default=8, help='Категорий в каждом типе')
+        parser.add_argument('--subcategories', type=int, default=6, help='Подкатегорий в каждой категории')
+        parser.add_argument('--days', type=int, default=730, help='Длина периода, дней')
+        parser.add_argument('--end', help='Последний день периода, ГГГГ-ММ-ДД (по умолчанию — сегодня)')
+        parser.add_argument('--skew', type=float, default=1.1, help='Показатель закона Ципфа для справочников')
+        parser.add_argument('--seed', type=int, default=42, help='Начальное значение генератора')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Размер пачки bulk_create')
+        parser.add_argument('--clear', action='store_true',
+                            help='Удалить все транзакции и справочники перед генерацией')
+
+    def handle(self, *args, **options):
+        if options['transactions'] < 0 or options['days'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--transactions, --days и --batch-size должны быть положительными')
+        end = timezone.localdate()
+        if options['end']:
+            end = parse_date(options['end'])
+            if end is None:
+                raise CommandError('--end: ожидается дата ГГГГ-ММ-ДД')
+
+        rng = random.Random(options['seed'])
+        if options['clear']:
+            self.clear()
+        statuses, leaves = self.create_dictionaries(options)
+
+        # Конец периода — полночь после последнего дня, в часовом поясе TIME_ZONE
+        period_end = timezone.make_aware(datetime.combine(end + timedelta(days=1), datetime.min.time()))
+        period = options['days'] * 86400
+        status_weights = zipf_weights(len(statuses), options['skew'])
+        leaf_weights = zipf_weights(len(leaves), options['skew'])
+        # Порядок частот не должен совпадать с порядком id
+        rng.shuffle(leaves)
+
+        total, batch_size = options['transactions'], options['batch_size']
+        started = time.monotonic()
+        created = 0
+        while created < total:
+            size = min(batch_size, total - created)
+            batch_statuses = rng.choices(statuses, cum_weights=status_weights, k=size)
+            batch_leaves = rng.choices(leaves, cum_weights=leaf_weights, k=size)
+            objs = []
+            for status_id, (operation_id, category_id, subcategory_id) in zip(batch_statuses, batch_leaves):
+                # Квадрат равномерной величины: плотность растёт к концу периода
+                offset = int(period * rng.random() ** 2) + 1
+                words = rng.choices(COMMENT_WORDS, k=rng.randint(0, 4))
+                objs.append(Transaction(
+                    date=period_end - timedelta(seconds=offset),
+                    status_id=status_id,
+                    operation_id=operation_id,
+                    category_id=category_id,
+                    subcategory_id=subcategory_id,
+                    amount=Decimal(f'{rng.lognormvariate(8, 1.5):.2f}'),
+                    comment=' '.join(words),
+                ))
+            with transaction.atomic():
+                Transaction.objects.bulk_create(objs)
+            created += size
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'{created}/{total} транзакций, {created / elapsed:.0f} строк/с')
+
+        self.stdout.write('Пересчёт дневных сводок...')
+        rows = rollups.rebuild()
+        self.stdout.write('Пересчёт витрины списка...')
+        listing.rebuild()
+        conditional.bump_ledger_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано транзакций: {created} за {time.monotonic() - started:.1f} с, строк сводок: {rows}'
+        ))
+
+    def clear(self):
+        """
+        Удаляет транзакции, сводки, витрину и справочники: по одному DELETE на
+        таблицу, без сборщика удаления Django, который загружает каждую
+        строку и вызывает по ней сигналы сводок и витрины. Сводки и витрина
+        пересчитываются в конце handle()
+        """
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            # Сначала ссылающиеся таблицы: внешние ключи проверяются сразу
+            for model in CLEAR_ORDER:
+                model.objects.all()._raw_delete(DEFAULT_DB_ALIAS)
+        dictionaries.invalidate()
+        conditional.bump_ledger_version()
+        self.stdout.write('Данные удалены')
+
+    def create_dictionaries(self, options):
+        """
+        Создаёт недостающие справочники с предсказуемыми названиями;
+        возвращает id статусов и листья дерева (тип, категория, подкатегория)
+        """
+        with transaction.atomic():
+            Status.objects.bulk_create(
+                [Status(name=f'Статус {i}') for i in range(1, options['statuses'] + 1)],
+                ignore_conflicts=True,
+            )
+            Type.objects.bulk_create(
+                [Type(name=f'Тип {i}', kind=Type.INCOME if i % 2 else Type.EXPENSE)
+                 for i in range(1, options['types'] + 1)],
+                ignore_conflicts=True,
+            )
+            types = Type.objects.in_bulk([f'Тип {i}' for i in range(1, options['types'] + 1)], field_name='name')
+            Category.objects.bulk_create(
+                [Category(name=f'Категория {t}.{i}', type=types[f'Тип {t}'])
+                 for t in range(1, options['types'] + 1) for i in range(1, options['categories'] + 1)],
+                ignore_conflicts=True,
+            )
+            categories = Category.objects.filter(type__in=types.values(), name__startswith='Категория ')
+            Subcategory.objects.bulk_create(
+                [Subcategory(name=f'Подкатегория {c.name.split()[-1]}.{i}', category=c)
+                 for c in categories for i in range(1, options['subcategories'] + 1)],
+                ignore_conflicts=True,
+            )
+            statuses = list(
+                Status.objects.filter(name__startswith='Статус ').order_by('pk').values_list('pk', flat=True)
+            )
+            leaves = list(
+                Subcategory.objects
+                .filter(category__in=categories, name__startswith='Подкатегория ')
+                .order_by('pk')
+                .values_list('category__type_id', 'category_id', 'pk')
+            )
+        # bulk_create не отправляет сигналы — версию справочников поднимаем сами
+        dictionaries.invalidate()
+        if not statuses or not leaves:
+            raise CommandError('Нужен хотя бы один статус, тип, категория и подкатегория')
+        return statuses, leaves
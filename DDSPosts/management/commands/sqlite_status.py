@@ -0,0 +1,63 @@
+"""
+Состояние соединения SQLite: действующие PRAGMA и статистика журнала WAL.
+
+Контрольная точка в режиме PASSIVE (по умолчанию) не ждёт читателей и
+писателей и только переносит то, что можно перенести сейчас; TRUNCATE
+дополнительно обрезает файл -wal до нуля.
+
+Запуск:
+    python manage.py sqlite_status [--checkpoint PASSIVE|FULL|RESTART|TRUNCATE]
+"""
+
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from DDSPosts.sqlite import CHECKPOINT_MODES, get_pragmas, read_pragmas, wal_checkpoint
+
+
+class Command(BaseCommand):
+    help = 'Показывает PRAGMA соединения SQLite и статистику WAL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checkpoint', default='PASSIVE', choices=CHECKPOINT_MODES,
+                            type=str.upper, help='Режим контрольной точки WAL')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError(f'Команда только для SQLite (текущий бэкенд: {connection.vendor})')
+
+        expected = get_pragmas()
+        self.stdout.write(self.style.MIGRATE_HEADING('PRAGMA'))
+        for name, value in read_pragmas(connection).items():
+            line = f'{name:<20} {value}'
+            if name in expected and str(value).lower() != self.normalize(name, expected[name]):
+                line += self.style.WARNING(f'  (в настройках: {expected[name]})')
+            self.stdout.write(line)
+
+        path = connection.settings_dict['NAME']
+        self.stdout.write(self.style.MIGRATE_HEADING('WAL'))
+        wal_path = f'{path}-wal'
+        if os.path.exists(wal_path):
+            self.stdout.write(f'{"файл":<20} {wal_path} ({os.path.getsize(wal_path)} байт)')
+
+        busy, log, checkpointed = wal_checkpoint(connection, options['checkpoint'])
+        if log < 0:
+            self.stdout.write('База не в режиме WAL')
+            return
+        self.stdout.write(f'{"checkpoint":<20} {options["checkpoint"]}')
+        self.stdout.write(f'{"кадров в журнале":<20} {log}')
+        self.stdout.write(f'{"перенесено в БД":<20} {checkpointed}')
+        if busy:
+            self.stdout.write(self.style.WARNING('Контрольная точка не завершена: журнал занят'))
+
+    @staticmethod
+    def normalize(name, value):
+        """Значение из настроек в том виде, в каком его возвращает PRAGMA"""
+        named = {
+            'synchronous': {'off': '0', 'normal': '1', 'full': '2', 'extra': '3'},
+            'temp_store': {'default': '0', 'file': '1', 'memory': '2'},
+        }
+        value = str(value).lower()
+        return named.get(name, {}).get(value, value)
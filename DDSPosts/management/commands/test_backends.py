@@ -0,0 +1,69 @@
+"""
+Прогон тестов на нескольких бэкендах БД подряд.
+
+Для каждого бэкенда запускает `manage.py test` в отдельном процессе с
+переменной окружения DDS_DATABASE (настройки читают её при старте), поэтому
+один и тот же набор тестов DDSPosts/tests.py проверяется и на SQLite, и на
+PostgreSQL. Параметры подключения к PostgreSQL — переменные DDS_DB_*;
+для локальной проверки подойдёт сервер, запущенный, например, так:
+
+    docker run --rm -p 5432:5432 -e POSTGRES_USER=dds -e POSTGRES_PASSWORD=dds postgres:16
+
+Запуск:
+    python manage.py test_backends [DDSPosts] [--backends sqlite,postgresql] [--pool]
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+BACKENDS = ('sqlite', 'postgresql')
+
+
+class Command(BaseCommand):
+    help = 'Запускает тесты на SQLite и PostgreSQL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('labels', nargs='*', default=['DDSPosts'],
+                            help='Что тестировать (как у manage.py test)')
+        parser.add_argument('--backends', default=','.join(BACKENDS),
+                            help='Бэкенды через запятую')
+        parser.add_argument('--pool', action='store_true',
+                            help='PostgreSQL: через пул соединений psycopg (DDS_DB_POOL=1)')
+        parser.add_argument('--failfast', action='store_true',
+                            help='Остановиться на первом упавшем тесте')
+
+    def handle(self, *args, **options):
+        backends = [name.strip() for name in options['backends'].split(',') if name.strip()]
+        unknown = set(backends) - set(BACKENDS)
+        if unknown:
+            raise CommandError(f'Неизвестные бэкенды: {", ".join(sorted(unknown))}')
+
+        command = [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'test', *options['labels'],
+                   f'--verbosity={options["verbosity"]}']
+        if options['failfast']:
+            command.append('--failfast')
+
+        results = {}
+        for backend in backends:
+            env = dict(os.environ, DDS_DATABASE=backend)
+            if options['pool'] and backend == 'postgresql':
+                env['DDS_DB_POOL'] = '1'
+            self.stdout.write(self.style.MIGRATE_HEADING(f'== {backend} =='))
+            started = time.monotonic()
+            code = subprocess.call(command, env=env, cwd=settings.BASE_DIR)
+            results[backend] = (code, time.monotonic() - started)
+
+        failed = []
+        for backend, (code, elapsed) in results.items():
+            if code:
+                failed.append(backend)
+                self.stdout.write(self.style.ERROR(f'FAIL {backend} ({elapsed:.1f} с)'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'OK   {backend} ({elapsed:.1f} с)'))
+        if failed:
+            raise CommandError(f'Тесты не прошли: {", ".join(failed)}')
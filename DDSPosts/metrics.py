@@ -0,0 +1,220 @@
+"""
+Метрики запросов: задержка, число и время запросов к БД, время рендеринга
+шаблонов — по имени URL-маршрута.
+
+Счётчики текущего HTTP-запроса хранятся в contextvar: его видят и обёртка
+запросов к БД, и шаблоны, в том числе в потоках sync_to_async под ASGI
+(контекст копируется в поток). Обёртка запросов (execute_wrapper) ставится
+на каждое новое соединение БД (см. signals.py), поэтому запросы считаются
+на любом соединении, через которое идёт ORM.
+
+Метрики накапливаются в памяти процесса и отдаются в текстовом формате
+Prometheus (/metrics/); при нескольких рабочих процессах каждый отдаёт свои.
+
+Содержит:
+- RequestStats: счётчики одного HTTP-запроса
+- Histogram: гистограмма с фиксированными границами корзин
+- track / finish: начало и завершение учёта запроса
+- increment: счётчик событий (например, попаданий в кэш)
+- query_wrapper: обёртка запросов к БД для connection.execute_wrappers
+- template_timer: учёт времени рендеринга шаблона
+- export: метрики в формате Prometheus
+"""
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+logger = logging.getLogger('DDSPosts.metrics')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Имя маршрута для запросов, не попавших ни в один URL
+UNRESOLVED = '<unresolved>'
+
+_current = ContextVar('dds_request_stats', default=None)
+
+
+class RequestStats:
+    """Счётчики одного HTTP-запроса"""
+    __slots__ = ('started', 'queries', 'db_time', 'template_time')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+
+
+class Histogram:
+    """Гистограмма: число наблюдений в каждой корзине, сумма и количество"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # последняя корзина — +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        """Строки экспозиции Prometheus: накопительные корзины, _sum, _count"""
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.sum:.6f}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+# Метрики: имя -> (тип, описание, границы корзин)
+METRICS = {
+    'dds_request_duration_seconds': ('histogram', 'Время обработки запроса', LATENCY_BUCKETS),
+    'dds_db_queries': ('histogram', 'Число запросов к БД за HTTP-запрос', QUERY_BUCKETS),
+    'dds_db_duration_seconds': ('histogram', 'Время запросов к БД за HTTP-запрос', LATENCY_BUCKETS),
+    'dds_template_render_seconds': ('histogram', 'Время рендеринга шаблонов за HTTP-запрос', LATENCY_BUCKETS),
+}
+
+# Счётчики событий: имя -> описание
+COUNTERS = {
+    'dds_fragment_cache_total': 'Обращения к кэшу таблицы главной страницы по результату',
+}
+
+
+class Registry:
+    """Метрики процесса: гистограммы по (метрика, маршрут), счётчики ответов и событий"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.histograms = {}
+        self.responses = {}
+        self.counters = {}
+
+    def observe(self, view, stats, status, elapsed):
+        values = {
+            'dds_request_duration_seconds': elapsed,
+            'dds_db_queries': stats.queries,
+            'dds_db_duration_seconds': stats.db_time,
+            'dds_template_render_seconds': stats.template_time,
+        }
+        with self.lock:
+            for name, value in values.items():
+                histogram = self.histograms.get((name, view))
+                if histogram is None:
+                    histogram = self.histograms[name, view] = Histogram(METRICS[name][2])
+                histogram.observe(value)
+            key = (view, status)
+            self.responses[key] = self.responses.get(key, 0) + 1
+
+    def increment(self, name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+
+    def value(self, name, **labels):
+        """Текущее значение счётчика событий"""
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def export(self):
+        with self.lock:
+            lines = []
+            for name, (kind, help_text, _) in METRICS.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for (metric, view), histogram in sorted(self.histograms.items()):
+                    if metric == name:
+                        lines.extend(histogram.lines(name, f'view="{_escape(view)}"'))
+            lines.append('# HELP dds_responses_total Число ответов по маршруту и коду статуса')
+            lines.append('# TYPE dds_responses_total counter')
+            for (view, status), count in sorted(self.responses.items()):
+                lines.append(f'dds_responses_total{{view="{_escape(view)}",status="{status}"}} {count}')
+            for name, help_text in COUNTERS.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for (metric, labels), count in sorted(self.counters.items()):
+                    if metric == name:
+                        labels = ','.join(f'{key}="{_escape(str(value))}"' for key, value in labels)
+                        lines.append(f'{name}{{{labels}}} {count}')
+            return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    """Экранирование значения метки Prometheus"""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry()
+
+
+def track():
+    """Начинает учёт HTTP-запроса; возвращает токен для finish()"""
+    return _current.set(RequestStats())
+
+
+def finish(token, request, status):
+    """Завершает учёт: записывает метрики и пишет в лог запросы сверх бюджета"""
+    stats = _current.get()
+    _current.reset(token)
+    elapsed = time.perf_counter() - stats.started
+    match = getattr(request, 'resolver_match', None)
+    view = match.view_name if match is not None else UNRESOLVED
+    registry.observe(view, stats, status, elapsed)
+
+    latency_budget = getattr(settings, 'DDS_METRICS_LATENCY_BUDGET_MS', 500)
+    query_budget = getattr(settings, 'DDS_METRICS_QUERY_BUDGET', 20)
+    if elapsed * 1000 > latency_budget or stats.queries > query_budget:
+        logger.warning(
+            'Запрос сверх бюджета: %s %s [%s] %.0f мс, запросов к БД %d (%.0f мс), шаблоны %.0f мс',
+            request.method, request.path, view, elapsed * 1000, stats.queries,
+            stats.db_time * 1000, stats.template_time * 1000,
+        )
+    return stats
+
+
+def increment(name, **labels):
+    """Увеличивает счётчик событий name с метками labels"""
+    registry.increment(name, **labels)
+
+
+def query_wrapper(execute, sql, params, many, context):
+    """Обёртка запросов к БД: число и время запросов текущего HTTP-запроса"""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - started
+
+
+@contextmanager
+def template_timer():
+    """Учитывает время рендеринга шаблона в текущем HTTP-запросе"""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.template_time += time.perf_counter() - started
+
+
+def export():
+    """Все метрики процесса в текстовом формате Prometheus"""
+    return registry.export()
@@ -0,0 +1,52 @@
+"""
+Промежуточные обработчики (middleware).
+
+Содержит:
+- MetricsMiddleware: учёт задержки, запросов к БД и рендеринга шаблонов по маршрутам
+"""
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import metrics
+
+
+class MetricsMiddleware:
+    """
+    Записывает метрики каждого запроса (см. metrics.py). Работает и под WSGI,
+    и под ASGI без переключения между потоком и циклом событий.
+    Отключается настройкой DDS_METRICS_ENABLED = False.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'DDS_METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = metrics.track()
+        status = 500
+        try:
+            response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            metrics.finish(token, request, status)
+
+    async def __acall__(self, request):
+        token = metrics.track()
+        status = 500
+        try:
+            response = await self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            metrics.finish(token, request, status)
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.4 on 2026-10-18 05:27
+
+import django.db.models.deletion
+import smart_selects.db_fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DDSPosts', '0006_alter_transaction_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='transaction',
+            options={'ordering': ['-date', '-id']},
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='category',
+            field=smart_selects.db_fields.ChainedForeignKey(auto_choose=True, chained_field='operation', chained_model_field='type', db_index=False, on_delete=django.db.models.deletion.PROTECT, to='DDSPosts.category', verbose_name='Категория'),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='operation',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='DDSPosts.type', verbose_name='Тип операции'),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='status',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='DDSPosts.status', verbose_name='Статус'),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='subcategory',
+            field=smart_selects.db_fields.ChainedForeignKey(auto_choose=True, chained_field='category', chained_model_field='category', db_index=False, on_delete=django.db.models.deletion.PROTECT, to='DDSPosts.subcategory', verbose_name='Подкатегория'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['-date', '-id'], name='transaction_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['status', '-date', '-id'], name='transaction_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['operation', '-date', '-id'], name='transaction_operation_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['category', '-date', '-id'], name='transaction_category_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['subcategory', '-date', '-id'], name='transaction_subcat_date_idx'),
+        ),
+    ]
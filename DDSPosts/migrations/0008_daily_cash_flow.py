@@ -0,0 +1,49 @@
+# Generated by Django 5.2.4 on 2026-10-18 05:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def build_daily_cash_flow(apps, schema_editor):
+    """Заполняет сводки по уже существующим транзакциям"""
+    Transaction = apps.get_model('DDSPosts', 'Transaction')
+    DailyCashFlow = apps.get_model('DDSPosts', 'DailyCashFlow')
+    rows = (
+        Transaction.objects
+        .order_by()
+        .annotate(day=TruncDate('date', tzinfo=timezone.get_current_timezone()))
+        .values('day', 'status_id', 'operation_id', 'category_id', 'subcategory_id')
+        .annotate(total=Sum('amount'), count=Count('id'))
+    )
+    DailyCashFlow.objects.bulk_create((DailyCashFlow(**row) for row in rows.iterator()), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DDSPosts', '0007_transaction_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCashFlow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='Сумма')),
+                ('count', models.IntegerField(default=0, verbose_name='Количество')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='DDSPosts.category', verbose_name='Категория')),
+                ('operation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='DDSPosts.type', verbose_name='Тип операции')),
+                ('status', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='DDSPosts.status', verbose_name='Статус')),
+                ('subcategory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='DDSPosts.subcategory', verbose_name='Подкатегория')),
+            ],
+            options={
+                'ordering': ['-day'],
+                'constraints': [models.UniqueConstraint(fields=('day', 'status', 'operation', 'category', 'subcategory'), name='daily_cash_flow_unique_key')],
+            },
+        ),
+        migrations.RunPython(build_daily_cash_flow, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-18 05:37
+
+from django.db import migrations, models
+
+# Направление существующих типов по названию; остальные остаются «Не указано»
+# и показываются в отчёте отдельно, пока направление не выбрано вручную
+KIND_BY_NAME = {
+    'пополнение': 'income',
+    'поступление': 'income',
+    'доход': 'income',
+    'списание': 'expense',
+    'расход': 'expense',
+}
+
+
+def classify_types(apps, schema_editor):
+    Type = apps.get_model('DDSPosts', 'Type')
+    for kind in set(KIND_BY_NAME.values()):
+        names = [name for name, value in KIND_BY_NAME.items() if value == kind]
+        ids = [t.pk for t in Type.objects.only('name') if t.name.strip().lower() in names]
+        Type.objects.filter(pk__in=ids).update(kind=kind)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DDSPosts', '0008_daily_cash_flow'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='type',
+            name='kind',
+            field=models.CharField(choices=[('income', 'Поступление'), ('expense', 'Списание'), ('unclassified', 'Не указано')], default='unclassified', max_length=12, verbose_name='Направление'),
+        ),
+        migrations.RunPython(classify_types, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.4 on 2026-10-18 05:41
+
+import DDSPosts.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+from DDSPosts.search import install_search_index, remove_search_index
+
+
+def create_search_index(apps, schema_editor):
+    """Создаёт полнотекстовый индекс комментариев и индексирует существующие транзакции"""
+    install_search_index(schema_editor)
+
+
+def drop_search_index(apps, schema_editor):
+    remove_search_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DDSPosts', '0009_type_kind'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionSearch',
+            fields=[
+                ('transaction', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search', serialize=False, to='DDSPosts.transaction')),
+                ('comment', DDSPosts.models.FullTextField()),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'DDSPosts_transaction_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(
+            create_search_index,
+            drop_search_index,
+        ),
+    ]
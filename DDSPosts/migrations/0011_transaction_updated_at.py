@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-18 06:08
+
+import django.utils.timezone
+from django.db import migrations, models
+
+from DDSPosts.search import install_search_index
+
+
+def restore_search_index(apps, schema_editor):
+    """
+    SQLite добавляет поле, пересоздавая таблицу транзакций, и теряет
+    триггеры полнотекстового индекса — восстанавливаем их
+    """
+    install_search_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DDSPosts', '0010_transaction_search'),
+    ]
+
+    operations = [
+        # При откате поле удаляется тем же пересозданием таблицы
+        migrations.RunPython(migrations.RunPython.noop, restore_search_index),
+        migrations.AddField(
+            model_name='transaction',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now, verbose_name='Изменено'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(restore_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.4 on 2026-10-18 06:09
+
+from itertools import islice
+
+from django.db import migrations, models
+
+
+def populate_listing(apps, schema_editor):
+    """Заполняет витрину по существующим транзакциям"""
+    Transaction = apps.get_model('DDSPosts', 'Transaction')
+    TransactionListing = apps.get_model('DDSPosts', 'TransactionListing')
+    rows = (
+        Transaction.objects
+        .order_by()
+        .values('id', 'date', 'status_id', 'status__name', 'operation_id', 'operation__name', 'category_id',
+                'category__name', 'subcategory_id', 'subcategory__name', 'amount', 'comment')
+        .iterator(chunk_size=1000)
+    )
+    while batch := [
+        TransactionListing(**{key.replace('__', '_'): value for key, value in row.items()})
+        for row in islice(rows, 1000)
+    ]:
+        TransactionListing.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DDSPosts', '0011_transaction_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionListing',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='Транзакция')),
+                ('date', models.DateTimeField(verbose_name='Дата создания поста')),
+                ('status_id', models.BigIntegerField(verbose_name='Статус')),
+                ('status_name', models.CharField(max_length=100)),
+                ('operation_id', models.BigIntegerField(verbose_name='Тип операции')),
+                ('operation_name', models.CharField(max_length=100)),
+                ('category_id', models.BigIntegerField(verbose_name='Категория')),
+                ('category_name', models.CharField(max_length=100)),
+                ('subcategory_id', models.BigIntegerField(verbose_name='Подкатегория')),
+                ('subcategory_name', models.CharField(max_length=100)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Сумма')),
+                ('comment', models.TextField(blank=True, verbose_name='Комментарий')),
+            ],
+            options={
+                'ordering': ['-date', '-id'],
+                'indexes': [models.Index(fields=['-date', '-id'], name='listing_date_idx'), models.Index(fields=['status_id', '-date', '-id'], name='listing_status_date_idx'), models.Index(fields=['operation_id', '-date', '-id'], name='listing_operation_date_idx'), models.Index(fields=['category_id', '-date', '-id'], name='listing_category_date_idx'), models.Index(fields=['subcategory_id', '-date', '-id'], name='listing_subcat_date_idx')],
+            },
+        ),
+        migrations.RunPython(populate_listing, migrations.RunPython.noop),
+    ]
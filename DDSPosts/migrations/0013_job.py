@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-18 06:23
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DDSPosts', '0012_transaction_listing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=50, verbose_name='Задача')),
+                ('params', models.JSONField(blank=True, default=dict, verbose_name='Параметры')),
+                ('status', models.CharField(choices=[('queued', 'В очереди'), ('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка')], default='queued', max_length=10, verbose_name='Состояние')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Попыток')),
+                ('max_attempts', models.PositiveIntegerField(default=3, verbose_name='Наибольшее число попыток')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Не раньше')),
+                ('progress', models.PositiveBigIntegerField(default=0, verbose_name='Выполнено')),
+                ('total', models.PositiveBigIntegerField(blank=True, null=True, verbose_name='Всего')),
+                ('message', models.CharField(blank=True, max_length=255, verbose_name='Сообщение')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='Результат')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('worker', models.CharField(blank=True, max_length=100, verbose_name='Обработчик')),
+                ('heartbeat', models.DateTimeField(blank=True, null=True, verbose_name='Последний отчёт')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Начата')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершена')),
+            ],
+            options={
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['status', 'run_after', 'id'], name='job_queue_idx')],
+            },
+        ),
+    ]
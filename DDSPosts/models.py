@@ -2,19 +2,43 @@
 Модели для приложения.
 
 Содержит классы:
+- AtomicModel: Абстрактная модель, сохранение и удаление которой вместе с обработчиками сигналов идут в одной транзакции БД
 - Status: Статус транзакции
 - Type: Тип операции
 - Category: Категория, привязанная к типу
 - Subcategory: Подкатегория, привязанная к категории
 - Transaction: Финансовая операция, привязанная к типу -> категории -> подкатегории
+- DailyCashFlow: Дневная сводка по транзакциям (предрасчитанные суммы)
+- TransactionListing: Денормализованная строка таблицы транзакций (названия справочников в строке)
+- TransactionSearch: Полнотекстовый индекс комментариев транзакций (SQLite FTS5)
+- Job: Фоновая задача (выгрузка, импорт, пересчёт), очередь в БД
 """
 
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from smart_selects.db_fields import ChainedForeignKey
 
 
-class Status(models.Model):
+class AtomicModel(models.Model):
+    """
+    Строка и то, что обработчики её сигналов пишут в производные таблицы
+    (сводки, витрина, см. signals.py), записываются в одной транзакции БД:
+    при ошибке откатываются вместе
+    """
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
+
+class Status(AtomicModel):
     """Статус транзакции"""
     name = models.CharField(max_length=100, unique=True, verbose_name='Статус')
 
@@ -22,19 +46,35 @@ class Status(models.Model):
         return self.name
 
 
-class Type(models.Model):
+class Type(AtomicModel):
     """Тип операции"""
+    INCOME = 'income'
+    EXPENSE = 'expense'
+    UNCLASSIFIED = 'unclassified'
+    KIND_CHOICES = [
+        (INCOME, 'Поступление'),
+        (EXPENSE, 'Списание'),
+        (UNCLASSIFIED, 'Не указано'),  # в отчёте — отдельной колонкой, не в сальдо
+    ]
+
     name = models.CharField(
         max_length=100,
         unique=True,
         verbose_name='Тип операции'
     )
 
+    kind = models.CharField(
+        max_length=12,
+        choices=KIND_CHOICES,
+        default=UNCLASSIFIED,
+        verbose_name='Направление'  # для итогов: поступления, списания, сальдо
+    )
+
     def __str__(self):
         return self.name
 
 
-class Category(models.Model):
+class Category(AtomicModel):
     """Категория, связанная с типом операции"""
     name = models.CharField(
         max_length=100,
@@ -55,7 +95,7 @@ class Category(models.Model):
         return self.name
 
 
-class Subcategory(models.Model):
+class Subcategory(AtomicModel):
     """Подкатегория, связанная с категорией"""
     name = models.CharField(
         max_length=100,
@@ -75,7 +115,24 @@ class Subcategory(models.Model):
         return self.name
 
 
-class Transaction(models.Model):
+class TransactionQuerySet(models.QuerySet):
+    """QuerySet транзакций"""
+
+    # Справочники, названия которых выводятся в таблице транзакций
+    LISTING_RELATED = ('operation', 'category', 'subcategory', 'status')
+
+    def for_listing(self):
+        """
+        Выборка для таблицы транзакций: справочники подтягиваются одним JOIN,
+        из связанных таблиц читается только название.
+        """
+        return self.select_related(*self.LISTING_RELATED).only(
+            'date', 'amount', 'comment',
+            *(f'{name}__name' for name in self.LISTING_RELATED)
+        )
+
+
+class Transaction(AtomicModel):
     """Основная модель"""
 
     date = models.DateTimeField(
@@ -86,12 +143,14 @@ class Transaction(models.Model):
     status = models.ForeignKey(
         Status,
         on_delete=models.PROTECT,
+        db_index=False,  # покрыт индексом transaction_status_date_idx
         verbose_name='Статус'
     )
 
     operation = models.ForeignKey(
         Type,
         on_delete=models.PROTECT,
+        db_index=False,  # покрыт индексом transaction_operation_date_idx
         verbose_name='Тип операции'
     )
 
@@ -103,6 +162,7 @@ class Transaction(models.Model):
         auto_choose=True,
         sort=True,
         on_delete=models.PROTECT,
+        db_index=False,  # покрыт индексом transaction_category_date_idx
         verbose_name='Категория'
     )
 
@@ -114,6 +174,7 @@ class Transaction(models.Model):
         auto_choose=True,
         sort=True,
         on_delete=models.PROTECT,
+        db_index=False,  # покрыт индексом transaction_subcat_date_idx
         verbose_name='Подкатегория'
     )
 
@@ -128,8 +189,257 @@ class Transaction(models.Model):
         verbose_name='Комментарий'
     )
 
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        db_index=True,  # MAX(updated_at) для условных GET-запросов
+        verbose_name='Изменено'
+    )
+
+    objects = TransactionQuerySet.as_manager()
+
     class Meta:
-        ordering = ['-date']  # Сортировка по дате, от новых к старым
+        ordering = ['-date', '-id']  # Сортировка по дате, от новых к старым
+
+        # Составные индексы под фильтры главной страницы: каждый фильтр по
+        # справочнику ведёт к индексу (<справочник>, -date, -id), поэтому
+        # выборка страницы идёт по индексу и не требует сортировки
+        indexes = [
+            models.Index(fields=['-date', '-id'], name='transaction_date_idx'),
+            models.Index(fields=['status', '-date', '-id'], name='transaction_status_date_idx'),
+            models.Index(fields=['operation', '-date', '-id'], name='transaction_operation_date_idx'),
+            models.Index(fields=['category', '-date', '-id'], name='transaction_category_date_idx'),
+            models.Index(fields=['subcategory', '-date', '-id'], name='transaction_subcat_date_idx'),
+        ]
 
     def __str__(self):
         return f'{self.date.strftime("%d.%m.%Y")} — {self.amount} ₽'
+
+
+class DailyCashFlow(models.Model):
+    """
+    Предрасчитанная сводка: сумма и число транзакций за день
+    в разрезе статуса, типа, категории и подкатегории.
+    Поддерживается обработчиками сигналов Transaction (см. rollups.py).
+    """
+
+    day = models.DateField(verbose_name='День')
+
+    status = models.ForeignKey(
+        Status,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Статус'
+    )
+
+    operation = models.ForeignKey(
+        Type,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Тип операции'
+    )
+
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Категория'
+    )
+
+    subcategory = models.ForeignKey(
+        Subcategory,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Подкатегория'
+    )
+
+    total = models.DecimalField(
+        max_digits=18,
+        decimal_places=2,
+        default=0,
+        verbose_name='Сумма'
+    )
+
+    count = models.IntegerField(default=0, verbose_name='Количество')
+
+    class Meta:
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'status', 'operation', 'category', 'subcategory'],
+                name='daily_cash_flow_unique_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.day.strftime("%d.%m.%Y")} — {self.total} ₽ ({self.count})'
+
+
+class ListingRef:
+    """Справочник в строке TransactionListing: id и название, как у объекта из for_listing()"""
+    __slots__ = ('id', 'name')
+
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __str__(self):
+        return self.name
+
+
+class TransactionListing(models.Model):
+    """
+    Витрина для чтения: строка таблицы транзакций с названиями справочников,
+    без JOIN. Первичный ключ совпадает с id транзакции. Поддерживается
+    обработчиками сигналов Transaction и справочников (см. listing.py).
+    """
+
+    # Без внешних ключей: витрина не участвует в каскадах и проверках целостности
+    id = models.BigIntegerField(primary_key=True, verbose_name='Транзакция')
+    date = models.DateTimeField(verbose_name='Дата создания поста')
+    status_id = models.BigIntegerField(verbose_name='Статус')
+    status_name = models.CharField(max_length=100)
+    operation_id = models.BigIntegerField(verbose_name='Тип операции')
+    operation_name = models.CharField(max_length=100)
+    category_id = models.BigIntegerField(verbose_name='Категория')
+    category_name = models.CharField(max_length=100)
+    subcategory_id = models.BigIntegerField(verbose_name='Подкатегория')
+    subcategory_name = models.CharField(max_length=100)
+    amount = models.DecimalField(max_digits=12, decimal_places=2, verbose_name='Сумма')
+    comment = models.TextField(blank=True, verbose_name='Комментарий')
+
+    class Meta:
+        ordering = ['-date', '-id']
+        # Те же индексы, что у Transaction: фильтры и страницы без сортировки
+        indexes = [
+            models.Index(fields=['-date', '-id'], name='listing_date_idx'),
+            models.Index(fields=['status_id', '-date', '-id'], name='listing_status_date_idx'),
+            models.Index(fields=['operation_id', '-date', '-id'], name='listing_operation_date_idx'),
+            models.Index(fields=['category_id', '-date', '-id'], name='listing_category_date_idx'),
+            models.Index(fields=['subcategory_id', '-date', '-id'], name='listing_subcat_date_idx'),
+        ]
+
+    # Справочники с тем же интерфейсом, что у Transaction (t.category.name в шаблоне)
+    @property
+    def status(self):
+        return ListingRef(self.status_id, self.status_name)
+
+    @property
+    def operation(self):
+        return ListingRef(self.operation_id, self.operation_name)
+
+    @property
+    def category(self):
+        return ListingRef(self.category_id, self.category_name)
+
+    @property
+    def subcategory(self):
+        return ListingRef(self.subcategory_id, self.subcategory_name)
+
+    def __str__(self):
+        return f'{self.date.strftime("%d.%m.%Y")} — {self.amount} ₽'
+
+
+class FullTextField(models.TextField):
+    """Колонка таблицы FTS5: поддерживает поиск через lookup __match"""
+
+
+@FullTextField.register_lookup
+class Match(models.Lookup):
+    """<колонка> MATCH <запрос FTS5>"""
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class TransactionSearch(models.Model):
+    """
+    Полнотекстовый индекс комментариев транзакций для SQLite.
+
+    Виртуальная таблица FTS5 с внешним содержимым создаётся миграцией и
+    синхронизируется триггерами БД (в том числе при bulk_create и импорте).
+    Модель служит только для JOIN и ранжирования в запросах — см. search.py.
+    """
+
+    transaction = models.OneToOneField(
+        Transaction,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column='rowid',
+        related_name='search',
+    )
+
+    comment = FullTextField()
+
+    # Скрытая колонка FTS5: релевантность bm25, чем меньше — тем лучше
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'DDSPosts_transaction_fts'
+
+
+class Job(models.Model):
+    """
+    Фоновая задача в очереди БД. Выполняется командой run_workers;
+    постановка, захват и выполнение — см. jobs.py.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    kind = models.CharField(max_length=50, verbose_name='Задача')
+    params = models.JSONField(default=dict, blank=True, verbose_name='Параметры')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED, verbose_name='Состояние')
+
+    attempts = models.PositiveIntegerField(default=0, verbose_name='Попыток')
+    max_attempts = models.PositiveIntegerField(default=3, verbose_name='Наибольшее число попыток')
+    run_after = models.DateTimeField(default=timezone.now, verbose_name='Не раньше')  # отложенный повтор
+
+    progress = models.PositiveBigIntegerField(default=0, verbose_name='Выполнено')
+    total = models.PositiveBigIntegerField(null=True, blank=True, verbose_name='Всего')
+    message = models.CharField(max_length=255, blank=True, verbose_name='Сообщение')
+    result = models.JSONField(null=True, blank=True, verbose_name='Результат')
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+
+    worker = models.CharField(max_length=100, blank=True, verbose_name='Обработчик')
+    # Обновляется при захвате и каждом отчёте о ходе: по нему находятся
+    # задачи, брошенные остановленным обработчиком
+    heartbeat = models.DateTimeField(null=True, blank=True, verbose_name='Последний отчёт')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создана')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='Начата')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Завершена')
+
+    class Meta:
+        ordering = ['-id']
+        indexes = [
+            # Выбор следующей задачи: WHERE status = 'queued' AND run_after <= now ORDER BY id
+            models.Index(fields=['status', 'run_after', 'id'], name='job_queue_idx'),
+        ]
+
+    @property
+    def finished(self):
+        return self.status in (self.DONE, self.FAILED)
+
+    @property
+    def percent(self):
+        """Процент выполнения или None, если объём работы неизвестен"""
+        if not self.total:
+            return 100 if self.status == self.DONE else None
+        return min(100, self.progress * 100 // self.total)
+
+    def __str__(self):
+        return f'#{self.pk} {self.kind} ({self.get_status_display()})'
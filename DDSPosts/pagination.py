@@ -0,0 +1,160 @@
+"""
+Курсорная (keyset) пагинация списка транзакций.
+
+Вместо OFFSET страница выбирается условием по ключу сортировки (-date, -id),
+поэтому стоимость запроса не зависит от глубины страницы, а общий COUNT(*)
+не требуется.
+
+Содержит:
+- CursorPaginator: выборка страниц по непрозрачному токену
+- ValuesCursorPaginator: то же для строк values() (словарей)
+- CursorPage: страница результатов со ссылками на соседние страницы
+- InvalidCursor: ошибка разбора токена
+"""
+
+from django.core import signing
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+CURSOR_SALT = 'DDSPosts.pagination.cursor'
+
+
+class InvalidCursor(Exception):
+    """Токен повреждён или выдан для другого набора фильтров"""
+
+
+class CursorPage:
+    """Страница курсорной пагинации"""
+
+    def __init__(self, object_list, paginator, next_token=None, previous_token=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_token = next_token
+        self.previous_token = previous_token
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_token is not None
+
+    def has_previous(self):
+        return self.previous_token is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Пагинатор по ключу (-date, -id).
+
+    fingerprint — отпечаток активных фильтров: токен, выданный для одних
+    фильтров, не принимается с другими. with_count включает подсчёт общего
+    числа записей (по умолчанию выключен).
+    """
+    ordering = ('-date', '-id')
+
+    def __init__(self, queryset, per_page, fingerprint='', with_count=False):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.fingerprint = fingerprint
+        self.with_count = with_count
+
+    @property
+    def count(self):
+        """Общее число записей или None, если подсчёт выключен"""
+        if not self.with_count:
+            return None
+        if not hasattr(self, '_count'):
+            self._count = self.queryset.count()
+        return self._count
+
+    async def acount(self):
+        """Асинхронный count"""
+        if self.with_count and not hasattr(self, '_count'):
+            self._count = await self.queryset.acount()
+        return self.count
+
+    def key(self, obj):
+        """Ключ сортировки объекта: (date, id)"""
+        return obj.date, obj.pk
+
+    def encode(self, obj, backwards=False):
+        """Непрозрачный токен позиции после (или до) объекта obj"""
+        date, pk = self.key(obj)
+        return signing.dumps(
+            {'d': date.isoformat(), 'i': pk, 'b': backwards, 'f': self.fingerprint},
+            salt=CURSOR_SALT,
+            compress=True,
+        )
+
+    def decode(self, token):
+        """Разбирает токен, возвращает (date, id, backwards)"""
+        try:
+            data = signing.loads(token, salt=CURSOR_SALT)
+            position = parse_datetime(data['d']), int(data['i']), bool(data['b'])
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            raise InvalidCursor('Некорректный курсор')
+        if position[0] is None or data.get('f') != self.fingerprint:
+            raise InvalidCursor('Курсор не соответствует фильтрам')
+        return position
+
+    def page_queryset(self, date=None, pk=None, backwards=False):
+        """QuerySet страницы после (или до) позиции (date, pk), с лишней записью"""
+        qs = self.queryset.order_by(*self.ordering)
+        if date is not None:
+            if backwards:
+                # Записи «новее» курсора: date > d или (date = d и id > pk)
+                qs = qs.filter(Q(date__gte=date) & (Q(date__gt=date) | Q(pk__gt=pk)))
+                qs = qs.reverse()
+            else:
+                # Записи «старше» курсора: date < d или (date = d и id < pk)
+                qs = qs.filter(Q(date__lte=date) & (Q(date__lt=date) | Q(pk__lt=pk)))
+        # Одна лишняя запись показывает, есть ли страница дальше
+        return qs[:self.per_page + 1]
+
+    def position(self, token=None):
+        """Позиция (date, id, backwards) из токена; без токена — начало списка"""
+        if token:
+            return self.decode(token)
+        return None, None, False
+
+    def page(self, token=None):
+        """Возвращает страницу после позиции из токена (первую, если токена нет)"""
+        date, pk, backwards = self.position(token)
+        return self.make_page(list(self.page_queryset(date, pk, backwards)), token, backwards)
+
+    async def apage(self, token=None):
+        """Асинхронный page()"""
+        date, pk, backwards = self.position(token)
+        rows = [obj async for obj in self.page_queryset(date, pk, backwards).aiterator()]
+        return self.make_page(rows, token, backwards)
+
+    def make_page(self, rows, token, backwards):
+        """Страница из прочитанных строк (с лишней записью)"""
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, bool(token)
+
+        return CursorPage(
+            rows,
+            self,
+            next_token=self.encode(rows[-1]) if rows and has_next else None,
+            previous_token=self.encode(rows[0], backwards=True) if rows and has_previous else None,
+        )
+
+
+class ValuesCursorPaginator(CursorPaginator):
+    """Курсорный пагинатор для QuerySet.values(): в строках должны быть date и id"""
+
+    def key(self, obj):
+        return obj['date'], obj['id']
@@ -0,0 +1,157 @@
+"""
+Отчёт о движении средств: поступления, списания и сальдо с подытогами
+по типу -> категории -> подкатегории.
+
+Суммы типов без направления («Не указано») и типов, которых нет в кэше
+справочников, не входят ни в поступления, ни в списания: они показываются
+отдельно (unclassified), сальдо их не учитывает. Справочник, которого нет
+в кэше, выводится строкой «Неизвестно (#id)», а не пропускается — итоги
+всегда сходятся с транзакциями.
+
+Все суммы считаются одним агрегирующим запросом (GROUP BY подкатегории с
+условной агрегацией) по дневным сводкам DailyCashFlow, поэтому время
+построения отчёта не зависит от числа транзакций. Сводки не хранят
+комментарии, поэтому при поиске по комментарию тот же запрос строится
+по отобранным транзакциям. Подытоги верхних уровней
+и общий итог складываются из строк запроса в Decimal — без потери точности.
+
+Содержит:
+- ReportNode: узел отчёта (итог или подытог)
+- cashflow_report / acashflow_report: отчёт по фильтрам главной страницы
+"""
+
+from decimal import Decimal
+
+from django.db.models import Count, Q, Sum
+
+from .dictionaries import aget_dictionaries, get_dictionaries
+from .filters import filter_transactions
+from .models import DailyCashFlow, ListingRef, Transaction
+from .rollups import filter_rollups
+from .search import SEARCH_PARAM
+
+# Точность сумм (DecimalField с decimal_places=2). SQLite возвращает SUM
+# по десятичным колонкам с хвостом двоичной погрешности — округляем до копеек
+CENT = Decimal('0.01')
+
+
+class ReportNode:
+    """
+    Узел отчёта: поступления, списания, суммы без направления, сальдо,
+    количество и дочерние узлы
+    """
+
+    def __init__(self, obj=None):
+        self.obj = obj
+        self.income = Decimal(0)
+        self.expense = Decimal(0)
+        self.unclassified = Decimal(0)
+        self.count = 0
+        self.children = {}
+
+    @property
+    def name(self):
+        return self.obj.name if self.obj is not None else 'Итого'
+
+    @property
+    def net(self):
+        return self.income - self.expense
+
+    def child(self, obj):
+        if obj.pk not in self.children:
+            self.children[obj.pk] = ReportNode(obj)
+        return self.children[obj.pk]
+
+    def add(self, income, expense, unclassified, count):
+        self.income += income
+        self.expense += expense
+        self.unclassified += unclassified
+        self.count += count
+
+    @property
+    def items(self):
+        """Дочерние узлы по алфавиту"""
+        return sorted(self.children.values(), key=lambda node: node.name)
+
+    def as_data(self):
+        """Узел в виде словаря для JSON (суммы — строками, без потери точности)"""
+        data = {
+            'income': str(self.income),
+            'expense': str(self.expense),
+            'unclassified': str(self.unclassified),
+            'net': str(self.net),
+            'count': self.count,
+        }
+        if self.obj is not None:
+            data.update(id=self.obj.pk, name=self.obj.name)
+        if self.children:
+            data['items'] = [node.as_data() for node in self.items]
+        return data
+
+
+def report_rows(params, tree):
+    """
+    Агрегирующий запрос отчёта: по строке на подкатегорию с суммами
+    поступлений, списаний, сумм без направления и числом транзакций
+    """
+    is_income = Q(operation_id__in=[t.pk for t in tree.types if t.kind == t.INCOME])
+    is_expense = Q(operation_id__in=[t.pk for t in tree.types if t.kind == t.EXPENSE])
+
+    if params.get(SEARCH_PARAM):
+        source = filter_transactions(Transaction.objects.order_by(), params)
+        amount, count = 'amount', Count('id')
+    else:
+        source = filter_rollups(DailyCashFlow.objects.order_by(), params)
+        amount, count = 'total', Sum('count')
+
+    return (
+        source
+        .values('operation_id', 'category_id', 'subcategory_id')
+        .annotate(
+            income=Sum(amount, filter=is_income, default=Decimal(0)),
+            expense=Sum(amount, filter=is_expense, default=Decimal(0)),
+            unclassified=Sum(amount, filter=~(is_income | is_expense), default=Decimal(0)),
+            count=count,
+        )
+    )
+
+
+def _known(index, pk):
+    """Справочник из кэша или заглушка с id, если его в кэше нет"""
+    obj = index.get(pk)
+    return obj if obj is not None else ListingRef(pk, f'Неизвестно (#{pk})')
+
+
+def build_report(rows, tree):
+    """Дерево отчёта из строк агрегирующего запроса"""
+    root = ReportNode()
+    for row in rows:
+        operation = _known(tree.type_by_id, row['operation_id'])
+        category = _known(tree.category_by_id, row['category_id'])
+        subcategory = _known(tree.subcategory_by_id, row['subcategory_id'])
+        amounts = (row['income'].quantize(CENT), row['expense'].quantize(CENT),
+                   row['unclassified'].quantize(CENT), row['count'])
+        root.add(*amounts)
+        type_node = root.child(operation)
+        type_node.add(*amounts)
+        category_node = type_node.child(category)
+        category_node.add(*amounts)
+        category_node.child(subcategory).add(*amounts)
+    return root
+
+
+def cashflow_report(params):
+    """
+    Отчёт по фильтрам главной страницы.
+    Возвращает корневой ReportNode: общий итог, в items — типы операций,
+    в их items — категории, далее подкатегории.
+    """
+    tree = get_dictionaries()
+    return build_report(report_rows(params, tree), tree)
+
+
+async def acashflow_report(params):
+    """Асинхронный cashflow_report()"""
+    tree = await aget_dictionaries()
+    rows = [row async for row in report_rows(params, tree).aiterator()]
+    return build_report(rows, tree)
@@ -0,0 +1,172 @@
+"""
+Дневные сводки движения средств (DailyCashFlow).
+
+Сводка хранит сумму и число транзакций за день (в часовом поясе TIME_ZONE)
+по ключу статус / тип / категория / подкатегория. Сводки обновляются
+приращениями: при создании транзакции её сумма прибавляется к строке
+сводки, при удалении — вычитается, при редактировании старое значение
+вычитается из старой строки и прибавляется к новой.
+
+Содержит:
+- rollup_key: ключ строки сводки для транзакции
+- apply_deltas: применение приращений к сводкам
+- add_transactions: учёт пачки новых транзакций
+- move: перенос строк сводки на другие справочники
+- rebuild: полный пересчёт сводок по таблице транзакций
+- filter_rollups: фильтрация сводок по параметрам главной страницы
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .filters import FIELD_FILTERS, get_date_range
+from .models import DailyCashFlow, Transaction
+
+KEY_FIELDS = ('day', 'status_id', 'operation_id', 'category_id', 'subcategory_id')
+
+# Сохранение одной транзакции меняет не более двух строк сводки;
+# больше — это пачка, её выгоднее применять наборами
+BULK_THRESHOLD = 2
+
+
+def rollup_key(date, status_id, operation_id, category_id, subcategory_id):
+    """Ключ строки сводки: местный день и id справочников"""
+    return (timezone.localdate(date), status_id, operation_id, category_id, subcategory_id)
+
+
+def transaction_key(obj):
+    """Ключ строки сводки для объекта транзакции"""
+    return rollup_key(obj.date, obj.status_id, obj.operation_id, obj.category_id, obj.subcategory_id)
+
+
+def apply_deltas(deltas):
+    """
+    Применяет приращения {ключ: (сумма, количество)} к сводкам.
+
+    Единичные изменения (сохранение формы) обновляются выражением F() на
+    стороне БД. Пачки (импорт) обрабатываются наборами: существующие строки
+    читаются одним запросом с блокировкой и обновляются bulk_update,
+    недостающие создаются bulk_create.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta[0] or delta[1]}
+    if len(deltas) > BULK_THRESHOLD:
+        try:
+            with transaction.atomic():
+                _apply_bulk(deltas)
+            return
+        except IntegrityError:
+            # Часть строк успел создать параллельный запрос — по одной
+            pass
+    with transaction.atomic():
+        for key, (amount, count) in deltas.items():
+            _apply_one(key, amount, count)
+
+
+def _apply_one(key, amount, count):
+    """Приращение одной строки сводки"""
+    lookup = dict(zip(KEY_FIELDS, key))
+    rows = DailyCashFlow.objects.filter(**lookup)
+    updated = rows.update(total=F('total') + amount, count=F('count') + count)
+    if not updated:
+        try:
+            with transaction.atomic():
+                DailyCashFlow.objects.create(total=amount, count=count, **lookup)
+        except IntegrityError:
+            # Строку успел создать параллельный запрос
+            rows.update(total=F('total') + amount, count=F('count') + count)
+    if count < 0:
+        rows.filter(count__lte=0).delete()
+
+
+def _apply_bulk(deltas):
+    """Приращения набора строк сводки за постоянное число запросов"""
+    days = [key[0] for key in deltas]
+    candidates = DailyCashFlow.objects.select_for_update().filter(
+        day__gte=min(days),
+        day__lte=max(days),
+        **{f'{field}__in': {key[i] for key in deltas} for i, field in enumerate(KEY_FIELDS) if i}
+    )
+    existing = {row_key(row): row for row in candidates if row_key(row) in deltas}
+    to_update, to_create, to_delete = [], [], []
+    for key, (amount, count) in deltas.items():
+        row = existing.get(key)
+        if row is None:
+            to_create.append(DailyCashFlow(total=amount, count=count, **dict(zip(KEY_FIELDS, key))))
+            continue
+        row.total += amount
+        row.count += count
+        (to_delete if row.count <= 0 else to_update).append(row)
+
+    DailyCashFlow.objects.bulk_update(to_update, ['total', 'count'], batch_size=500)
+    DailyCashFlow.objects.bulk_create(to_create, batch_size=500)
+    if to_delete:
+        DailyCashFlow.objects.filter(pk__in=[row.pk for row in to_delete]).delete()
+
+
+def row_key(row):
+    """Ключ существующей строки сводки"""
+    return (row.day, row.status_id, row.operation_id, row.category_id, row.subcategory_id)
+
+
+def add_transactions(objs, sign=1):
+    """Учитывает в сводках пачку транзакций (sign=-1 — вычитает)"""
+    deltas = defaultdict(lambda: [Decimal(0), 0])
+    for obj in objs:
+        delta = deltas[transaction_key(obj)]
+        delta[0] += sign * Decimal(obj.amount)
+        delta[1] += sign
+    apply_deltas(deltas)
+
+
+def move(lookup, values):
+    """
+    Переносит строки сводки, выбранные lookup (например {'status_id': 3}),
+    на справочники values — после массового UPDATE транзакций. Приращения
+    берутся из самих строк сводки, транзакции не читаются
+    """
+    deltas = defaultdict(lambda: [Decimal(0), 0])
+    for row in DailyCashFlow.objects.filter(**lookup):
+        key = row_key(row)
+        target = tuple(values.get(field, value) for field, value in zip(KEY_FIELDS, key))
+        deltas[key][0] -= row.total
+        deltas[key][1] -= row.count
+        deltas[target][0] += row.total
+        deltas[target][1] += row.count
+    apply_deltas(deltas)
+
+
+def rebuild(batch_size=1000):
+    """Полный пересчёт сводок одним агрегирующим запросом по транзакциям"""
+    rows = (
+        Transaction.objects
+        .order_by()
+        .annotate(day=TruncDate('date', tzinfo=timezone.get_current_timezone()))
+        .values(*KEY_FIELDS)
+        .annotate(total=Sum('amount'), count=Count('id'))
+    )
+    with transaction.atomic():
+        DailyCashFlow.objects.all().delete()
+        created = DailyCashFlow.objects.bulk_create(
+            (DailyCashFlow(**row) for row in rows.iterator()),
+            batch_size=batch_size,
+        )
+    return len(created)
+
+
+def filter_rollups(qs, params):
+    """Фильтрация сводок по параметрам главной страницы (дата — по дням)"""
+    start, end = get_date_range(params)
+    if start is not None:
+        qs = qs.filter(day__gte=timezone.localdate(start))
+    if end is not None:
+        qs = qs.filter(day__lt=timezone.localdate(end))
+
+    for name, field in FIELD_FILTERS.items():
+        if params.get(name):
+            qs = qs.filter(**{field: params[name]})
+    return qs
@@ -0,0 +1,133 @@
+"""
+Полнотекстовый поиск по комментариям транзакций.
+
+SQLite: таблица FTS5 с внешним содержимым (DDSPosts_transaction_fts), которую
+поддерживают триггеры БД — индекс обновляется при любой записи, включая
+bulk_create и импорт. Поиск идёт по префиксам слов, ранжирование — bm25.
+PostgreSQL: GIN-индекс по to_tsvector(<конфигурация>, comment), поиск
+по префиксам основ слов (to_tsquery с :*), ранжирование — ts_rank.
+На других бэкендах — поиск подстроки без ранжирования.
+
+Содержит:
+- SEARCH_PARAM: GET-параметр строки поиска
+- install_search_index / remove_search_index: создание и удаление индекса (для миграций)
+- fts_query: строка поиска -> запрос FTS5
+- tsquery: строка поиска -> запрос to_tsquery PostgreSQL
+- search_transactions: фильтрация QuerySet транзакций с аннотацией search_rank
+"""
+
+import re
+
+from django.db import connections
+from django.db.models import F, Value
+
+SEARCH_PARAM = 'q'
+
+# Конфигурация полнотекстового поиска PostgreSQL (морфология русского языка)
+SEARCH_CONFIG = 'russian'
+
+SQLITE_CREATE = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS "DDSPosts_transaction_fts" USING fts5(
+        comment, content='DDSPosts_transaction', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS "DDSPosts_transaction_fts_ai" AFTER INSERT ON "DDSPosts_transaction" BEGIN
+        INSERT INTO "DDSPosts_transaction_fts" (rowid, comment) VALUES (new.id, new.comment);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS "DDSPosts_transaction_fts_ad" AFTER DELETE ON "DDSPosts_transaction" BEGIN
+        INSERT INTO "DDSPosts_transaction_fts" ("DDSPosts_transaction_fts", rowid, comment)
+        VALUES ('delete', old.id, old.comment);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS "DDSPosts_transaction_fts_au" AFTER UPDATE OF comment ON "DDSPosts_transaction" BEGIN
+        INSERT INTO "DDSPosts_transaction_fts" ("DDSPosts_transaction_fts", rowid, comment)
+        VALUES ('delete', old.id, old.comment);
+        INSERT INTO "DDSPosts_transaction_fts" (rowid, comment) VALUES (new.id, new.comment);
+    END""",
+    # Переиндексация всех транзакций из таблицы-источника
+    """INSERT INTO "DDSPosts_transaction_fts" ("DDSPosts_transaction_fts") VALUES ('rebuild')""",
+]
+
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS "DDSPosts_transaction_fts_ai"',
+    'DROP TRIGGER IF EXISTS "DDSPosts_transaction_fts_ad"',
+    'DROP TRIGGER IF EXISTS "DDSPosts_transaction_fts_au"',
+    'DROP TABLE IF EXISTS "DDSPosts_transaction_fts"',
+]
+
+# Выражение индекса совпадает с SQL, который строит SearchVector('comment', config=...)
+POSTGRES_CREATE = [
+    f"""CREATE INDEX IF NOT EXISTS "transaction_comment_search_idx" ON "DDSPosts_transaction"
+        USING gin (to_tsvector('{SEARCH_CONFIG}'::regconfig, COALESCE("comment", '')))""",
+]
+
+POSTGRES_DROP = [
+    'DROP INDEX IF EXISTS "transaction_comment_search_idx"',
+]
+
+
+def install_search_index(schema_editor):
+    """
+    Создаёт полнотекстовый индекс для текущего бэкенда.
+    Повторный вызов безопасен: в SQLite он восстанавливает триггеры
+    (они пропадают, когда миграция пересоздаёт таблицу транзакций).
+    """
+    statements = {'sqlite': SQLITE_CREATE, 'postgresql': POSTGRES_CREATE}
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def remove_search_index(schema_editor):
+    """Удаляет полнотекстовый индекс для текущего бэкенда"""
+    statements = {'sqlite': SQLITE_DROP, 'postgresql': POSTGRES_DROP}
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def fts_query(text):
+    """
+    Запрос FTS5 из пользовательской строки: каждое слово — префикс в
+    кавычках, слова объединяются по И. Операторы FTS5 во вводе не
+    интерпретируются, поэтому синтаксической ошибки быть не может.
+    """
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', text))
+
+
+def tsquery(text):
+    """
+    Запрос to_tsquery из пользовательской строки: каждое слово — префикс
+    (:*), слова объединяются по И, как в fts_query. Во вводе остаются только
+    слова, поэтому операторы tsquery не интерпретируются.
+    """
+    return ' & '.join(f'{word}:*' for word in re.findall(r'\w+', text))
+
+
+def search_transactions(qs, text):
+    """
+    Оставляет транзакции, комментарий которых подходит под строку поиска,
+    и добавляет аннотацию search_rank (чем больше — тем релевантнее).
+    Остальные фильтры QuerySet сохраняются.
+    """
+    vendor = connections[qs.db].vendor
+
+    if vendor == 'sqlite':
+        query = fts_query(text)
+        if not query:
+            return qs.none().annotate(search_rank=Value(0.0))
+        # rank FTS5 (bm25) отрицательный: чем меньше, тем релевантнее
+        return qs.filter(search__comment__match=query).annotate(search_rank=-F('search__rank'))
+
+    if vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+        query = tsquery(text)
+        if not query:
+            return qs.none().annotate(search_rank=Value(0.0))
+        vector = SearchVector('comment', config=SEARCH_CONFIG)
+        query = SearchQuery(query, config=SEARCH_CONFIG, search_type='raw')
+        return (
+            qs.annotate(search_vector=vector)
+            .filter(search_vector=query)
+            .annotate(search_rank=SearchRank(vector, query))
+        )
+
+    return qs.filter(comment__icontains=text).annotate(search_rank=Value(0.0))
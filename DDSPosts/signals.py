@@ -0,0 +1,136 @@
+"""
+Обработчики сигналов моделей.
+
+Содержит:
+- сброс кэша справочников при изменении статусов, типов, категорий и подкатегорий
+- обновление дневных сводок DailyCashFlow при изменении транзакций
+- увеличение версии журнала (ETag и кэш таблицы главной страницы) при изменении транзакций
+- поддержка витрины TransactionListing при изменении транзакций и переименовании справочников
+- настройка PRAGMA каждого нового соединения SQLite
+- учёт запросов к БД для метрик (обёртка execute_wrapper на каждом соединении)
+
+Обработчики сигналов транзакций и справочников выполняются в транзакции
+БД, которую открывают save() и delete() моделей (models.AtomicModel):
+сводки и витрина фиксируются вместе со строкой или откатываются вместе с ней.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from . import conditional, dictionaries, listing, metrics, rollups, sqlite
+from .models import Status, Type, Category, Subcategory, Transaction
+
+
+@receiver(post_save, sender=Status)
+@receiver(post_save, sender=Type)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Subcategory)
+@receiver(post_delete, sender=Status)
+@receiver(post_delete, sender=Type)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Subcategory)
+def invalidate_dictionaries(sender, **kwargs):
+    """
+    Сбрасывает кэш справочников.
+
+    Версия увеличивается сразу (изменение видно в текущей транзакции) и ещё
+    раз после фиксации: иначе параллельный запрос мог бы закэшировать
+    незафиксированное ещё старое состояние под новой версией.
+    """
+    dictionaries.invalidate()
+    transaction.on_commit(dictionaries.invalidate)
+
+
+@receiver(pre_save, sender=Transaction)
+def remember_saved_transaction(sender, instance, raw=False, **kwargs):
+    """
+    Запоминает сохранённое в БД состояние транзакции перед изменением.
+    Строка блокируется до конца транзакции (её открывает AtomicModel.save()):
+    параллельное изменение той же транзакции дождётся фиксации и прочитает
+    уже новую сумму, а не вычтет из сводки старую второй раз
+    """
+    instance._rollup_previous = None
+    if raw or instance.pk is None:
+        return
+    instance._rollup_previous = (
+        Transaction.objects
+        .select_for_update()
+        .filter(pk=instance.pk)
+        .values_list('date', 'status_id', 'operation_id', 'category_id', 'subcategory_id', 'amount')
+        .first()
+    )
+
+
+@receiver(post_save, sender=Transaction)
+def update_rollups_on_save(sender, instance, raw=False, **kwargs):
+    """Переносит сумму транзакции из старой строки сводки в новую"""
+    if raw:
+        return
+    deltas = defaultdict(lambda: [Decimal(0), 0])
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous is not None:
+        *key, amount = previous
+        delta = deltas[rollups.rollup_key(*key)]
+        delta[0] -= amount
+        delta[1] -= 1
+    delta = deltas[rollups.transaction_key(instance)]
+    delta[0] += Decimal(instance.amount)
+    delta[1] += 1
+    rollups.apply_deltas(deltas)
+
+
+@receiver(post_delete, sender=Transaction)
+def update_rollups_on_delete(sender, instance, **kwargs):
+    """Вычитает удалённую транзакцию из сводки"""
+    rollups.add_transactions([instance], sign=-1)
+
+
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+def bump_ledger_version(sender, **kwargs):
+    """Меняет ETag страниц и делает устаревшими таблицы в кэше (сразу и после фиксации)"""
+    conditional.bump_ledger_version()
+    transaction.on_commit(conditional.bump_ledger_version)
+
+
+@receiver(post_save, sender=Transaction)
+def sync_listing_on_save(sender, instance, raw=False, **kwargs):
+    """Вставляет или обновляет строку витрины сохранённой транзакции"""
+    if raw:
+        return
+    listing.sync_transactions([instance])
+
+
+@receiver(post_delete, sender=Transaction)
+def sync_listing_on_delete(sender, instance, **kwargs):
+    """Удаляет строку витрины удалённой транзакции"""
+    listing.remove_transactions([instance.pk])
+
+
+@receiver(post_save, sender=Status)
+@receiver(post_save, sender=Type)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Subcategory)
+def rename_in_listing(sender, instance, created=False, raw=False, **kwargs):
+    """Переносит новое название справочника в строки витрины одним UPDATE"""
+    if raw or created:
+        return
+    listing.rename(instance)
+
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    """Применяет PRAGMA (sqlite.get_pragmas) к новому соединению SQLite"""
+    sqlite.apply_pragmas(connection)
+
+
+@receiver(connection_created)
+def install_query_metrics(sender, connection, **kwargs):
+    """Подключает счётчик запросов метрик к новому соединению"""
+    if metrics.query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(metrics.query_wrapper)
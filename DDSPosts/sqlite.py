@@ -0,0 +1,98 @@
+"""
+Настройка соединений SQLite.
+
+При каждом новом соединении (сигнал connection_created) выполняются PRAGMA
+DEFAULT_PRAGMAS с поправками из настройки DDS_SQLITE_PRAGMAS. Режим WAL позволяет читать список
+транзакций, пока другой запрос пишет, synchronous=NORMAL убирает fsync на
+каждую фиксацию (в WAL это безопасно), mmap_size и cache_size держат
+горячие страницы в памяти, busy_timeout заставляет писателя ждать
+блокировку вместо немедленной ошибки «database is locked».
+
+Содержит:
+- DEFAULT_PRAGMAS: значения по умолчанию
+- get_pragmas: DEFAULT_PRAGMAS с поправками из настроек (с проверкой имён и значений)
+- apply_pragmas: выполнение PRAGMA на соединении
+- read_pragmas: текущие значения PRAGMA соединения
+- wal_checkpoint: контрольная точка WAL и её статистика
+"""
+
+import re
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,  # байт
+    'cache_size': -64 * 1024,        # отрицательное значение — КиБ, т.е. 64 МиБ
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,            # мс
+}
+
+# PRAGMA, которые можно задать в настройках
+ALLOWED_PRAGMAS = set(DEFAULT_PRAGMAS) | {'foreign_keys', 'wal_autocheckpoint', 'journal_size_limit'}
+
+# PRAGMA, которые показывает команда sqlite_status
+REPORTED_PRAGMAS = [
+    'journal_mode', 'synchronous', 'mmap_size', 'cache_size', 'temp_store', 'busy_timeout',
+    'wal_autocheckpoint', 'journal_size_limit', 'page_size', 'page_count', 'freelist_count',
+]
+
+CHECKPOINT_MODES = ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE')
+
+_VALUE = re.compile(r'^(-?\d+|[A-Za-z]+)$')
+
+
+def get_pragmas():
+    """
+    DEFAULT_PRAGMAS, поверх которых — значения из настройки
+    DDS_SQLITE_PRAGMAS (None — ничего не менять). Значения подставляются в
+    SQL, поэтому допускаются только известные имена и значения-числа или слова.
+    """
+    overrides = getattr(settings, 'DDS_SQLITE_PRAGMAS', {})
+    if overrides is None:
+        return {}
+    pragmas = DEFAULT_PRAGMAS | overrides
+    for name, value in pragmas.items():
+        if name not in ALLOWED_PRAGMAS:
+            raise ImproperlyConfigured(f'DDS_SQLITE_PRAGMAS: неизвестная PRAGMA {name!r}')
+        if not _VALUE.match(str(value)):
+            raise ImproperlyConfigured(f'DDS_SQLITE_PRAGMAS: недопустимое значение {name}={value!r}')
+    return pragmas
+
+
+def apply_pragmas(connection, pragmas=None):
+    """Выполняет PRAGMA на соединении SQLite; для других бэкендов ничего не делает"""
+    if connection.vendor != 'sqlite':
+        return
+    if pragmas is None:
+        pragmas = get_pragmas()
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def read_pragmas(connection, names=REPORTED_PRAGMAS):
+    """Текущие значения PRAGMA: {имя: значение}"""
+    values = {}
+    with connection.cursor() as cursor:
+        for name in names:
+            cursor.execute(f'PRAGMA {name}')
+            row = cursor.fetchone()
+            values[name] = row[0] if row else None
+    return values
+
+
+def wal_checkpoint(connection, mode='PASSIVE'):
+    """
+    Контрольная точка WAL. Возвращает (busy, log, checkpointed): признак
+    блокировки, число кадров в журнале и сколько из них перенесено в БД.
+    Вне режима WAL SQLite возвращает (0, -1, -1).
+    """
+    mode = mode.upper()
+    if mode not in CHECKPOINT_MODES:
+        raise ValueError(f'Неизвестный режим контрольной точки: {mode}')
+    with connection.cursor() as cursor:
+        cursor.execute(f'PRAGMA wal_checkpoint({mode})')
+        return tuple(cursor.fetchone())
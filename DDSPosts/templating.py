@@ -0,0 +1,32 @@
+"""
+Шаблонизатор Django с учётом времени рендеринга.
+
+Тот же бэкенд DjangoTemplates, но шаблоны верхнего уровня (то, что рендерят
+render(), TemplateResponse и админка) замеряются для метрик запроса.
+Вложенные include и extends входят во время внешнего шаблона.
+
+Содержит:
+- DjangoTemplates: бэкенд для настройки TEMPLATES
+"""
+
+from django.template.backends import django as django_backend
+
+from . import metrics
+
+
+class TimedTemplate(django_backend.Template):
+    """Шаблон, время рендеринга которого учитывается в метриках"""
+
+    def render(self, context=None, request=None):
+        with metrics.template_timer():
+            return super().render(context, request)
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """Бэкенд DjangoTemplates, возвращающий TimedTemplate"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
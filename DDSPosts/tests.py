@@ -1,10 +1,100 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import tempfile
+import zipfile
+from unittest import skipUnless
+from xml.etree import ElementTree
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Count, Sum
+from django.http import Http404
+from django.test import AsyncRequestFactory, Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
+from datetime import datetime, timedelta
+from io import BytesIO, StringIO
 from decimal import Decimal
+from zoneinfo import ZoneInfo
+
+from . import api, async_views, checks, dictionaries, fragments, jobs, listing, metrics, reports, rollups, sqlite
+from .async_views import AsyncTransactionListView
+from .bulk import bulk_create_transactions, reassign_transactions
+from .models import Type, Category, Subcategory, Status, Transaction, TransactionListing, DailyCashFlow, Job
+from .forms import StaleDictionaryError, TransactionForm, create_transactions, row_errors, validate_transaction_rows
+from .management.commands import seed_ledger
+from .dictionaries import get_dictionaries, get_version
+from .filters import get_date_range
+from .search import search_transactions
+
+# Тесты не должны читать и менять кэш разработчика (BASE_DIR/cache): на время
+# модуля — файловый кэш во временном каталоге, общий для процессов, как в
+# рабочей настройке
+_test_cache_dir = tempfile.TemporaryDirectory()
+_test_caches = override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': _test_cache_dir.name,
+}})
+
+
+def setUpModule():
+    _test_caches.enable()
+
+
+def tearDownModule():
+    _test_caches.disable()
+    _test_cache_dir.cleanup()
+
+
+class LedgerTestMixin:
+    """
+    Общие справочники тестов журнала: статусы «Бизнес» и «Личное», тип
+    «Списание» с ветвями Маркетинг → Avito и Аренда → Офис. Для TestCase они
+    создаются один раз на класс, для TransactionTestCase — в setUp.
+    Кэш общий для тестов, а откат транзакции теста его не сбрасывает,
+    поэтому перед каждым тестом он очищается.
+    """
+    day = datetime(2025, 3, 10, 12, 0, tzinfo=ZoneInfo('UTC'))
+
+    @classmethod
+    def create_dictionaries(cls):
+        cls.status = Status.objects.create(name="Бизнес")
+        cls.other_status = Status.objects.create(name="Личное")
+        cls.type = Type.objects.create(name="Списание", kind=Type.EXPENSE)
+        cls.category = Category.objects.create(name="Маркетинг", type=cls.type)
+        cls.subcategory = Subcategory.objects.create(name="Avito", category=cls.category)
+        cls.other_category = Category.objects.create(name="Аренда", type=cls.type)
+        cls.other_subcategory = Subcategory.objects.create(name="Офис", category=cls.other_category)
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.create_dictionaries()
+
+    def setUp(self):
+        super().setUp()
+        for cache in caches.all():
+            cache.clear()
+        if not isinstance(self, TestCase):
+            self.create_dictionaries()
+
+    def new_transaction(self, amount='10', **fields):
+        """Несохранённая транзакция по ветви Маркетинг → Avito (для bulk_create)"""
+        defaults = dict(date=self.day, status=self.status, operation=self.type, category=self.category,
+                        subcategory=self.subcategory)
+        return Transaction(amount=Decimal(amount), **(defaults | fields))
+
+    def create_transaction(self, amount='10', **fields):
+        transaction = self.new_transaction(amount, **fields)
+        transaction.save()
+        return transaction
 
-from .models import Type, Category, Subcategory, Status, Transaction
-from .forms import TransactionForm
 
 class TransactionModelTest(TestCase):
     """Тестирование модели Transaction"""
@@ -100,6 +190,71 @@ class TransactionFormTest(TestCase):
         self.assertIn('operation', form.errors)
         self.assertIn('amount', form.errors)
 
+    def test_chain_validated_without_queries(self):
+        """Цепочка справочников проверяется по кэшу, без запросов к БД, с прежними сообщениями"""
+        other_type = Type.objects.create(name="Поступление")
+        other_category = Category.objects.create(name="Продажи", type=other_type)
+        other_subcategory = Subcategory.objects.create(name="Опт", category=other_category)
+        valid = {
+            'date': '2025-03-01',
+            'status': self.status.id,
+            'operation': self.type.id,
+            'category': self.category.id,
+            'subcategory': self.subcategory.id,
+            'amount': '10',
+        }
+        invalid_choice = TransactionForm.base_fields['status'].error_messages['invalid_choice']
+        get_dictionaries()
+
+        with self.assertNumQueries(0):
+            form = TransactionForm(data=valid)
+            self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data['subcategory'], self.subcategory)
+
+        cases = [
+            ({'status': 999}, ['status']),
+            ({'operation': 999}, ['operation', 'category']),
+            # Категория другого типа (с её же подкатегорией)
+            ({'category': other_category.id, 'subcategory': other_subcategory.id}, ['category']),
+            ({'subcategory': other_subcategory.id}, ['subcategory']),  # подкатегория другой категории
+        ]
+        for change, fields in cases:
+            with self.subTest(change=change), self.assertNumQueries(0):
+                form = TransactionForm(data={**valid, **change})
+                self.assertFalse(form.is_valid())
+                self.assertEqual(sorted(form.errors), sorted(fields))
+                for field in fields:
+                    self.assertEqual(form.errors[field], [invalid_choice])
+
+
+class StaleDictionaryTest(LedgerTestMixin, TransactionTestCase):
+    """
+    Справочник удалён после загрузки кэша: ошибка поля вместо IntegrityError
+    (внешние ключи проверяются при фиксации — поэтому TransactionTestCase)
+    """
+    def setUp(self):
+        super().setUp()
+        self.row = {'date': '2025-03-01', 'status': self.status.id, 'operation': self.type.id,
+                    'category': self.category.id, 'subcategory': self.subcategory.id, 'amount': '10'}
+
+    def test_form_and_batch(self):
+        invalid_choice = TransactionForm.base_fields['status'].error_messages['invalid_choice']
+        tree = get_dictionaries()
+        form = TransactionForm(data=self.row, tree=tree)
+        forms, errors = validate_transaction_rows([self.row, self.row], tree)
+        self.assertTrue(form.is_valid())
+        self.assertEqual(errors, [])
+
+        # Удаление из другого процесса: дерево в формах уже загружено
+        self.subcategory.delete()
+        with self.assertRaises(StaleDictionaryError):
+            form.save()
+        self.assertEqual(form.errors['subcategory'], [invalid_choice])
+        with self.assertRaises(StaleDictionaryError):
+            create_transactions(forms)
+        self.assertEqual([list(row['errors']) for row in row_errors(forms)], [['subcategory'], ['subcategory']])
+        self.assertFalse(Transaction.objects.exists())
+
 class AjaxDropdownTest(TestCase):
     """Тесты AJAX. Загрузки категорий и подкатегорий"""
     def setUp(self):
@@ -118,3 +273,1767 @@ class AjaxDropdownTest(TestCase):
         response = self.client.get(reverse('ajax_load_subcategories'), {'category_id': self.category.id})
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, self.subcategory.name)
+
+
+class CursorPaginationTest(LedgerTestMixin, TestCase):
+    """Тесты курсорной пагинации главной страницы"""
+    def setUp(self):
+        super().setUp()
+        # Половина записей с одинаковой датой — проверка второго ключа (id)
+        same_date = timezone.now()
+        for i in range(60):
+            self.create_transaction(
+                i,
+                date=same_date if i % 2 else same_date - timedelta(days=i),
+                status=self.status if i % 3 else self.other_status,
+                comment=f"Запись {i}"
+            )
+
+    def walk(self, params):
+        """Проходит все страницы вперёд, возвращает id записей и последнюю страницу"""
+        seen = []
+        response = self.client.get(reverse('transaction_list'), dict(params, cursor=''))
+        while True:
+            self.assertEqual(response.status_code, 200)
+            page = response.context['page_obj']
+            seen.extend(t.pk for t in page)
+            if not page.has_next():
+                return seen, response
+            response = self.client.get(reverse('transaction_list'), dict(params, cursor=page.next_token))
+
+    def test_cursor_walk_matches_ordering(self):
+        """Курсорный обход выдаёт все записи в порядке (-date, -id) без повторов"""
+        seen, _ = self.walk({})
+        expected = list(Transaction.objects.order_by('-date', '-id').values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_cursor_keeps_filters(self):
+        """Курсор работает в пределах активных фильтров"""
+        seen, _ = self.walk({'status': self.other_status.id})
+        expected = list(Transaction.objects.filter(status=self.other_status)
+                        .order_by('-date', '-id').values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_previous_page(self):
+        """Переход назад возвращает предыдущую страницу"""
+        first = self.client.get(reverse('transaction_list'), {'cursor': ''}).context['page_obj']
+        second = self.client.get(reverse('transaction_list'), {'cursor': first.next_token}).context['page_obj']
+        back = self.client.get(reverse('transaction_list'), {'cursor': second.previous_token}).context['page_obj']
+        self.assertEqual([t.pk for t in back], [t.pk for t in first])
+        self.assertFalse(back.has_previous())
+
+    def test_no_count_by_default(self):
+        """В курсорном режиме общий COUNT(*) не выполняется"""
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('transaction_list'), {'cursor': ''})
+        self.assertIsNone(response.context['paginator'].count)
+        self.assertEqual([q['sql'] for q in ctx.captured_queries if 'COUNT(' in q['sql'].upper()], [])
+        response = self.client.get(reverse('transaction_list'), {'cursor': '', 'count': '1'})
+        self.assertEqual(response.context['paginator'].count, 60)
+
+    def test_cursor_rejected_with_other_filters(self):
+        """Токен, выданный для других фильтров или повреждённый, отклоняется"""
+        page = self.client.get(reverse('transaction_list'), {'cursor': ''}).context['page_obj']
+        response = self.client.get(reverse('transaction_list'),
+                                   {'cursor': page.next_token, 'status': self.status.id})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('transaction_list'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_template_renders_cursor_links(self):
+        """Шаблон выводит ссылку на следующую страницу с сохранением фильтров"""
+        response = self.client.get(reverse('transaction_list'), {'cursor': '', 'status': self.status.id})
+        self.assertContains(response, f'?status={self.status.id}&cursor=')
+
+
+@override_settings(DDS_FRAGMENT_CACHE=None)  # замеряется отрисовка таблицы, а не кэш
+class ListingQueryCountTest(LedgerTestMixin, TestCase):
+    """Число запросов таблицы транзакций не зависит от числа строк"""
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def add_transactions(self, count):
+        Transaction.objects.bulk_create(self.new_transaction(i) for i in range(count))
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_for_listing_single_query(self):
+        """Названия справочников читаются без дополнительных запросов"""
+        self.add_transactions(10)
+        with self.assertNumQueries(1):
+            rows = [(t.operation.name, t.category.name, t.subcategory.name, t.status.name)
+                    for t in Transaction.objects.for_listing()]
+        self.assertEqual(len(rows), 10)
+
+    def test_list_view_query_count_is_constant(self):
+        """Главная страница: одинаковое число запросов для 2 и 25 строк"""
+        self.add_transactions(2)
+        self.client.get(reverse('transaction_list'))  # прогрев кэша справочников
+        small = self.count_queries(reverse('transaction_list'))
+        self.add_transactions(40)
+        self.assertEqual(self.count_queries(reverse('transaction_list')), small)
+        # Курсор обходится без COUNT(*): версия журнала для ETag читается из кэша
+        self.assertEqual(self.count_queries(reverse('transaction_list') + '?cursor='), small - 1)
+
+    def test_admin_changelist_query_count_is_constant(self):
+        """Список транзакций в админке: число запросов не зависит от числа строк"""
+        self.client.login(username='admin', password='password')
+        url = reverse('admin:DDSPosts_transaction_changelist')
+        self.add_transactions(2)
+        small = self.count_queries(url)
+        self.add_transactions(150)
+        self.assertEqual(self.count_queries(url), small)
+
+
+class QueryPlanTest(TestCase):
+    """Запросы главной страницы используют составные индексы"""
+    def test_check_query_plans(self):
+        """Ни одна комбинация фильтров не приводит к полному сканированию или сортировке"""
+        out = StringIO()
+        call_command('check_query_plans', stdout=out)
+        self.assertNotIn('FAIL', out.getvalue())
+
+
+@override_settings(TIME_ZONE='Europe/Moscow')
+class DateFilterTest(LedgerTestMixin, TestCase):
+    """Фильтрация по дате полуоткрытыми диапазонами с учётом TIME_ZONE"""
+    def setUp(self):
+        super().setUp()
+        moscow = ZoneInfo('Europe/Moscow')
+        # 1 января 23:59:59, 2 января 00:00 и 23:30, 3 января 00:00 по Москве
+        self.dates = [
+            datetime(2025, 1, 1, 23, 59, 59, tzinfo=moscow),
+            datetime(2025, 1, 2, 0, 0, tzinfo=moscow),
+            datetime(2025, 1, 2, 23, 30, tzinfo=moscow),
+            datetime(2025, 1, 3, 0, 0, tzinfo=moscow),
+        ]
+        for i, date in enumerate(self.dates):
+            self.create_transaction(i, date=date, comment=f"Запись {i}")
+
+    def listed_amounts(self, params):
+        response = self.client.get(reverse('transaction_list'), params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(int(t.amount) for t in response.context['transactions'])
+
+    def test_single_day(self):
+        """Фильтр за день включает весь местный день и не захватывает соседние"""
+        self.assertEqual(self.listed_amounts({'date': '2025-01-02'}), [1, 2])
+
+    def test_period_is_inclusive(self):
+        """Период «с ... по ...» включает оба граничных дня"""
+        self.assertEqual(self.listed_amounts({'date_from': '2025-01-01', 'date_to': '2025-01-02'}), [0, 1, 2])
+        self.assertEqual(self.listed_amounts({'date_from': '2025-01-02'}), [1, 2, 3])
+        self.assertEqual(self.listed_amounts({'date_to': '2025-01-01'}), [0])
+
+    def test_invalid_date_ignored(self):
+        """Некорректная дата не ломает страницу и не фильтрует"""
+        self.assertEqual(self.listed_amounts({'date': '2025-02-30'}), [0, 1, 2, 3])
+
+    def test_range_predicates(self):
+        """Фильтр строится как date >= начало AND date < конец"""
+        start, end = get_date_range({'date': '2025-01-02'})
+        self.assertEqual(start, self.dates[1])
+        self.assertEqual(end, self.dates[3])
+
+
+class DictionaryCacheTest(LedgerTestMixin, TestCase):
+    """Кэш справочников и его сброс по сигналам"""
+
+    def test_tree_structure(self):
+        """Дерево связывает тип, категории и подкатегории без запросов"""
+        tree = get_dictionaries()
+        with self.assertNumQueries(0):
+            category = tree.categories_of(self.type.id)[0]
+            self.assertEqual(category.type.name, "Списание")
+            subcategory = tree.subcategories_of(str(category.id))[0]
+            self.assertEqual(subcategory.category.type.name, "Списание")
+            self.assertEqual(tree.categories_of('abc'), [])
+
+    @override_settings(DDS_FRAGMENT_CACHE=None)
+    def test_steady_state_needs_no_queries(self):
+        """Повторные страницы не читают справочники из БД"""
+        self.create_transaction()
+        self.client.get(reverse('transaction_list'))
+        with self.assertNumQueries(0):
+            self.client.get(reverse('create'))
+            self.client.get(reverse('ajax_load_categories'), {'type_id': self.type.id})
+        with self.assertNumQueries(2):  # валидатор с COUNT(*) и страница транзакций
+            self.client.get(reverse('transaction_list'))
+        with self.assertNumQueries(4):  # только число транзакций по каждому полю справочника
+            self.client.get(reverse('directory_panel'))
+
+    def test_invalidated_on_save_and_delete(self):
+        """Изменение любого справочника сразу видно на страницах"""
+        version = get_version()
+        self.client.get(reverse('directory_panel'))
+        self.status.name = "Налог"
+        self.status.save()
+        self.assertNotEqual(get_version(), version)
+        self.assertContains(self.client.get(reverse('directory_panel')), "Налог")
+
+        Subcategory.objects.create(name="Яндекс", category=self.category)
+        self.assertContains(self.client.get(reverse('directory_panel')), "Яндекс")
+
+        self.subcategory.delete()
+        self.assertNotContains(self.client.get(reverse('directory_panel')), "Avito")
+
+
+    def test_change_from_other_process_seen(self):
+        """Другой процесс меняет справочник и версию в общем кэше — дерево перечитывается"""
+        get_dictionaries()
+        # Запись в обход сигналов этого процесса и увеличение версии, как это
+        # сделал бы обработчик сигнала в другом процессе
+        Category.objects.bulk_create([Category(name="Связь", type=self.type)])
+        dictionaries.get_cache().incr(dictionaries.VERSION_KEY)
+        self.assertIn("Связь", [c.name for c in get_dictionaries().categories_of(self.type.id)])
+
+    def test_process_local_cache_warned(self):
+        """Кэш справочников в памяти процесса — предупреждение системной проверки"""
+        self.assertEqual(checks.check_shared_cache(None), [])
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=locmem):
+            self.assertEqual([w.id for w in checks.check_shared_cache(None)], ['DDSPosts.W001'])
+
+class DictionaryTreeEndpointTest(LedgerTestMixin, TestCase):
+    """JSON-дерево справочников с ETag и 304"""
+    def test_full_tree(self):
+        """Без параметров возвращаются статусы и все типы с вложенными ветвями"""
+        response = self.client.get(reverse('ajax_dictionary_tree'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('public', response['Cache-Control'])
+        data = response.json()
+        self.assertEqual(data['statuses'], [{'id': self.status.id, 'name': "Бизнес"},
+                                            {'id': self.other_status.id, 'name': "Личное"}])
+        categories = {category['name']: category for category in data['types'][0]['categories']}
+        self.assertEqual(categories.keys(), {"Маркетинг", "Аренда"})
+        self.assertEqual(categories["Маркетинг"]['subcategories'], [{'id': self.subcategory.id, 'name': "Avito"}])
+
+    def test_branches(self):
+        """Ветвь типа и ветвь категории"""
+        data = self.client.get(reverse('ajax_dictionary_tree'), {'type_id': self.type.id}).json()
+        self.assertEqual({c['id'] for c in data['categories']}, {self.category.id, self.other_category.id})
+        data = self.client.get(reverse('ajax_dictionary_tree'), {'category_id': self.category.id}).json()
+        self.assertEqual([sc['name'] for sc in data['subcategories']], ["Avito"])
+
+    def test_not_modified(self):
+        """Повтор с If-None-Match отдаёт 304 без запросов к БД"""
+        response = self.client.get(reverse('ajax_dictionary_tree'))
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('ajax_dictionary_tree'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('max-age', response['Cache-Control'])
+
+        # ETag ветви отличается от ETag всего дерева
+        response = self.client.get(reverse('ajax_dictionary_tree'), {'type_id': self.type.id},
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_changes_with_dictionaries(self):
+        """После изменения справочника старый ETag не подходит"""
+        etag = self.client.get(reverse('ajax_dictionary_tree'))['ETag']
+        Category.objects.create(name="Проценты", type=self.type)
+        response = self.client.get(reverse('ajax_dictionary_tree'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, "Проценты")
+
+
+class ImportTransactionsTest(LedgerTestMixin, TestCase):
+    """Команда import_transactions"""
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other_type = Type.objects.create(name="Пополнение")
+
+    def setUp(self):
+        super().setUp()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def run_import(self, path, *args):
+        out, err = StringIO(), StringIO()
+        call_command('import_transactions', path, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def csv_rows(self, count, start=0):
+        header = 'date,status,type,category,subcategory,amount,comment\n'
+        return header + ''.join(
+            f'2025-01-{i % 28 + 1:02d},Бизнес,Списание,Маркетинг,Avito,{i}.50,Строка {i}\n'
+            for i in range(start, start + count)
+        )
+
+    def test_csv_import_in_batches(self):
+        """Корректные строки вставляются пачками указанного размера"""
+        path = self.write('rows.csv', self.csv_rows(7))
+        out, _ = self.run_import(path, '--batch-size', '3')
+        self.assertIn('импортировано: 7, отклонено: 0', out)
+        self.assertEqual(Transaction.objects.count(), 7)
+        transaction = Transaction.objects.get(comment='Строка 2')
+        self.assertEqual(transaction.amount, Decimal('2.50'))
+        self.assertEqual(transaction.subcategory, self.subcategory)
+
+    def test_batch_query_count_is_constant(self):
+        """Число запросов на пачку не зависит от числа строк в ней"""
+        get_dictionaries()
+        # Сводки за все дни уже есть: обе пачки только обновляют строки
+        self.run_import(self.write('seed.csv', self.csv_rows(28)))
+        small = self.write('small.csv', self.csv_rows(3, start=27))
+        large = self.write('large.csv', self.csv_rows(60, start=30))
+        with CaptureQueriesContext(connection) as ctx:
+            self.run_import(small)
+        with self.assertNumQueries(len(ctx.captured_queries)):
+            self.run_import(large)
+        self.assertEqual(Transaction.objects.count(), 91)
+
+    def test_invalid_rows_rejected(self):
+        """Неверная цепочка, неизвестный статус и сумма отклоняются с отчётом"""
+        path = self.write('rows.csv', '\n'.join([
+            'date,status,type,category,subcategory,amount',
+            '2025-01-01,Бизнес,Списание,Маркетинг,Avito,100',
+            '2025-01-01,Бизнес,Пополнение,Маркетинг,Avito,100',  # категория другого типа
+            '2025-01-01,Неизвестно,Списание,Маркетинг,Avito,100',
+            '2025-01-01,Бизнес,Списание,Маркетинг,Avito,много',
+            'вчера,Бизнес,Списание,Маркетинг,Avito,1',
+        ]) + '\n')
+        rejects = os.path.join(self.tmpdir.name, 'rejects.csv')
+        out, err = self.run_import(path, '--rejects', rejects)
+        self.assertIn('импортировано: 1, отклонено: 4', out)
+        self.assertIn('строка 3: category', err)
+        self.assertIn('строка 4: status', err)
+        self.assertIn('строка 5: amount', err)
+        self.assertIn('строка 6: date', err)
+        with open(rejects, encoding='utf-8') as f:
+            self.assertEqual(len(list(csv.reader(f))), 5)
+
+    def test_jsonl_import(self):
+        """JSONL: одна транзакция на строку, битые строки отклоняются"""
+        path = self.write('rows.jsonl', '\n'.join([
+            json.dumps({'date': '2025-02-01 10:00', 'status': 'Бизнес', 'operation': 'Списание',
+                        'category': 'Маркетинг', 'subcategory': 'Avito', 'amount': 10}),
+            '{битый json',
+        ]))
+        out, _ = self.run_import(path)
+        self.assertIn('импортировано: 1, отклонено: 1', out)
+
+
+class ExportTest(LedgerTestMixin, TestCase):
+    """Потоковая выгрузка отфильтрованных транзакций"""
+    def setUp(self):
+        super().setUp()
+        Transaction.objects.bulk_create(
+            self.new_transaction(f'{i}.25', status=self.status if i % 2 else self.other_status,
+                             comment=f'Запись "{i}", с запятой')
+            for i in range(60)
+        )
+
+    def test_csv_contains_all_filtered_rows(self):
+        """CSV содержит все строки под фильтром, а не одну страницу"""
+        response = self.client.get(reverse('export'), {'format': 'csv', 'status': self.status.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment', response['Content-Disposition'])
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        rows = list(csv.reader(StringIO(content)))
+        self.assertEqual(rows[0][:2], ['Дата', 'Тип'])
+        self.assertEqual(len(rows), 31)
+        self.assertEqual(rows[1][1:6], ['Списание', 'Маркетинг', 'Avito', 'Бизнес', '59.25'])
+        self.assertEqual(rows[1][6], 'Запись "59", с запятой')
+
+    def test_xlsx_is_valid_workbook(self):
+        """XLSX — корректный zip с листом, содержащим все строки"""
+        response = self.client.get(reverse('export'), {'format': 'xlsx'})
+        self.assertEqual(response.status_code, 200)
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        self.assertIsNone(archive.testzip())
+        sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+        ns = {'x': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        rows = sheet.findall('x:sheetData/x:row', ns)
+        self.assertEqual(len(rows), 61)
+        self.assertEqual(rows[1].findall('x:c', ns)[5].find('x:v', ns).text, '59.25')
+
+    def test_unknown_format(self):
+        response = self.client.get(reverse('export'), {'format': 'pdf'})
+        self.assertEqual(response.status_code, 404)
+
+
+class DailyCashFlowTest(LedgerTestMixin, TestCase):
+    """Дневные сводки поддерживаются при создании, изменении и удалении транзакций"""
+    def snapshot(self):
+        return sorted(DailyCashFlow.objects.values_list(
+            'day', 'category_id', 'subcategory_id', 'total', 'count'))
+
+    def assertMatchesRebuild(self):
+        """Инкрементальные сводки совпадают с полным пересчётом"""
+        incremental = self.snapshot()
+        rollups.rebuild()
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_create_and_delete(self):
+        first = self.create_transaction('100.10')
+        self.create_transaction('50.05')
+        self.assertEqual(self.snapshot(), [(self.day.date(), self.category.id, self.subcategory.id,
+                                            Decimal('150.15'), 2)])
+        first.delete()
+        self.assertEqual(self.snapshot()[0][3:], (Decimal('50.05'), 1))
+        self.assertMatchesRebuild()
+
+    def test_failed_rollup_rolls_back_row(self):
+        """Ошибка обновления сводки откатывает и запись самой транзакции"""
+        transaction = self.create_transaction('100')
+
+        def fail(*args, **kwargs):
+            raise RuntimeError('сводка')
+
+        apply_deltas, add_transactions = rollups.apply_deltas, rollups.add_transactions
+        rollups.apply_deltas = rollups.add_transactions = fail
+        try:
+            with self.assertRaises(RuntimeError):
+                self.create_transaction('50')
+            transaction.amount = Decimal('70')
+            with self.assertRaises(RuntimeError):
+                transaction.save()
+            with self.assertRaises(RuntimeError):
+                transaction.delete()
+        finally:
+            rollups.apply_deltas, rollups.add_transactions = apply_deltas, add_transactions
+        self.assertEqual(list(Transaction.objects.values_list('amount', flat=True)), [Decimal('100')])
+        self.assertMatchesRebuild()
+
+    def test_edit_moves_amount(self):
+        """Изменение суммы, даты и категории переносит сумму между строками сводки"""
+        transaction = self.create_transaction('100')
+        self.create_transaction('1')
+        transaction.amount = Decimal('70')
+        transaction.save()
+        self.assertMatchesRebuild()
+        transaction.category = self.other_category
+        transaction.subcategory = self.other_subcategory
+        transaction.date = self.day + timedelta(days=1)
+        transaction.save()
+        self.assertEqual(len(self.snapshot()), 2)
+        self.assertMatchesRebuild()
+
+    def test_last_transaction_removes_row(self):
+        """Строка сводки без транзакций удаляется"""
+        self.create_transaction('10').delete()
+        self.assertEqual(DailyCashFlow.objects.count(), 0)
+
+    def test_bulk_create_updates_rollups(self):
+        """Пачечная вставка учитывается в сводках"""
+        self.create_transaction('5')
+        bulk_create_transactions([self.new_transaction(i, date=self.day + timedelta(days=i % 3)) for i in range(10)])
+        self.assertMatchesRebuild()
+
+    def test_rebuild_command(self):
+        self.create_transaction('10')
+        DailyCashFlow.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_cashflow', stdout=out)
+        self.assertIn('Строк сводки: 1', out.getvalue())
+
+    def test_summary_reads_only_rollups(self):
+        """Сводка строится по DailyCashFlow одним запросом"""
+        self.create_transaction('100')
+        self.create_transaction('20', date=self.day + timedelta(days=40), category=self.other_category,
+                                subcategory=self.other_subcategory)
+        get_dictionaries()
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('cashflow_summary'), {'by': 'category'})
+        self.assertEqual([(row['name'], row['total']) for row in response.context['rows']],
+                         [("Аренда", Decimal('20.00')), ("Маркетинг", Decimal('100.00'))])
+        self.assertEqual(response.context['total'], Decimal('120.00'))
+
+        response = self.client.get(reverse('cashflow_summary'), {'period': 'day', 'date_to': '2025-03-31'})
+        self.assertEqual(len(response.context['rows']), 1)
+
+
+class CashFlowReportTest(TestCase):
+    """Отчёт: поступления, списания, сальдо и подытоги одним запросом"""
+    def setUp(self):
+        self.status = Status.objects.create(name="Бизнес")
+        self.income = Type.objects.create(name="Пополнение", kind=Type.INCOME)
+        self.expense = Type.objects.create(name="Списание", kind=Type.EXPENSE)
+        self.sales = Category.objects.create(name="Продажи", type=self.income)
+        self.marketing = Category.objects.create(name="Маркетинг", type=self.expense)
+        self.shop = Subcategory.objects.create(name="Магазин", category=self.sales)
+        self.avito = Subcategory.objects.create(name="Avito", category=self.marketing)
+        self.farpost = Subcategory.objects.create(name="Farpost", category=self.marketing)
+        self.day = datetime(2025, 3, 10, 12, 0, tzinfo=ZoneInfo('UTC'))
+        for amount, subcategory, days in [('1000.10', self.shop, 0), ('0.20', self.shop, 40),
+                                          ('300.03', self.avito, 0), ('0.07', self.farpost, 1)]:
+            Transaction.objects.create(
+                date=self.day + timedelta(days=days), status=self.status, operation=subcategory.category.type,
+                category=subcategory.category, subcategory=subcategory, amount=Decimal(amount))
+
+    def test_totals_and_subtotals(self):
+        get_dictionaries()
+        with self.assertNumQueries(1):  # только сводки: ETag — по версиям из кэша
+            response = self.client.get(reverse('report'))
+        report = response.context['report']
+        self.assertEqual((report.income, report.expense, report.net, report.count),
+                         (Decimal('1000.30'), Decimal('300.10'), Decimal('700.20'), 4))
+
+        expense = report.children[self.expense.id]
+        self.assertEqual((expense.income, expense.expense), (Decimal(0), Decimal('300.10')))
+        marketing = expense.children[self.marketing.id]
+        self.assertEqual([(node.name, node.expense) for node in marketing.items],
+                         [("Avito", Decimal('300.03')), ("Farpost", Decimal('0.07'))])
+        self.assertContains(response, "Сальдо")
+
+    def test_filters_and_json(self):
+        response = self.client.get(reverse('report'), {'date_to': '2025-03-31', 'format': 'json'})
+        data = json.loads(response.content)
+        self.assertEqual((data['income'], data['expense'], data['net'], data['count']),
+                         ('1000.10', '300.10', '700.00', 3))
+        self.assertEqual([item['name'] for item in data['items']], ["Пополнение", "Списание"])
+
+        data = json.loads(self.client.get(reverse('report'), {'type': self.income.id, 'format': 'json'}).content)
+        self.assertEqual((data['income'], data['expense']), ('1000.30', '0.00'))
+
+    def test_unclassified_type_reported_separately(self):
+        other = Type.objects.create(name="Перевод")
+        self.assertEqual(other.kind, Type.UNCLASSIFIED)
+        category = Category.objects.create(name="Между счетами", type=other)
+        subcategory = Subcategory.objects.create(name="Карта", category=category)
+        Transaction.objects.create(date=self.day, status=self.status, operation=other, category=category,
+                                   subcategory=subcategory, amount=Decimal('50'))
+        response = self.client.get(reverse('report'))
+        report = response.context['report']
+        self.assertEqual((report.income, report.expense, report.unclassified, report.net, report.count),
+                         (Decimal('1000.30'), Decimal('300.10'), Decimal('50.00'), Decimal('700.20'), 5))
+        self.assertEqual(report.children[other.id].unclassified, Decimal('50.00'))
+        self.assertContains(response, "Без направления")
+
+    def test_unknown_dictionary_not_dropped(self):
+        """Строка со справочником, которого нет в дереве, попадает в итоги под заглушкой"""
+        tree = get_dictionaries()
+        rows = [{'operation_id': 999, 'category_id': 998, 'subcategory_id': 997, 'income': Decimal(0),
+                 'expense': Decimal(0), 'unclassified': Decimal('5'), 'count': 1},
+                {'operation_id': self.expense.id, 'category_id': self.marketing.id, 'subcategory_id': 996,
+                 'income': Decimal(0), 'expense': Decimal('2'), 'unclassified': Decimal(0), 'count': 1}]
+        report = reports.build_report(rows, tree)
+        self.assertEqual((report.expense, report.unclassified, report.count), (Decimal('2.00'), Decimal('5.00'), 2))
+        self.assertEqual(report.children[999].name, "Неизвестно (#999)")
+        self.assertEqual(report.children[self.expense.id].children[self.marketing.id].items[0].name,
+                         "Неизвестно (#996)")
+
+
+class CommentSearchTest(LedgerTestMixin, TestCase):
+    """Полнотекстовый поиск по комментариям: индекс, ранжирование, сочетание с фильтрами"""
+    def create(self, comment, status=None, days=0, amount='10'):
+        return self.create_transaction(amount, date=self.day + timedelta(days=days), status=status or self.status,
+                                       comment=comment)
+
+    def found(self, **params):
+        response = self.client.get(reverse('transaction_list'), params)
+        self.assertEqual(response.status_code, 200)
+        return [t.comment for t in response.context['transactions']]
+
+    def test_ranked_prefix_search(self):
+        """Поиск по началу слова без учёта регистра, самые релевантные — первыми"""
+        self.create("Реклама реклама реклама", days=0)
+        self.create("Оплата рекламы на Авито, счёт за март", days=1)
+        self.create("Аренда офиса", days=2)
+        self.assertEqual(self.found(q="РЕКЛАМ"), ["Реклама реклама реклама", "Оплата рекламы на Авито, счёт за март"])
+        self.assertEqual(self.found(q="оплата март"), ["Оплата рекламы на Авито, счёт за март"])
+        self.assertEqual(self.found(q='" OR *'), [])
+
+    def test_combined_with_filters(self):
+        self.create("Оплата рекламы", days=0)
+        self.create("Оплата рекламы", status=self.other_status, days=0)
+        self.create("Оплата рекламы", days=30)
+        self.assertEqual(len(self.found(q="реклам", status=self.status.id)), 2)
+        self.assertEqual(len(self.found(q="реклам", status=self.status.id, date_to='2025-03-31')), 1)
+        # Курсорный режим при поиске не используется
+        response = self.client.get(reverse('transaction_list'), {'q': 'реклам', 'cursor': ''})
+        self.assertFalse(response.context['cursor_pagination'])
+
+    def test_index_follows_updates_and_deletes(self):
+        """Триггеры поддерживают индекс при изменении, удалении и пачечной вставке"""
+        transaction = self.create("Старый комментарий")
+        transaction.comment = "Новый комментарий"
+        transaction.save()
+        self.assertEqual(self.found(q="старый"), [])
+        self.assertEqual(self.found(q="новый"), ["Новый комментарий"])
+        transaction.delete()
+        self.assertEqual(self.found(q="новый"), [])
+
+        bulk_create_transactions([self.new_transaction(1, comment=f"Импорт {i}") for i in range(3)])
+        self.assertEqual(len(self.found(q="импорт")), 3)
+
+    def test_report_and_export_respect_search(self):
+        self.create("Оплата рекламы", amount='100')
+        self.create("Аренда офиса", amount='7')
+        data = json.loads(self.client.get(reverse('report'), {'q': 'аренда', 'format': 'json'}).content)
+        self.assertEqual((data['expense'], data['count']), ('7.00', 1))
+        response = self.client.get(reverse('export'), {'q': 'аренда'})
+        rows = list(csv.reader(b''.join(response.streaming_content).decode('utf-8-sig').splitlines()))
+        self.assertEqual([row[-1] for row in rows[1:]], ["Аренда офиса"])
+
+    def test_admin_search(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.login(username='admin', password='password')
+        self.create("Оплата рекламы")
+        self.create("Аренда офиса")
+        response = self.client.get(reverse('admin:DDSPosts_transaction_changelist'), {'q': 'аренд'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([t.comment for t in response.context['cl'].result_list], ["Аренда офиса"])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'только для SQLite')
+class SqlitePragmaTest(TransactionTestCase):
+    """
+    PRAGMA по умолчанию и из DDS_SQLITE_PRAGMAS применяются к соединению SQLite
+    (synchronous нельзя менять внутри транзакции — поэтому TransactionTestCase)
+    """
+    def tearDown(self):
+        sqlite.apply_pragmas(connection)
+
+    def test_pragmas_applied_on_connect(self):
+        """Обработчик connection_created уже настроил текущее соединение"""
+        values = sqlite.read_pragmas(connection, ['synchronous', 'temp_store', 'busy_timeout', 'cache_size'])
+        self.assertEqual(values, {'synchronous': 1, 'temp_store': 2, 'busy_timeout': 5000, 'cache_size': -65536})
+
+    @override_settings(DDS_SQLITE_PRAGMAS={'synchronous': 'FULL', 'busy_timeout': 100})
+    def test_configurable(self):
+        """Настройка переопределяет только указанные PRAGMA, остальные — по умолчанию"""
+        sqlite.apply_pragmas(connection)
+        self.assertEqual(sqlite.read_pragmas(connection, ['synchronous', 'busy_timeout', 'temp_store']),
+                         {'synchronous': 2, 'busy_timeout': 100, 'temp_store': 2})
+
+    @override_settings(DDS_SQLITE_PRAGMAS=None)
+    def test_disabled(self):
+        self.assertEqual(sqlite.get_pragmas(), {})
+
+    def test_invalid_pragmas_rejected(self):
+        for pragmas in [{'user_version': 1}, {'synchronous': 'NORMAL; DROP TABLE x'}]:
+            with override_settings(DDS_SQLITE_PRAGMAS=pragmas):
+                with self.assertRaises(ImproperlyConfigured):
+                    sqlite.get_pragmas()
+
+    def test_status_command(self):
+        out = StringIO()
+        call_command('sqlite_status', stdout=out)
+        self.assertIn('busy_timeout', out.getvalue())
+        # Тестовая база в памяти журнал WAL не использует
+        self.assertIn('База не в режиме WAL', out.getvalue())
+
+
+class AsyncViewsTest(LedgerTestMixin, TestCase):
+    """Асинхронные представления отдают то же, что синхронные"""
+    def setUp(self):
+        super().setUp()
+        self.factory = AsyncRequestFactory()
+        Transaction.objects.bulk_create(
+            self.new_transaction(i, date=self.day + timedelta(hours=i), comment=f"Запись {i}") for i in range(30)
+        )
+
+    async def get(self, view, path, **params):
+        response = await view(self.factory.get(path, params))
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    async def test_list_view_pages(self):
+        view = AsyncTransactionListView.as_view()
+        response = await self.get(view, '/', page='2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context_data['paginator'].count, 30)
+        self.assertEqual([t.comment for t in response.context_data['transactions']],
+                         [f"Запись {i}" for i in range(4, -1, -1)])
+
+        first = await self.get(view, '/', cursor='')
+        page = first.context_data['page_obj']
+        self.assertEqual(len(page.object_list), 25)
+        second = await self.get(view, '/', cursor=page.next_token)
+        self.assertEqual(len(second.context_data['transactions']), 5)
+        self.assertContains(second, "Запись 0")
+
+        with self.assertRaises(Http404):
+            await self.get(view, '/', page='9')
+
+    async def test_ajax_and_report(self):
+        response = await self.get(async_views.load_categories, '/', type_id=str(self.type.id))
+        self.assertContains(response, "Маркетинг")
+
+        response = await self.get(async_views.load_dictionary_tree, '/')
+        self.assertEqual(json.loads(response.content)['types'][0]['name'], "Списание")
+        request = self.factory.get('/', headers={'If-None-Match': response['ETag']})
+        self.assertEqual((await async_views.load_dictionary_tree(request)).status_code, 304)
+
+        response = await self.get(async_views.transaction_report, '/', format='json')
+        expected = await sync_to_async(self.client.get)(reverse('report'), {'format': 'json'})
+        self.assertEqual(json.loads(response.content), json.loads(expected.content))
+
+class MetricsTest(LedgerTestMixin, TestCase):
+    """Метрики запросов по маршрутам и эндпоинт /metrics/"""
+    def setUp(self):
+        super().setUp()
+        metrics.registry.reset()
+        self.create_transaction(date=timezone.now())
+
+    def test_route_metrics_exported(self):
+        self.client.get(reverse('transaction_list'))
+        content = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('dds_request_duration_seconds_bucket{view="transaction_list",le="+Inf"} 1', content)
+        self.assertIn('dds_responses_total{view="transaction_list",status="200"} 1', content)
+
+        histograms = metrics.registry.histograms
+        self.assertGreater(histograms['dds_db_queries', 'transaction_list'].sum, 0)
+        self.assertGreater(histograms['dds_template_render_seconds', 'transaction_list'].sum, 0)
+        # Сам запрос к /metrics/ учитывается после выдачи ответа
+        self.assertEqual(histograms['dds_request_duration_seconds', 'metrics'].count, 1)
+
+    @override_settings(DDS_METRICS_QUERY_BUDGET=0)
+    def test_budget_warning(self):
+        with self.assertLogs('DDSPosts.metrics', 'WARNING') as logs:
+            self.client.get(reverse('transaction_list'))
+        self.assertIn('[transaction_list]', logs.output[0])
+
+    @override_settings(DDS_METRICS_TOKEN='secret')
+    def test_token_required(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        response = self.client.get(reverse('metrics'), headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+class SeedLedgerBenchmarkTest(TestCase):
+    """Команды seed_ledger и benchmark"""
+    def seed(self, **options):
+        options = {'transactions': 300, 'types': 2, 'categories': 3, 'subcategories': 4,
+                   'days': 60, 'end': '2025-03-31', 'batch_size': 100, **options}
+        call_command('seed_ledger', stdout=StringIO(), **options)
+
+    def test_seed_is_reproducible_and_skewed(self):
+        self.seed(clear=True)
+        self.assertEqual(Transaction.objects.count(), 300)
+        self.assertEqual(Subcategory.objects.count(), 2 * 3 * 4)
+        rows = list(Transaction.objects.order_by('id').values_list('date', 'amount', 'comment'))
+        self.assertTrue(all(datetime(2025, 1, 30, tzinfo=ZoneInfo('UTC')) < row[0]
+                            < datetime(2025, 4, 1, tzinfo=ZoneInfo('UTC')) for row in rows))
+        # Сводки пересчитаны по сгенерированным данным
+        self.assertEqual(DailyCashFlow.objects.aggregate(n=Sum('count'))['n'], 300)
+
+        # Самая частая подкатегория встречается заметно чаще средней
+        top = (Transaction.objects.values('subcategory').annotate(n=Count('id')).order_by('-n')[0]['n'])
+        self.assertGreater(top, 2 * 300 / 24)
+
+        self.seed(clear=True)
+        self.assertEqual(
+            [row[1:] for row in Transaction.objects.order_by('id').values_list('date', 'amount', 'comment')],
+            [row[1:] for row in rows],
+        )
+
+    def test_clear_without_collector(self):
+        """--clear удаляет таблицы по одному DELETE, не загружая строки"""
+        self.seed()
+        with CaptureQueriesContext(connection) as queries:
+            seed_ledger.Command(stdout=StringIO()).clear()
+        deletes = [q['sql'] for q in queries if q['sql'].startswith('DELETE')]
+        self.assertEqual(len(deletes), len(seed_ledger.CLEAR_ORDER))
+        self.assertFalse(any(q['sql'].startswith('SELECT') for q in queries))
+        for model in seed_ledger.CLEAR_ORDER:
+            self.assertFalse(model.objects.exists(), model.__name__)
+        self.assertEqual(search_transactions(Transaction.objects.all(), 'оплата').count(), 0)
+
+    def test_benchmark_results_and_compare(self):
+        self.seed()
+        path = os.path.join(tempfile.mkdtemp(), 'bench.json')
+        self.addCleanup(os.remove, path)
+        call_command('benchmark', repeat=1, json_path=path, stdout=StringIO())
+        with open(path, encoding='utf-8') as f:
+            run = json.load(f)
+        self.assertEqual(run['meta']['transactions'], 300)
+        self.assertIn('admin_changelist', run['results'])
+        self.assertEqual(run['results']['ajax_categories']['queries'], 0)
+        # Изменения сценариев и служебный пользователь откатываются
+        self.assertEqual(Transaction.objects.count(), 300)
+        self.assertFalse(User.objects.exists())
+
+        # Сравнение с собой — без регрессий по числу запросов
+        call_command('benchmark', repeat=1, only=['list*'], compare=path,
+                     threshold=100, stdout=StringIO())
+
+        run['results']['list']['queries'] -= 1
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(run, f)
+        with self.assertRaisesMessage(CommandError, 'list'):
+            call_command('benchmark', repeat=1, only=['list'], compare=path,
+                         threshold=100, stdout=StringIO())
+
+class QueryCountTest(TestCase):
+    """
+    Число запросов к БД на каждом маршруте DDSPosts/urls.py и в списках
+    админки: не больше границы и не растёт при увеличении объёма данных
+    """
+    # Запрос -> наибольшее допустимое число запросов к БД (кэш справочников прогрет)
+    BOUNDS = {
+        'transaction_list': 2,  # COUNT(*) и страница; ETag — по версиям из кэша
+        'transaction_list?filters': 2,
+        'transaction_list?q': 2,
+        'transaction_list?cursor': 1,  # без COUNT(*)
+        'create': 0,
+        # Строка, сводки и витрина пишутся в одной транзакции, форма открывает
+        # свою (внешние ключи проверяются при фиксации): по SAVEPOINT и RELEASE
+        'create:post': 9,  # справочники формы проверяются по кэшу
+        'create_batch': 0,
+        'create_batch:post': 7,  # один INSERT транзакций и один витрины на все строки
+        'edit': 1,
+        'edit:post': 11,
+        'delete': 1,
+        'delete:post': 9,
+        'export': 1,
+        'export?xlsx': 1,
+        'cashflow_summary': 1,
+        'report': 1,
+        'report?json': 1,
+        'ajax_load_categories': 0,
+        'ajax_load_subcategories': 0,
+        'ajax_dictionary_tree': 0,
+        'directory_panel': 4,  # число транзакций: группировка по каждому полю справочника
+        'status_add': 0,
+        'status_edit': 1,
+        'status_delete': 2,  # объект и COUNT ссылающихся транзакций
+        'type_add': 0,
+        'type_edit': 1,
+        'type_delete': 2,
+        'category_add': 1,
+        'category_edit': 2,
+        'category_delete': 2,
+        'subcategory_add': 1,
+        'subcategory_edit': 2,
+        'subcategory_delete': 2,
+        'metrics': 0,
+        'api_transactions': 1,
+        'api_transactions?filters': 1,
+        'api_transaction': 1,
+        'job_list': 1,
+        'job_detail': 1,
+        'job_detail?json': 1,
+        'admin:transaction': 8,
+        'admin:transaction?q': 8,
+        'admin:transaction?filter': 8,
+        'admin:status': 5,
+        'admin:type': 5,
+        'admin:category': 6,
+        'admin:subcategory': 6,
+    }
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='pass'))
+        self.types = 0
+        self.seed(2)
+
+    def seed(self, scale):
+        """Добавляет scale статусов и типов, по 2 категории и подкатегории на уровень и 30·scale транзакций"""
+        start, self.types = self.types, self.types + scale
+        Status.objects.bulk_create(Status(name=f"Статус {i}") for i in range(start, self.types))
+        types = Type.objects.bulk_create(Type(name=f"Тип {i}") for i in range(start, self.types))
+        categories = Category.objects.bulk_create(
+            Category(name=f"Категория {i}", type=t) for t in types for i in range(2))
+        Subcategory.objects.bulk_create(
+            Subcategory(name=f"Подкатегория {i}", category=c) for c in categories for i in range(2))
+
+        statuses = list(Status.objects.all())
+        subcategories = list(Subcategory.objects.select_related('category'))
+        bulk_create_transactions([
+            Transaction(date=datetime(2025, 3, 1, tzinfo=ZoneInfo('UTC')) + timedelta(hours=i),
+                        status=statuses[i % len(statuses)], operation_id=sc.category.type_id,
+                        category=sc.category, subcategory=sc, amount=Decimal(i + 1), comment=f"Оплата {i}")
+            for i, sc in ((i, subcategories[i % len(subcategories)]) for i in range(30 * scale))
+        ])
+        dictionaries.invalidate()
+
+    def requests(self):
+        """(запрос, метод, URL, параметры или данные формы) для каждого маршрута"""
+        last = Transaction.objects.order_by('id').last()
+        status, operation = Status.objects.first(), Type.objects.first()
+        category, subcategory = Category.objects.first(), Subcategory.objects.select_related('category').first()
+        form = {'date': '2025-03-01', 'operation': subcategory.category.type_id,
+                'category': subcategory.category_id, 'subcategory': subcategory.pk,
+                'status': status.pk, 'amount': '10', 'comment': 'Проверка'}
+        # Редактируемая запись уже в той же строке сводки, что и данные формы:
+        # иначе число запросов зависело бы от того, какую запись выбрали
+        edited = Transaction.objects.create(
+            date=datetime(2025, 3, 1, 12, tzinfo=ZoneInfo('UTC')), status=status,
+            operation_id=subcategory.category.type_id, category=subcategory.category,
+            subcategory=subcategory, amount=Decimal("1"))
+        batch = {'form-TOTAL_FORMS': 3, 'form-INITIAL_FORMS': 0, 'form-MIN_NUM_FORMS': 1,
+                 'form-MAX_NUM_FORMS': 500,
+                 **{f'form-{i}-{name}': value for i in range(2) for name, value in form.items()}}
+        filters = {'status': status.pk, 'type': operation.pk, 'category': category.pk,
+                   'date_from': '2025-03-01', 'date_to': '2025-03-31'}
+        job = jobs.enqueue('rebuild')
+        admin = 'admin:DDSPosts_%s_changelist'
+        return [
+            ('transaction_list', 'get', reverse('transaction_list'), {}),
+            ('transaction_list?filters', 'get', reverse('transaction_list'), filters),
+            ('transaction_list?q', 'get', reverse('transaction_list'), {'q': 'оплата'}),
+            ('transaction_list?cursor', 'get', reverse('transaction_list'), {'cursor': ''}),
+            ('create', 'get', reverse('create'), {}),
+            ('create:post', 'post', reverse('create'), form),
+            ('create_batch', 'get', reverse('create_batch'), {}),
+            ('create_batch:post', 'post', reverse('create_batch'), batch),
+            ('edit', 'get', reverse('edit', args=[edited.pk]), {}),
+            ('edit:post', 'post', reverse('edit', args=[edited.pk]), form),
+            ('delete', 'get', reverse('delete', args=[last.pk]), {}),
+            ('delete:post', 'post', reverse('delete', args=[last.pk]), {}),
+            ('export', 'get', reverse('export'), {}),
+            ('export?xlsx', 'get', reverse('export'), {'format': 'xlsx'}),
+            ('cashflow_summary', 'get', reverse('cashflow_summary'), {'by': 'category'}),
+            ('report', 'get', reverse('report'), {}),
+            ('report?json', 'get', reverse('report'), {'format': 'json', 'q': 'оплата'}),
+            ('ajax_load_categories', 'get', reverse('ajax_load_categories'), {'type_id': operation.pk}),
+            ('ajax_load_subcategories', 'get', reverse('ajax_load_subcategories'), {'category_id': category.pk}),
+            ('ajax_dictionary_tree', 'get', reverse('ajax_dictionary_tree'), {}),
+            ('directory_panel', 'get', reverse('directory_panel'), {}),
+            ('status_add', 'get', reverse('status_add'), {}),
+            ('status_edit', 'get', reverse('status_edit', args=[status.pk]), {}),
+            ('status_delete', 'get', reverse('status_delete', args=[status.pk]), {}),
+            ('type_add', 'get', reverse('type_add'), {}),
+            ('type_edit', 'get', reverse('type_edit', args=[operation.pk]), {}),
+            ('type_delete', 'get', reverse('type_delete', args=[operation.pk]), {}),
+            ('category_add', 'get', reverse('category_add'), {}),
+            ('category_edit', 'get', reverse('category_edit', args=[category.pk]), {}),
+            ('category_delete', 'get', reverse('category_delete', args=[category.pk]), {}),
+            ('subcategory_add', 'get', reverse('subcategory_add'), {}),
+            ('subcategory_edit', 'get', reverse('subcategory_edit', args=[subcategory.pk]), {}),
+            ('subcategory_delete', 'get', reverse('subcategory_delete', args=[subcategory.pk]), {}),
+            ('metrics', 'get', reverse('metrics'), {}),
+            ('api_transactions', 'get', reverse('api_transactions'), {}),
+            ('api_transactions?filters', 'get', reverse('api_transactions'), {**filters, 'fields': 'id,amount'}),
+            ('api_transaction', 'get', reverse('api_transaction', args=[edited.pk]), {}),
+            ('job_list', 'get', reverse('job_list'), {}),
+            ('job_detail', 'get', reverse('job_detail', args=[job.pk]), {}),
+            ('job_detail?json', 'get', reverse('job_detail', args=[job.pk]), {'format': 'json'}),
+            ('admin:transaction', 'get', reverse(admin % 'transaction'), {}),
+            ('admin:transaction?q', 'get', reverse(admin % 'transaction'), {'q': 'оплата'}),
+            ('admin:transaction?filter', 'get', reverse(admin % 'transaction'), {'category__id__exact': category.pk}),
+            ('admin:status', 'get', reverse(admin % 'status'), {}),
+            ('admin:type', 'get', reverse(admin % 'type'), {}),
+            ('admin:category', 'get', reverse(admin % 'category'), {}),
+            ('admin:subcategory', 'get', reverse(admin % 'subcategory'), {}),
+        ]
+
+    def measure(self):
+        """Число запросов к БД для каждого маршрута"""
+        get_dictionaries()
+        counts = {}
+        for name, method, url, data in self.requests():
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(self.client, method)(url, data)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            self.assertLess(response.status_code, 400, name)
+            counts[name] = len(queries)
+        return counts
+
+    def test_routes_within_bounds(self):
+        counts = self.measure()
+        self.assertEqual(set(counts), set(self.BOUNDS))
+        for name, count in counts.items():
+            with self.subTest(name):
+                self.assertLessEqual(count, self.BOUNDS[name])
+
+    def test_constant_as_seed_grows(self):
+        small = self.measure()
+        self.seed(20)
+        self.assertEqual(self.measure(), small)
+
+class FragmentCacheTest(LedgerTestMixin, TestCase):
+    """Кэш отрисованной таблицы главной страницы"""
+    def setUp(self):
+        super().setUp()
+        metrics.registry.reset()
+        self.add("Первая")
+
+    def add(self, comment):
+        return self.create_transaction(date=timezone.now(), comment=comment)
+
+    def counter(self, result):
+        return metrics.registry.value('dds_fragment_cache_total', result=result)
+
+    def test_hit_until_ledger_changes(self):
+        first = self.client.get(reverse('transaction_list'))
+        with self.assertNumQueries(0):  # версии журнала и справочников — из кэша
+            second = self.client.get(reverse('transaction_list'))
+        self.assertEqual(first.content, second.content)
+        self.assertEqual((self.counter('miss'), self.counter('hit')), (1, 1))
+
+        # Другие фильтры и страницы — другие записи кэша
+        response = self.client.get(reverse('transaction_list'), {'status': self.status.id})
+        self.assertContains(response, "Первая")
+        self.assertEqual(self.counter('miss'), 2)
+
+        # Сохранение транзакции и переименование справочника делают таблицу устаревшей
+        self.add("Вторая")
+        self.assertContains(self.client.get(reverse('transaction_list')), "Вторая")
+        self.category.name = "Реклама"
+        self.category.save()
+        self.assertContains(self.client.get(reverse('transaction_list')), "Реклама")
+        self.assertEqual(self.counter('miss'), 4)
+
+        content = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('dds_fragment_cache_total{result="hit"} 1', content)
+
+    def test_bulk_write_invalidates(self):
+        # Пакетная запись и перенос минуют сигналы модели, но увеличивают версию журнала
+        self.client.get(reverse('transaction_list'))
+        bulk_create_transactions([self.new_transaction(date=timezone.now(), comment="Пачка")])
+        self.assertContains(self.client.get(reverse('transaction_list')), "Пачка")
+        other = Subcategory.objects.create(name="Farpost", category=self.category)
+        reassign_transactions(self.subcategory, other)
+        self.assertContains(self.client.get(reverse('transaction_list')), "Farpost")
+        self.assertEqual(self.counter('miss'), 3)
+
+    @override_settings(DDS_FRAGMENT_STALE_SECONDS=60)
+    def test_stale_while_revalidate(self):
+        self.client.get(reverse('transaction_list'))
+        self.add("Вторая")
+        # Устаревшая таблица отдаётся сразу, перерисовка — после ответа
+        # (тестовый клиент закрывает ответ внутри get())
+        response = self.client.get(reverse('transaction_list'))
+        self.assertNotContains(response, "Вторая")
+        self.assertIn('no-store', response['Cache-Control'])
+        self.assertEqual(self.counter('stale'), 1)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('transaction_list'))
+        self.assertContains(response, "Вторая")
+        self.assertEqual(self.counter('hit'), 1)
+
+    @override_settings(DDS_FRAGMENT_CACHE=None)
+    def test_disabled(self):
+        self.client.get(reverse('transaction_list'))
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('transaction_list'))
+        self.assertEqual(response.context['paginator'].count, 1)
+        self.assertEqual(self.counter('hit') + self.counter('miss'), 0)
+
+
+class ConditionalGetTest(LedgerTestMixin, TestCase):
+    """ETag и Last-Modified списка, выгрузки и отчёта"""
+    def setUp(self):
+        super().setUp()
+        self.transaction = self.add(self.status)
+
+    def add(self, status):
+        return self.create_transaction(date=timezone.now(), status=status)
+
+    def etag(self, name='transaction_list', **params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def test_not_modified_without_rendering(self):
+        response = self.client.get(reverse('transaction_list'))
+        self.assertTrue(response.has_header('Last-Modified'))
+        with self.assertNumQueries(0):  # версии журнала и справочников — из кэша
+            response = self.client.get(reverse('transaction_list'), headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        for name, params in [('export', {}), ('export', {'format': 'xlsx'}), ('report', {'format': 'json'})]:
+            with self.subTest(name, **params):
+                response = self.client.get(reverse(name), params)
+                response = self.client.get(reverse(name), params, headers={
+                    'If-Modified-Since': response['Last-Modified']})
+                self.assertEqual(response.status_code, 304)
+
+    def test_validator_tracks_changes(self):
+        etags = {self.etag()}
+        filtered = self.etag(status=self.status.id)
+
+        # Версия журнала общая: меняется ETag и других фильтров
+        other = self.add(self.other_status)
+        self.assertNotEqual(self.etag(status=self.status.id), filtered)
+        etags.add(self.etag())
+
+        self.transaction.amount = Decimal("20")
+        self.transaction.save()
+        etags.add(self.etag())
+        other.delete()
+        etags.add(self.etag())
+        bulk_create_transactions([self.new_transaction(5, date=timezone.now())])
+        etags.add(self.etag())
+        self.category.name = "Реклама"
+        self.category.save()  # версия справочников
+        etags.add(self.etag())
+        self.assertEqual(len(etags), 6)
+
+    async def test_async_views(self):
+        factory = AsyncRequestFactory()
+        view = AsyncTransactionListView.as_view()
+        response = await view(factory.get('/'))
+        response.render()
+        response = await view(factory.get('/', headers={'If-None-Match': response['ETag']}))
+        self.assertEqual(response.status_code, 304)
+
+        expected = await sync_to_async(self.etag)('report')
+        response = await async_views.transaction_report(factory.get('/'))
+        self.assertEqual(response['ETag'], expected)
+
+
+class TransactionListingTest(LedgerTestMixin, TestCase):
+    """Витрина списка поддерживается при записи, и список с выгрузкой читаются из неё"""
+    def create(self, amount, **kwargs):
+        return self.create_transaction(amount, **{'comment': "оплата", **kwargs})
+
+    def snapshot(self):
+        return list(TransactionListing.objects.order_by('id').values_list(
+            'id', 'date', 'status_name', 'operation_name', 'category_id', 'category_name',
+            'subcategory_name', 'amount', 'comment'))
+
+    def assertMatchesRebuild(self):
+        """Поддерживаемая на записи витрина совпадает с полным пересчётом"""
+        incremental = self.snapshot()
+        listing.rebuild()
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_maintained_on_write(self):
+        first = self.create('100')
+        second = self.create('50')
+        self.assertEqual(self.snapshot()[0][2:], ("Бизнес", "Списание", self.category.id, "Маркетинг",
+                                                  "Avito", Decimal('100.00'), "оплата"))
+
+        first.category = self.other_category
+        first.subcategory = self.other_subcategory
+        first.amount = Decimal('70')
+        first.save()
+        self.assertEqual(TransactionListing.objects.get(pk=first.pk).category_name, "Аренда")
+        second.delete()
+        self.assertFalse(TransactionListing.objects.filter(pk=second.pk).exists())
+
+        bulk_create_transactions([self.new_transaction(i) for i in range(5)])
+        self.assertEqual(TransactionListing.objects.count(), 6)
+        self.assertMatchesRebuild()
+
+    def test_failed_sync_rolls_back_write(self):
+        """Ошибка записи в витрину откатывает и саму запись"""
+        first = self.create('100')
+
+        def fail(*args, **kwargs):
+            raise RuntimeError('витрина')
+
+        saved = listing.sync_transactions, listing.remove_transactions, listing.rename
+        listing.sync_transactions = listing.remove_transactions = listing.rename = fail
+        try:
+            with self.assertRaises(RuntimeError):
+                self.create('50')
+            first.amount = Decimal('70')
+            with self.assertRaises(RuntimeError):
+                first.save()
+            with self.assertRaises(RuntimeError):
+                first.delete()
+            self.category.name = "Реклама"
+            with self.assertRaises(RuntimeError):
+                self.category.save()
+        finally:
+            listing.sync_transactions, listing.remove_transactions, listing.rename = saved
+        self.assertEqual(list(Transaction.objects.values_list('amount', flat=True)), [Decimal('100')])
+        self.assertTrue(Category.objects.filter(name="Маркетинг").exists())
+        self.assertMatchesRebuild()
+
+    def test_rename_updates_rows_in_one_query(self):
+        for i in range(5):
+            self.create(i)
+        self.create('1', category=self.other_category, subcategory=self.other_subcategory)
+        with CaptureQueriesContext(connection) as ctx:
+            self.category.name = "Реклама"
+            self.category.save()
+        listing_queries = [q for q in ctx.captured_queries if 'transactionlisting' in q['sql'].lower()]
+        self.assertEqual(len(listing_queries), 1)
+        self.assertEqual(TransactionListing.objects.filter(category_name="Реклама").count(), 5)
+        self.assertEqual(TransactionListing.objects.filter(category_name="Аренда").count(), 1)
+        self.assertMatchesRebuild()
+
+    def test_rebuild_command(self):
+        self.create('10')
+        TransactionListing.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_listing', stdout=out)
+        self.assertIn('Строк витрины: 1', out.getvalue())
+        self.assertEqual(TransactionListing.objects.count(), 1)
+
+    def test_list_and_export_read_listing(self):
+        for i in range(30):
+            self.create(i, date=self.day - timedelta(days=i),
+                        **({'category': self.other_category, 'subcategory': self.other_subcategory} if i % 3 else {}))
+        expected = {}
+        for params in [{}, {'category': self.other_category.id}, {'page': 2}]:
+            response = self.client.get(reverse('transaction_list'), params)
+            expected[str(params)] = response.context['transaction_table']
+        export = b''.join(self.client.get(reverse('export')).streaming_content)
+        fragments.get_cache().clear()
+
+        with override_settings(DDS_LISTING_READ_MODEL=True):
+            for params in [{}, {'category': self.other_category.id}, {'page': 2}]:
+                with CaptureQueriesContext(connection) as ctx:
+                    response = self.client.get(reverse('transaction_list'), params)
+                self.assertEqual(response.context['transaction_table'], expected[str(params)])
+                # COUNT(*) пагинатора и страница — оба по витрине, без JOIN
+                queries = [q['sql'] for q in ctx.captured_queries if 'DDSPosts_transaction"' in q['sql']
+                           or 'transactionlisting' in q['sql'].lower()]
+                self.assertEqual(len(queries), 2)
+                for sql in queries:
+                    self.assertIn('transactionlisting', sql.lower())
+                    self.assertNotIn('JOIN', sql)
+            self.assertEqual(b''.join(self.client.get(reverse('export')).streaming_content), export)
+
+            # Поиск по комментарию идёт по таблице транзакций
+            response = self.client.get(reverse('transaction_list'), {'q': 'оплата'})
+            self.assertIsInstance(response.context['transactions'][0], Transaction)
+
+
+class BatchCreateTest(LedgerTestMixin, TestCase):
+    """Пакетный ввод: все строки одной вставкой или ни одной, ошибки по строкам"""
+    def row(self, **kwargs):
+        return {'date': '2025-03-01', 'status': self.status.id, 'operation': self.type.id,
+                'category': self.category.id, 'subcategory': self.subcategory.id,
+                'amount': '10', 'comment': '', **kwargs}
+
+    def formset_data(self, rows, extra=2):
+        data = {'form-TOTAL_FORMS': len(rows) + extra, 'form-INITIAL_FORMS': 0,
+                'form-MIN_NUM_FORMS': 1, 'form-MAX_NUM_FORMS': 500}
+        for index, row in enumerate(rows):
+            data.update({f'form-{index}-{name}': value for name, value in row.items()})
+        return data
+
+    def post_json(self, rows):
+        return self.client.post(reverse('create_batch'), json.dumps(rows), content_type='application/json')
+
+    def test_page(self):
+        response = self.client.get(reverse('create_batch'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'name="form-4-amount"')
+        self.assertContains(response, 'form-__prefix__-amount')
+
+    def test_formset_creates_rows_skipping_empty(self):
+        rows = [self.row(amount=str(i), comment=f'строка {i}') for i in range(1, 4)]
+        response = self.client.post(reverse('create_batch'), self.formset_data(rows))
+        self.assertRedirects(response, reverse('transaction_list'))
+        self.assertEqual(sorted(Transaction.objects.values_list('amount', flat=True)),
+                         [Decimal(1), Decimal(2), Decimal(3)])
+        self.assertEqual(DailyCashFlow.objects.get().count, 3)
+        self.assertEqual(TransactionListing.objects.count(), 3)
+
+    def test_formset_errors_per_row(self):
+        rows = [self.row(), self.row(subcategory=self.other_subcategory.id), self.row(amount='')]
+        response = self.client.post(reverse('create_batch'), self.formset_data(rows))
+        self.assertEqual(response.status_code, 200)
+        errors = response.context['formset'].errors
+        self.assertEqual(errors[0], {})
+        self.assertEqual(list(errors[1]), ['subcategory'])
+        self.assertEqual(list(errors[2]), ['amount'])
+        self.assertFalse(Transaction.objects.exists())
+
+        response = self.client.post(reverse('create_batch'), self.formset_data([]))
+        self.assertTrue(response.context['formset'].non_form_errors())
+
+    def test_json_one_insert(self):
+        get_dictionaries()
+        rows = [self.row(amount=str(i)) for i in range(1, 31)]
+        self.post_json(rows[:1])  # строка сводки уже есть — дальше только её обновление
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.post_json(rows)
+        self.assertEqual(response.status_code, 201)
+        created = json.loads(response.content)['created']
+        self.assertEqual(len(created), 30)
+        self.assertEqual(Transaction.objects.count(), 31)
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "DDSPosts_transaction"')]
+        self.assertEqual(len(inserts), 1)
+
+        # Число запросов не зависит от числа строк
+        with CaptureQueriesContext(connection) as small:
+            self.post_json(rows[:3])
+        self.assertEqual(len(small), len(ctx))
+
+    def test_json_errors(self):
+        response = self.post_json([self.row(), self.row(status=999), 'строка'])
+        self.assertEqual(response.status_code, 400)
+        errors = json.loads(response.content)['errors']
+        self.assertEqual([error['row'] for error in errors], [1, 2])
+        self.assertEqual(list(errors[0]['errors']), ['status'])
+        self.assertFalse(Transaction.objects.exists())
+
+        for body in ['{', '{}', '[]']:
+            response = self.client.post(reverse('create_batch'), body, content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('error', json.loads(response.content))
+        with override_settings(DDS_BATCH_MAX_ROWS=2):
+            self.assertEqual(self.post_json([self.row()] * 3).status_code, 400)
+
+
+class ApiTest(LedgerTestMixin, TestCase):
+    """JSON API транзакций: фильтры, курсор, поля, запись и постоянное число запросов"""
+    def setUp(self):
+        super().setUp()
+        bulk_create_transactions([
+            self.new_transaction(i + 1, date=self.day - timedelta(days=i), comment=f"оплата {i}",
+                                 category=self.category if i % 2 else self.other_category,
+                                 subcategory=self.subcategory if i % 2 else self.other_subcategory)
+            for i in range(12)
+        ])
+        get_dictionaries()
+
+    def row(self, **kwargs):
+        return {'date': '2025-04-01', 'status': self.status.id, 'operation': self.type.id,
+                'category': self.category.id, 'subcategory': self.subcategory.id,
+                'amount': '15.50', 'comment': 'API', **kwargs}
+
+    def get(self, url, params=None):
+        response = self.client.get(url, params or {})
+        return response.status_code, json.loads(response.content)
+
+    def send(self, method, url, data, params=''):
+        response = getattr(self.client, method)(url + params, json.dumps(data), content_type='application/json')
+        return response.status_code, json.loads(response.content) if response.content else None
+
+    def test_list_filters_cursor_and_fields(self):
+        url = reverse('api_transactions')
+        status, data = self.get(url, {'limit': 5})
+        self.assertEqual(status, 200)
+        first = data['results'][0]
+        self.assertEqual(set(first), {
+            'id', 'date', 'operation', 'operation_name', 'category', 'category_name', 'subcategory',
+            'subcategory_name', 'status', 'status_name', 'amount', 'comment', 'updated_at'})
+        self.assertEqual(first['date'], '2025-03-10T12:00:00Z')
+        self.assertEqual(first['amount'], '1.00')
+        self.assertEqual(first['category_name'], "Аренда")
+
+        # Курсор проходит весь список без повторов
+        ids = [row['id'] for row in data['results']]
+        while data['next']:
+            status, data = self.get(url, {'limit': 5, 'cursor': data['next']})
+            ids += [row['id'] for row in data['results']]
+        self.assertEqual(ids, list(Transaction.objects.values_list('id', flat=True)))
+
+        status, data = self.get(url, {'category': self.category.id, 'fields': 'id,amount'})
+        self.assertEqual(len(data['results']), 6)
+        self.assertEqual(set(data['results'][0]), {'id', 'amount'})
+
+        self.assertEqual(self.get(url, {'fields': 'id,secret'})[0], 400)
+        self.assertEqual(self.get(url, {'cursor': 'bad'})[0], 400)
+
+    def test_sparse_fields_skip_joins(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.get(reverse('api_transactions'), {'fields': 'id,amount,category'})
+        self.assertEqual(len(ctx), 1)
+        self.assertNotIn('JOIN', ctx.captured_queries[0]['sql'])
+        self.assertIn('JOIN', Transaction.objects.values('category__name').query.__str__())
+
+    def test_constant_queries(self):
+        url = reverse('api_transactions')
+        with CaptureQueriesContext(connection) as small:
+            self.get(url, {'limit': 2})
+        with CaptureQueriesContext(connection) as large:
+            self.get(url, {'limit': 12})
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(len(large), 1)
+
+        pk = Transaction.objects.first().pk
+        with self.assertNumQueries(1):
+            status, data = self.get(reverse('api_transaction', args=[pk]), {'fields': 'id,category_name'})
+        self.assertEqual(data, {'id': pk, 'category_name': "Аренда"})
+        self.assertEqual(self.get(reverse('api_transaction', args=[0]))[0], 404)
+
+    def test_create_update_delete(self):
+        status, data = self.send('post', reverse('api_transactions'), self.row())
+        self.assertEqual(status, 201)
+        self.assertEqual((data['amount'], data['subcategory_name']), ('15.50', "Avito"))
+        url = reverse('api_transaction', args=[data['id']])
+
+        status, data = self.send('patch', url, {'amount': '20'}, '?fields=id,amount,comment')
+        self.assertEqual((status, data['amount'], data['comment']), (200, '20.00', 'API'))
+        status, data = self.send('put', url, self.row(category=self.other_category.id,
+                                                      subcategory=self.other_subcategory.id))
+        self.assertEqual((status, data['category_name']), (200, "Аренда"))
+        self.assertEqual(DailyCashFlow.objects.filter(day='2025-04-01').get().category_id, self.other_category.id)
+
+        status, data = self.send('patch', url, {'subcategory': self.subcategory.id})
+        self.assertEqual(status, 400)
+        self.assertEqual(list(data['errors']), ['subcategory'])
+
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Transaction.objects.filter(date__date='2025-04-01').exists())
+        self.assertEqual(self.client.delete(url).status_code, 404)
+        self.assertEqual(self.client.post(url).status_code, 405)
+
+    def test_bulk_create(self):
+        url = reverse('api_transactions_bulk')
+        status, data = self.send('post', url, [self.row(amount=str(i)) for i in range(1, 21)], '?fields=id')
+        self.assertEqual(status, 201)
+        self.assertEqual(len(data['results']), 20)
+        self.assertEqual(Transaction.objects.filter(pk__in=[row['id'] for row in data['results']]).count(), 20)
+
+        status, data = self.send('post', url, [self.row(), self.row(status=999)])
+        self.assertEqual(status, 400)
+        self.assertEqual(data['errors'][0]['row'], 1)
+        self.assertEqual(self.send('post', url, {})[0], 400)
+
+    def test_invalid_fields_write_nothing(self):
+        """Ошибка в ?fields= — 400 без записи"""
+        count = Transaction.objects.count()
+        status, data = self.send('post', reverse('api_transactions'), self.row(comment='bogus'), '?fields=bogus')
+        self.assertEqual(status, 400)
+        self.assertFalse(Transaction.objects.filter(comment='bogus').exists())
+        self.assertEqual(Transaction.objects.count(), count)
+
+        obj = Transaction.objects.first()
+        url = reverse('api_transaction', args=[obj.pk])
+        self.assertEqual(self.send('put', url, self.row(comment='bogus'), '?fields=bogus')[0], 400)
+        self.assertEqual(self.send('patch', url, {'comment': 'bogus'}, '?fields=bogus')[0], 400)
+        obj.refresh_from_db()
+        self.assertNotEqual(obj.comment, 'bogus')
+
+    def test_token(self):
+        with override_settings(DDS_API_TOKEN='secret'):
+            self.assertEqual(self.client.get(reverse('api_transactions')).status_code, 403)
+            response = self.client.get(reverse('api_transactions'), headers={'Authorization': 'Bearer secret'})
+            self.assertEqual(response.status_code, 200)
+
+    def test_csrf_without_token(self):
+        """Без токена запись с чужого сайта отклоняется, как у HTML-форм"""
+        client = Client(enforce_csrf_checks=True)
+        url = reverse('api_transactions')
+        with self.assertLogs('django.security.csrf', 'WARNING'):
+            response = client.post(url, json.dumps(self.row()), content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(client.get(url).status_code, 200)
+
+        # С CSRF-токеном из cookie — как запрос со страницы приложения
+        client.cookies['csrftoken'] = 'a' * 32
+        response = client.post(url, json.dumps(self.row()), content_type='application/json',
+                               headers={'X-CSRFToken': 'a' * 32})
+        self.assertEqual(response.status_code, 201)
+
+        # С токеном API проверка CSRF не нужна
+        with override_settings(DDS_API_TOKEN='secret'):
+            response = client.post(url, json.dumps(self.row()), content_type='application/json',
+                                   headers={'Authorization': 'Bearer secret'})
+            self.assertEqual(response.status_code, 201)
+
+    def test_body_must_be_json(self):
+        url = reverse('api_transactions')
+        response = self.client.post(url, self.row())
+        self.assertEqual(response.status_code, 415)
+        response = self.client.post(url, json.dumps(self.row()), content_type='text/plain')
+        self.assertEqual(response.status_code, 415)
+        response = self.client.post(url, json.dumps(self.row()), content_type='application/json; charset=utf-8')
+        self.assertEqual(response.status_code, 201)
+        item = reverse('api_transaction', args=[Transaction.objects.first().pk])
+        self.assertEqual(self.client.patch(item, 'amount=1', content_type='application/x-www-form-urlencoded')
+                         .status_code, 415)
+        self.assertEqual(Transaction.objects.count(), 13)
+
+    def test_json_fallback_matches_orjson(self):
+        """Без orjson ответ тот же"""
+        if api.orjson is None:
+            self.skipTest('orjson не установлен')
+        expected = self.client.get(reverse('api_transactions')).content
+        orjson, api.orjson = api.orjson, None
+        try:
+            fallback = self.client.get(reverse('api_transactions')).content
+        finally:
+            api.orjson = orjson
+        self.assertEqual(json.loads(fallback), json.loads(expected))
+
+
+class JobTest(LedgerTestMixin, TestCase):
+    """Очередь фоновых задач: постановка, захват, повторы, выполнение обработчиком и страницы"""
+    def setUp(self):
+        super().setUp()
+        self.result_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.result_dir.cleanup)
+        overridden = override_settings(DDS_JOB_RESULT_DIR=self.result_dir.name, DDS_JOB_RETRY_DELAY=0)
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+
+        bulk_create_transactions([
+            self.new_transaction(i + 1, date=self.day - timedelta(days=i), comment=f"оплата {i}") for i in range(5)
+        ])
+
+        self.calls = []
+
+        @jobs.task('flaky')
+        def flaky(job):
+            self.calls.append(job.attempts)
+            if job.attempts < job.params['succeed_on']:
+                raise RuntimeError('сбой')
+            return {'attempt': job.attempts}
+        self.addCleanup(jobs.TASKS.pop, 'flaky')
+
+    def work(self):
+        call_command('run_workers', '--burst', stdout=StringIO())
+
+    def test_export_job_writes_file(self):
+        job = jobs.enqueue('export', filters={'date_from': '2025-03-08'}, format='csv')
+        self.assertEqual(job.status, Job.QUEUED)
+        self.work()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(job.result['rows'], 3)
+        self.assertEqual((job.progress, job.total, job.percent), (3, 3, 100))
+
+        response = self.client.get(reverse('job_download', args=[job.pk]))
+        self.assertEqual(response.status_code, 200)
+        rows = list(csv.reader(b''.join(response.streaming_content).decode('utf-8-sig').splitlines()))
+        self.assertEqual(len(rows), 4)
+
+    def test_retry_then_success(self):
+        job = jobs.enqueue('flaky', succeed_on=2)
+        with self.assertLogs('DDSPosts.jobs', 'WARNING'):
+            self.work()
+        job.refresh_from_db()
+        self.assertEqual(self.calls, [1, 2])
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(job.result, {'attempt': 2})
+        self.assertEqual(job.error, '')
+
+    def test_retries_exhausted(self):
+        job = jobs.enqueue('flaky', max_attempts=2, succeed_on=5)
+        with self.assertLogs('DDSPosts.jobs', 'WARNING') as logs:
+            self.work()
+        self.assertEqual(len(logs.records), 2)
+        job.refresh_from_db()
+        self.assertEqual(self.calls, [1, 2])
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIn('RuntimeError', job.error)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_retry_waits_for_delay(self):
+        job = jobs.enqueue('flaky', succeed_on=2)
+        with override_settings(DDS_JOB_RETRY_DELAY=60), self.assertLogs('DDSPosts.jobs', 'WARNING'):
+            jobs.run(jobs.claim('test'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertIsNone(jobs.claim('test'))
+
+    def test_claim_is_exclusive(self):
+        job = jobs.enqueue('rebuild')
+        claimed = jobs.claim('first')
+        self.assertEqual((claimed.pk, claimed.status, claimed.worker, claimed.attempts),
+                         (job.pk, Job.RUNNING, 'first', 1))
+        self.assertIsNone(jobs.claim('second'))
+
+    def test_stale_job_requeued(self):
+        job = jobs.enqueue('rebuild')
+        jobs.claim('lost')
+        Job.objects.filter(pk=job.pk).update(heartbeat=timezone.now() - timedelta(hours=2))
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertEqual(jobs.claim('other').pk, job.pk)
+
+    def test_unknown_task_rejected(self):
+        with self.assertRaises(ValueError):
+            jobs.enqueue('missing')
+        self.assertEqual(self.client.post(reverse('job_enqueue', args=['missing'])).status_code, 404)
+
+    def test_enqueue_views(self):
+        response = self.client.post(reverse('job_enqueue', args=['export']) + '?format=xlsx&status=%d' % self.status.pk)
+        job = Job.objects.get()
+        self.assertRedirects(response, reverse('job_detail', args=[job.pk]))
+        self.assertEqual(job.params, {'filters': {'status': str(self.status.pk)}, 'format': 'xlsx'})
+
+        response = self.client.post(reverse('job_enqueue', args=['rebuild']), HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 202)
+        data = json.loads(response.content)
+        self.assertEqual((data['kind'], data['status'], data['finished']), ('rebuild', Job.QUEUED, False))
+        self.assertEqual(response['Location'], reverse('job_detail', args=[data['id']]))
+
+        self.assertEqual(self.client.get(reverse('job_enqueue', args=['rebuild'])).status_code, 405)
+
+    def test_import_job(self):
+        upload = BytesIO("date,status,type,category,subcategory,amount,comment\n"
+                         "2025-04-01,Бизнес,Списание,Маркетинг,Avito,10.50,из файла\n".encode())
+        upload.name = 'import.csv'
+        self.client.post(reverse('job_enqueue', args=['import']), {'file': upload})
+        job = Job.objects.get()
+        self.assertTrue((jobs.result_dir() / job.params['file']).exists())
+        self.work()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE, job.error)
+        self.assertTrue(Transaction.objects.filter(comment="из файла", amount=Decimal("10.50")).exists())
+        self.assertFalse((jobs.result_dir() / job.params['file']).exists())
+
+    def test_import_retry_resumes_without_duplicates(self):
+        # Некорректный UTF-8 после нескольких пачек: файл декодируется
+        # блоками, поэтому ошибка возникает в середине импорта
+        lines = ''.join(f"2025-04-01,Бизнес,Списание,Маркетинг,Avito,{i}.00,{'строка ' * 20}{i}\n"
+                        for i in range(1, 201))
+        name = 'import-broken.csv'
+        (jobs.result_dir() / name).write_bytes(
+            ("date,status,type,category,subcategory,amount,comment\n" + lines).encode() + b'\xff\xfe\n')
+        job = jobs.enqueue('import', max_attempts=2, file=name, batch_size=10)
+        with self.assertLogs('DDSPosts.jobs', 'WARNING'):
+            jobs.run(jobs.claim('test'))
+        job.refresh_from_db()
+        imported = Transaction.objects.filter(comment__startswith='строка').count()
+        self.assertEqual((job.status, job.progress), (Job.QUEUED, imported))
+        self.assertGreater(imported, 0)
+
+        with self.assertLogs('DDSPosts.jobs', 'WARNING'):
+            jobs.run(jobs.claim('test'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIn('UnicodeDecodeError', job.error)
+        self.assertEqual(Transaction.objects.filter(comment__startswith='строка').count(), imported)
+        self.assertEqual(Transaction.objects.filter(comment__startswith='строка').values('amount').distinct().count(),
+                         imported)
+
+    def test_import_skip(self):
+        path = jobs.result_dir() / 'import-skip.csv'
+        path.write_text("date,status,type,category,subcategory,amount,comment\n" + ''.join(
+            f"2025-04-01,Бизнес,Списание,Маркетинг,Avito,{i}.00,пропуск {i}\n" for i in range(1, 6)))
+        out = StringIO()
+        call_command('import_transactions', str(path), '--skip', '3', stdout=out)
+        self.assertEqual(set(Transaction.objects.filter(comment__startswith='пропуск').values_list('comment', flat=True)),
+                         {'пропуск 4', 'пропуск 5'})
+        self.assertIn('пропущено: 3', out.getvalue())
+
+    def test_detail_json(self):
+        job = jobs.enqueue('rebuild')
+        self.work()
+        data = json.loads(self.client.get(reverse('job_detail', args=[job.pk]), {'format': 'json'}).content)
+        self.assertEqual((data['status'], data['finished'], data['percent']), (Job.DONE, True, 100))
+        self.assertEqual(data['result'], {'rollups': DailyCashFlow.objects.count(), 'listing': 5})
+        self.assertIsNone(data['download_url'])
+        self.assertContains(self.client.get(reverse('job_detail', args=[job.pk])), 'Задача #%d' % job.pk)
+        self.assertContains(self.client.get(reverse('job_list')), reverse('job_detail', args=[job.pk]))
+
+    def test_thread_workers(self):
+        for i in range(4):
+            jobs.enqueue('flaky', succeed_on=1)
+        call_command('run_workers', '--burst', '--workers', '1', '--max-jobs', '3', stdout=StringIO())
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 3)
+
+
+class DictionaryDeleteTest(LedgerTestMixin, TestCase):
+    """Удаление справочников: проверка ссылок одним COUNT и перенос транзакций одним UPDATE"""
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other_type = Type.objects.create(name="Пополнение")
+        cls.income_category = Category.objects.create(name="Продажи", type=cls.other_type)
+        cls.income_subcategory = Subcategory.objects.create(name="Сайт", category=cls.income_category)
+
+    def setUp(self):
+        super().setUp()
+        bulk_create_transactions([
+            self.new_transaction(i + 1, date=self.day - timedelta(days=i % 3), comment=f"оплата {i}",
+                                 category=self.category if i % 2 else self.other_category,
+                                 subcategory=self.subcategory if i % 2 else self.other_subcategory)
+            for i in range(10)
+        ])
+
+    def assertRollupsConsistent(self):
+        """Сводки и витрина совпадают с пересчётом по таблице транзакций"""
+        fields = ['day', 'status_id', 'operation_id', 'category_id', 'subcategory_id', 'total', 'count']
+        maintained = sorted(DailyCashFlow.objects.values_list(*fields))
+        rollups.rebuild()
+        self.assertEqual(maintained, sorted(DailyCashFlow.objects.values_list(*fields)))
+        names = [f'{name}_name' for name in ('status', 'operation', 'category', 'subcategory')]
+        self.assertEqual(
+            sorted(TransactionListing.objects.values_list('id', 'category_id', 'subcategory_id', *names)),
+            sorted((t.id, t.category_id, t.subcategory_id, t.status.name, t.operation.name,
+                    t.category.name, t.subcategory.name) for t in Transaction.objects.all()),
+        )
+
+    def test_usage_shown_on_confirm_and_panel(self):
+        response = self.client.get(reverse('category_delete', args=[self.category.pk]))
+        self.assertEqual(response.context['usage'], 5)
+        self.assertContains(response, "Перенести и удалить")
+        # Варианты переноса — подкатегории вне удаляемой категории
+        choices = dict(response.context['form'].fields['target'].choices)
+        self.assertNotIn(self.subcategory.pk, choices)
+        self.assertEqual(choices[self.other_subcategory.pk], "Списание / Аренда / Офис")
+
+        response = self.client.get(reverse('status_delete', args=[self.other_status.pk]))
+        self.assertEqual(response.context['usage'], 0)
+        self.assertContains(response, ">Удалить</button>")
+
+        panel = self.client.get(reverse('directory_panel'))
+        self.assertIn((self.status, 10), panel.context['statuses'])
+        self.assertIn((self.other_status, 0), panel.context['statuses'])
+        self.assertIn((self.type, 10), panel.context['types'])
+        self.assertIn((self.subcategory, 5), panel.context['subcategories'])
+
+    def test_panel_counts_match_confirm_page(self):
+        """Панель и страница удаления считают по одной таблице, даже если сводки устарели"""
+        DailyCashFlow.objects.all().delete()
+        panel = self.client.get(reverse('directory_panel'))
+        self.assertIn((self.category, 5), panel.context['categories'])
+        response = self.client.get(reverse('category_delete', args=[self.category.pk]))
+        self.assertEqual(response.context['usage'], 5)
+
+    def test_used_entry_requires_target(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('type_delete', args=[self.type.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(response.context['form'], 'target',
+                             'Справочник используется в транзакциях (10): выберите, куда их перенести.')
+        self.assertTrue(Type.objects.filter(pk=self.type.pk).exists())
+        # Транзакции в память не загружаются: объект и один COUNT
+        self.assertEqual(len(queries), 2)
+
+    def test_unused_entry_deleted(self):
+        response = self.client.post(reverse('status_delete', args=[self.other_status.pk]))
+        self.assertRedirects(response, reverse('directory_panel'))
+        self.assertFalse(Status.objects.filter(pk=self.other_status.pk).exists())
+
+    def test_reassign_status_then_delete(self):
+        self.client.get(reverse('directory_panel'))
+        response = self.client.post(reverse('status_delete', args=[self.status.pk]), {'target': self.other_status.pk})
+        self.assertRedirects(response, reverse('directory_panel'))
+        self.assertFalse(Status.objects.filter(pk=self.status.pk).exists())
+        self.assertEqual(Transaction.objects.filter(status=self.other_status).count(), 10)
+        self.assertRollupsConsistent()
+        panel = self.client.get(reverse('directory_panel'))
+        self.assertIn((self.other_status, 10), panel.context['statuses'])
+
+    def test_reassign_category_then_delete(self):
+        before = Transaction.objects.filter(category=self.category).values_list('updated_at', flat=True).first()
+        response = self.client.post(reverse('category_delete', args=[self.category.pk]),
+                                    {'target': self.other_subcategory.pk})
+        self.assertRedirects(response, reverse('directory_panel'))
+        self.assertFalse(Category.objects.filter(pk=self.category.pk).exists())
+        self.assertFalse(Subcategory.objects.filter(pk=self.subcategory.pk).exists())
+        self.assertEqual(Transaction.objects.filter(subcategory=self.other_subcategory).count(), 10)
+        self.assertGreater(Transaction.objects.values_list('updated_at', flat=True).order_by('-updated_at')[0], before)
+        self.assertRollupsConsistent()
+
+    def test_reassign_type_moves_whole_chain(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('type_delete', args=[self.type.pk]), {'target': self.income_subcategory.pk})
+        # Ветка удаляется одним DELETE на таблицу, без выборки строк коллектором
+        sql = [q['sql'] for q in queries.captured_queries]
+        self.assertFalse([q for q in sql if q.startswith('SELECT') and ('"DDSPosts_category"' in q or '"DDSPosts_subcategory"' in q)])
+        deleted = [q.split()[2] for q in sql if q.startswith('DELETE') and 'dailycashflow"."id" IN' not in q]
+        self.assertEqual(deleted, ['"DDSPosts_dailycashflow"', '"DDSPosts_subcategory"', '"DDSPosts_category"', '"DDSPosts_type"'])
+        self.assertFalse(Type.objects.filter(pk=self.type.pk).exists())
+        self.assertEqual(set(Transaction.objects.values_list('operation_id', 'category_id', 'subcategory_id')),
+                         {(self.other_type.pk, self.income_category.pk, self.income_subcategory.pk)})
+        self.assertEqual(search_transactions(Transaction.objects.all(), 'оплата').count(), 10)
+        self.assertRollupsConsistent()
+
+    def test_target_inside_deleted_branch_rejected(self):
+        response = self.client.post(reverse('category_delete', args=[self.category.pk]),
+                                    {'target': self.subcategory.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].errors)
+        self.assertEqual(Transaction.objects.filter(category=self.category).count(), 5)
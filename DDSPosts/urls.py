@@ -2,37 +2,65 @@
 URL-маршруты.
 
 Включает:
-- Основные страницы (главная, создание, редактирование, удаление транзакции)
-- AJAX-запросы для динамической подгрузки категорий/подкатегорий
+- Основные страницы (главная, создание, пакетный ввод, редактирование, удаление транзакции, выгрузка, сводка, отчёт)
+- AJAX-запросы для динамической подгрузки категорий/подкатегорий и дерева справочников
 - Панель управления справочниками и действия с ними
+- Метрики запросов (/metrics/)
+- JSON API транзакций (/api/, см. api.py)
+- Фоновые задачи: постановка, состояние, скачивание результата (/jobs/)
+
+При DDS_ASYNC_VIEWS = True представления для чтения (главная страница,
+AJAX-подгрузка, отчёт) заменяются асинхронными версиями из async_views.py —
+для запуска под ASGI-сервером.
 """
 
+from django.conf import settings
 from django.urls import path
+from . import async_views
+from .api import TransactionBulkCreateView, TransactionCollectionView, TransactionItemView
 from .views import (
     # Транзакции
-    TransactionListView, TransactionCreateView, TransactionUpdateView, TransactionDeleteView,
+    TransactionListView, TransactionCreateView, TransactionBatchCreateView, TransactionUpdateView,
+    TransactionDeleteView,
+    export_transactions, cashflow_summary, transaction_report,
     # AJAX-подгрузка
-    load_categories, load_subcategories,
+    load_categories, load_subcategories, load_dictionary_tree,
     # Справочники
     directory_panel,
+    # Метрики
+    metrics_view,
+    # Фоновые задачи
+    job_list, job_enqueue, job_detail, job_download,
     StatusCreateView, StatusUpdateView, StatusDeleteView,
     TypeCreateView, TypeUpdateView, TypeDeleteView,
     CategoryCreateView, CategoryUpdateView, CategoryDeleteView,
     SubcategoryCreateView, SubcategoryUpdateView, SubcategoryDeleteView
 )
 
-# Основные страницы: список, создание, редактирование, удаление транзакции
+if getattr(settings, 'DDS_ASYNC_VIEWS', False):
+    TransactionListView = async_views.AsyncTransactionListView
+    transaction_report = async_views.transaction_report
+    load_categories = async_views.load_categories
+    load_subcategories = async_views.load_subcategories
+    load_dictionary_tree = async_views.load_dictionary_tree
+
+# Основные страницы: список, создание, пакетный ввод, редактирование, удаление транзакции, выгрузка, сводка, отчёт
 urlpatterns = [
     path('', TransactionListView.as_view(), name='transaction_list'),  # Главная страница со списком транзакций
     path('create/', TransactionCreateView.as_view(), name='create'),   # Страница создания транзакции
+    path('create/batch/', TransactionBatchCreateView.as_view(), name='create_batch'),  # Пакетный ввод транзакций
     path('edit/<int:pk>/', TransactionUpdateView.as_view(), name='edit'),  # Страница редактирования транзакции
     path('delete/<int:pk>/', TransactionDeleteView.as_view(), name='delete'),  # Страница удаления транзакции
+    path('export/', export_transactions, name='export'),  # Выгрузка отфильтрованных транзакций в CSV/XLSX
+    path('summary/', cashflow_summary, name='cashflow_summary'),  # Сводка по дням/месяцам
+    path('report/', transaction_report, name='report'),  # Отчёт: поступления, списания, сальдо с подытогами
 ]
 
 # AJAX-запросы для динамического обновления категорий и подкатегорий
 urlpatterns += [
     path('ajax/load-categories/', load_categories, name='ajax_load_categories'),
     path('ajax/load-subcategories/', load_subcategories, name='ajax_load_subcategories'),
+    path('ajax/dictionary/', load_dictionary_tree, name='ajax_dictionary_tree'),  # JSON-дерево справочников
 ]
 
 # Панель управления справочниками и действия с ними
@@ -59,3 +87,23 @@ urlpatterns += [
     path('directories/subcategory/<int:pk>/edit/', SubcategoryUpdateView.as_view(), name='subcategory_edit'),
     path('directories/subcategory/<int:pk>/delete/', SubcategoryDeleteView.as_view(), name='subcategory_delete'),
 ]
+
+# Метрики в формате Prometheus
+urlpatterns += [
+    path('metrics/', metrics_view, name='metrics'),
+]
+
+# JSON API транзакций
+urlpatterns += [
+    path('api/transactions/', TransactionCollectionView.as_view(), name='api_transactions'),
+    path('api/transactions/bulk/', TransactionBulkCreateView.as_view(), name='api_transactions_bulk'),
+    path('api/transactions/<int:pk>/', TransactionItemView.as_view(), name='api_transaction'),
+]
+
+# Фоновые задачи (выполняются командой run_workers)
+urlpatterns += [
+    path('jobs/', job_list, name='job_list'),
+    path('jobs/<slug:kind>/enqueue/', job_enqueue, name='job_enqueue'),
+    path('jobs/<int:pk>/', job_detail, name='job_detail'),
+    path('jobs/<int:pk>/download/', job_download, name='job_download'),
+]
@@ -0,0 +1,59 @@
+"""
+Использование справочников транзакциями.
+
+Транзакции ссылаются на справочники с on_delete=PROTECT: сборщик удаления
+Django, чтобы отказать, сначала загружает в память все ссылающиеся
+транзакции. Поэтому перед удалением число ссылок проверяется одним COUNT
+по индексу (transaction_*_date_idx), а ссылки переносятся на другой
+справочник одним UPDATE (bulk.reassign_transactions).
+
+Число транзакций у каждого справочника для панели справочников считается
+по той же таблице транзакций, что и проверка перед удалением.
+
+Содержит:
+- TRANSACTION_FIELDS: справочник -> поле транзакции, которое на него ссылается
+- count_usage: число транзакций, ссылающихся на справочник (или на его ветвь)
+- usage_counts: число транзакций по каждому справочнику для панели
+- in_branch: относится ли подкатегория к ветви справочника
+"""
+
+from django.db.models import Count
+
+from .models import Category, Status, Subcategory, Transaction, Type
+
+TRANSACTION_FIELDS = {
+    Status: 'status',
+    Type: 'operation',
+    Category: 'category',
+    Subcategory: 'subcategory',
+}
+
+
+def count_usage(obj):
+    """
+    Число транзакций, ссылающихся на справочник obj. Цепочка транзакции
+    согласована, поэтому транзакции категорий типа и подкатегорий категории
+    ссылаются и на сам тип или категорию: хватает одного COUNT
+    """
+    return Transaction.objects.filter(**{TRANSACTION_FIELDS[type(obj)]: obj}).order_by().count()
+
+
+def usage_counts():
+    """
+    {'status' | 'operation' | 'category' | 'subcategory': {id: число транзакций}}
+    по таблице транзакций — так же, как count_usage на странице удаления:
+    по одной группировке на поле (по индексу transaction_*_date_idx)
+    """
+    return {
+        name: dict(Transaction.objects.order_by().values_list(name).annotate(used=Count('pk')))
+        for name in TRANSACTION_FIELDS.values()
+    }
+
+
+def in_branch(subcategory, obj):
+    """Относится ли подкатегория (из дерева справочников) к ветви типа, категории или подкатегории obj"""
+    if isinstance(obj, Type):
+        return subcategory.category.type_id == obj.pk
+    if isinstance(obj, Category):
+        return subcategory.category_id == obj.pk
+    return subcategory.pk == obj.pk
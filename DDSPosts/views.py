@@ -3,20 +3,93 @@
 
 Содержит:
 - Представления CRUD для справочников: Статус, Тип, Категория, Подкатегория
-- Представления для транзакций (создание, редактирование, удаление, список)
+  (удаление — с переносом транзакций на другой справочник)
+- Представления для транзакций (создание, пакетный ввод, редактирование, удаление, список, выгрузка)
 - Панель управления справочниками
-- AJAX-загрузку зависимых категорий и подкатегорий
+- Сводку движения средств по предрасчитанным дневным итогам
+- Отчёт о движении средств с подытогами (HTML и JSON)
+- AJAX-загрузку зависимых категорий и подкатегорий (HTML и JSON-дерево с ETag)
+- Метрики запросов в формате Prometheus
+- Фоновые задачи: постановка в очередь, состояние, скачивание результата
 """
 
-from django.views.generic import ListView, CreateView, UpdateView, DeleteView
-from django.shortcuts import render
-from django.urls import reverse_lazy
-from .models import Transaction, Type, Status, Category, Subcategory
-from .forms import TransactionForm, StatusForm, TypeForm, CategoryForm, SubcategoryForm
+import json
+import uuid
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth
+from django.http import (FileResponse, Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden,
+                         JsonResponse, StreamingHttpResponse)
+from django.utils import timezone
+from django.utils.cache import add_never_cache_headers
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import method_decorator
+from django.utils.http import urlencode
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET, require_POST
+from django.views.generic import ListView, CreateView, UpdateView, DeleteView, FormView
+from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
+from django.urls import reverse, reverse_lazy
+from .models import Transaction, TransactionListing, Type, Status, Category, Subcategory, DailyCashFlow, Job
+from .forms import (TransactionForm, StatusForm, TypeForm, CategoryForm, SubcategoryForm, DictionaryDeleteForm,
+                    StaleDictionaryError, create_transactions, row_errors, transaction_formset,
+                    validate_transaction_rows)
+from . import fragments, jobs, metrics
+from .bulk import delete_dictionary, reassign_transactions
+from .conditional import conditional_ledger, ledger_state
+from .dictionaries import get_dictionaries
+from .export import export_rows, stream_csv, stream_xlsx
+from .filters import get_filter_params, filter_transactions
+from .listing import use_listing
+from .pagination import CursorPaginator, InvalidCursor
+from .reports import cashflow_report
+from .rollups import filter_rollups
+from .search import SEARCH_PARAM
+from .usage import count_usage, usage_counts
 
 
 # ---------- СПРАВОЧНИКИ ----------
 
+class DictionaryDeleteView(DeleteView):
+    """
+    Удаление справочника. Ссылки транзакций проверяются одним COUNT; если
+    они есть, транзакции сначала переносятся на выбранный справочник одним
+    UPDATE. Затем справочник с ветвью удаляется по одному DELETE на таблицу
+    (bulk.delete_dictionary), без сборщика удаления Django.
+    """
+    form_class = DictionaryDeleteForm
+    success_url = reverse_lazy('directory_panel')
+
+    def get_object(self, queryset=None):
+        obj = super().get_object(queryset)
+        self.usage = count_usage(obj)
+        return obj
+
+    def get_form_kwargs(self):
+        return {**super().get_form_kwargs(), 'instance': self.object, 'usage': self.usage}
+
+    def get_context_data(self, **kwargs):
+        return super().get_context_data(usage=self.usage, **kwargs)
+
+    def form_valid(self, form):
+        target = form.cleaned_data['target']
+        try:
+            with transaction.atomic():
+                if target is not None:
+                    reassign_transactions(self.object, target)
+                delete_dictionary(self.object)
+        except IntegrityError:
+            # Транзакция добавлена после проверки
+            form.add_error('target', 'Справочник используется в транзакциях: выберите, куда их перенести.')
+            return self.form_invalid(form)
+        return redirect(self.get_success_url())
+
+
 class StatusCreateView(CreateView):
     """Создание статуса"""
     model = Status
@@ -33,11 +106,10 @@ class StatusUpdateView(UpdateView):
     success_url = reverse_lazy('directory_panel')
 
 
-class StatusDeleteView(DeleteView):
+class StatusDeleteView(DictionaryDeleteView):
     """Удаление статуса"""
     model = Status
     template_name = 'DDSPosts/status_confirm_delete.html'
-    success_url = reverse_lazy('directory_panel')
 
 
 class TypeCreateView(CreateView):
@@ -56,11 +128,10 @@ class TypeUpdateView(UpdateView):
     success_url = reverse_lazy('directory_panel')
 
 
-class TypeDeleteView(DeleteView):
+class TypeDeleteView(DictionaryDeleteView):
     """Удаление типа операции"""
     model = Type
     template_name = 'DDSPosts/type_confirm_delete.html'
-    success_url = reverse_lazy('directory_panel')
 
 
 class CategoryCreateView(CreateView):
@@ -79,11 +150,10 @@ class CategoryUpdateView(UpdateView):
     success_url = reverse_lazy('directory_panel')
 
 
-class CategoryDeleteView(DeleteView):
+class CategoryDeleteView(DictionaryDeleteView):
     """Удаление категории"""
     model = Category
     template_name = 'DDSPosts/category_confirm_delete.html'
-    success_url = reverse_lazy('directory_panel')
 
 
 class SubcategoryCreateView(CreateView):
@@ -102,34 +172,45 @@ class SubcategoryUpdateView(UpdateView):
     success_url = reverse_lazy('directory_panel')
 
 
-class SubcategoryDeleteView(DeleteView):
+class SubcategoryDeleteView(DictionaryDeleteView):
     """Удаление подкатегории"""
     model = Subcategory
     template_name = 'DDSPosts/subcategory_confirm_delete.html'
-    success_url = reverse_lazy('directory_panel')
 
 
 def directory_panel(request):
     """
     Панель управления справочниками:
-    отображает все статусы, типы, категории и подкатегории.
+    отображает все статусы, типы, категории и подкатегории
+    с числом транзакций у каждого.
     """
-    statuses = Status.objects.all()
-    types = Type.objects.all()
-    categories = Category.objects.select_related('type')
-    subcategories = Subcategory.objects.select_related('category')
+    tree = get_dictionaries()
+    counts = usage_counts()
+
+    def with_usage(objs, field):
+        return [(obj, counts[field].get(obj.pk, 0)) for obj in objs]
 
     return render(request, 'DDSPosts/directory_panel.html', {
-        'statuses': statuses,
-        'types': types,
-        'categories': categories,
-        'subcategories': subcategories,
+        'statuses': with_usage(tree.statuses, 'status'),
+        'types': with_usage(tree.types, 'operation'),
+        'categories': with_usage(tree.categories, 'category'),
+        'subcategories': with_usage(tree.subcategories, 'subcategory'),
     })
 
 
 # ---------- ТРАНЗАКЦИИ ----------
 
-class TransactionCreateView(CreateView):
+class TransactionFormMixin:
+    """Справочник удалён после загрузки кэша — форма с ошибкой поля вместо 500"""
+
+    def form_valid(self, form):
+        try:
+            return super().form_valid(form)
+        except StaleDictionaryError:
+            return self.form_invalid(form)
+
+
+class TransactionCreateView(TransactionFormMixin, CreateView):
     """Создание новой транзакции"""
     model = Transaction
     form_class = TransactionForm
@@ -137,7 +218,77 @@ class TransactionCreateView(CreateView):
     success_url = reverse_lazy('transaction_list')
 
 
-class TransactionUpdateView(UpdateView):
+class TransactionBatchCreateView(FormView):
+    """
+    Пакетный ввод: много транзакций одним запросом.
+
+    HTML — таблица строк (набор форм TransactionForm), JSON — массив
+    объектов с полями той же формы. Все строки проверяются по одному дереву
+    справочников. Если все корректны, они вставляются одним bulk_create в
+    одной транзакции БД; иначе не вставляется ни одна, а ошибки
+    возвращаются по строкам.
+    """
+    template_name = 'DDSPosts/create_batch.html'
+    success_url = reverse_lazy('transaction_list')
+    extra_rows = 5
+
+    def get_max_rows(self):
+        return getattr(settings, 'DDS_BATCH_MAX_ROWS', 500)
+
+    def get_form_class(self):
+        return transaction_formset(self.extra_rows, self.get_max_rows())
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['form_kwargs'] = {'tree': get_dictionaries()}
+        return kwargs
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['formset'] = context.pop('form')
+        return context
+
+    def form_valid(self, formset):
+        try:
+            create_transactions([form for form in formset if form.has_changed()])
+        except StaleDictionaryError:
+            return self.form_invalid(formset)
+        return super().form_valid(formset)
+
+    def post(self, request, *args, **kwargs):
+        if request.content_type == 'application/json':
+            return self.post_json(request)
+        return super().post(request, *args, **kwargs)
+
+    def post_json(self, request):
+        """
+        JSON-массив строк. Ответ: 201 и {"created": [id, ...]} или 400 и
+        {"errors": [{"row": номер, "errors": ошибки полей}, ...]}
+        """
+        try:
+            rows = json.loads(request.body)
+        except ValueError:
+            return self.json_error('Некорректный JSON')
+        if not isinstance(rows, list) or not rows:
+            return self.json_error('Ожидался непустой массив строк')
+        if len(rows) > self.get_max_rows():
+            return self.json_error(f'Не больше {self.get_max_rows()} строк за запрос')
+
+        forms, errors = validate_transaction_rows(rows)
+        if not errors:
+            try:
+                created = create_transactions(forms)
+            except StaleDictionaryError:
+                errors = row_errors(forms)
+        if errors:
+            return JsonResponse({'errors': errors}, status=400, json_dumps_params={'ensure_ascii': False})
+        return JsonResponse({'created': [obj.pk for obj in created]}, status=201)
+
+    def json_error(self, message):
+        return JsonResponse({'error': message}, status=400, json_dumps_params={'ensure_ascii': False})
+
+
+class TransactionUpdateView(TransactionFormMixin, UpdateView):
     """Редактирование транзакции"""
     model = Transaction
     form_class = TransactionForm
@@ -152,44 +303,260 @@ class TransactionDeleteView(DeleteView):
     success_url = reverse_lazy('transaction_list')
 
 
+@method_decorator(conditional_ledger, name='get')
 class TransactionListView(ListView):
-    """Главная страница: список транзакций с фильтрацией"""
+    """
+    Главная страница: список транзакций с фильтрацией.
+
+    Поддерживает два режима пагинации: обычный (OFFSET, ?page=N) и курсорный
+    (?cursor=<токен>), который включается настройкой DDS_CURSOR_PAGINATION
+    или наличием параметра cursor в запросе.
+
+    При поиске по комментарию (?q=) результаты упорядочены по релевантности
+    и листаются постранично: курсор по (-date, -id) к ним неприменим.
+
+    Отрисованная таблица с пагинацией кэшируется по фильтрам, странице и
+    версии журнала (см. fragments.py). Условные запросы (If-None-Match,
+    If-Modified-Since) получают 304 без отрисовки и запросов к БД (см. conditional.py).
+    """
     model = Transaction
     template_name = 'base.html'
+    table_template_name = 'DDSPosts/transaction_table.html'
     context_object_name = 'transactions'
     paginate_by = 25
 
+    def get_filters(self):
+        """Активные фильтры из GET-параметров"""
+        return get_filter_params(self.request.GET)
+
     def get_queryset(self):
-        """Фильтрация по параметрам из формы"""
-        qs = super().get_queryset()
-        filters = self.request.GET
+        """
+        Фильтрация по параметрам из формы. При DDS_LISTING_READ_MODEL список
+        без поиска читается из витрины TransactionListing, без JOIN (см. listing.py)
+        """
+        if use_listing(self.get_filters()):
+            return filter_transactions(TransactionListing.objects.all(), self.get_filters())
+        qs = super().get_queryset().for_listing()
+        qs = filter_transactions(qs, self.get_filters())
+        if self.is_search():
+            qs = qs.order_by('-search_rank', '-date', '-id')
+        return qs
 
-        if filters.get('date'):
-            qs = qs.filter(date=filters['date'])
+    def is_search(self):
+        """Задан ли поиск по комментарию"""
+        return SEARCH_PARAM in self.get_filters()
+
+    def use_cursor_pagination(self):
+        """Включён ли курсорный режим пагинации"""
+        if self.is_search():
+            return False
+        return 'cursor' in self.request.GET or getattr(settings, 'DDS_CURSOR_PAGINATION', False)
+
+    def get_cursor_paginator(self, queryset, page_size):
+        """Курсорный пагинатор для текущих фильтров"""
+        with_count = bool(self.request.GET.get('count')) or getattr(settings, 'DDS_CURSOR_WITH_COUNT', False)
+        return CursorPaginator(
+            queryset,
+            page_size,
+            fingerprint=urlencode(self.get_filters()),
+            with_count=with_count,
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        """Курсорная пагинация по (-date, -id) без общего COUNT(*)"""
+        if not self.use_cursor_pagination():
+            return super().paginate_queryset(queryset, page_size)
+
+        paginator = self.get_cursor_paginator(queryset, page_size)
+        try:
+            page = paginator.page(self.request.GET.get('cursor'))
+        except InvalidCursor as e:
+            raise Http404(str(e))
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_page_context(self, tree):
+        """Фильтры и справочники для шаблона"""
+        return {
+            'types': tree.types,
+            'statuses': tree.statuses,
+            'categories': tree.categories,
+            'subcategories': tree.subcategories,
+            'filters': self.request.GET,
+            'filter_query': urlencode(self.get_filters()),
+            'cursor_pagination': self.use_cursor_pagination(),
+        }
+
+    def get_fragment_key(self):
+        """Ключ кэша таблицы: фильтры, страница или курсор, параметры пагинации"""
+        cursor_pagination = self.use_cursor_pagination()
+        return fragments.fragment_key(
+            filters=urlencode(self.get_filters()),
+            per_page=self.paginate_by,
+            cursor_pagination=cursor_pagination,
+            cursor=self.request.GET.get('cursor') if cursor_pagination else None,
+            count=self.request.GET.get('count') if cursor_pagination else None,
+            page=None if cursor_pagination else (
+                self.kwargs.get(self.page_kwarg) or self.request.GET.get(self.page_kwarg) or 1),
+        )
+
+    def get_table_context(self, paginator, page, object_list, is_paginated):
+        """Контекст фрагмента таблицы; запоминается для контекста всей страницы"""
+        self.table_context = {
+            'paginator': paginator,
+            'page_obj': page,
+            'is_paginated': is_paginated,
+            'object_list': object_list,
+            self.get_context_object_name(object_list): object_list,
+        }
+        return {
+            **self.table_context,
+            'filter_query': urlencode(self.get_filters()),
+            'cursor_pagination': self.use_cursor_pagination(),
+        }
+
+    def render_table(self):
+        """Отрисовка таблицы и пагинации текущей страницы"""
+        table_context = self.get_table_context(
+            *self.paginate_queryset(self.object_list, self.get_paginate_by(self.object_list))
+        )
+        return render_to_string(self.table_template_name, table_context, self.request)
+
+    def table_response(self, table, tree, revalidate=None):
+        """Страница с готовой таблицей; revalidate выполняется после отправки ответа"""
+        context = {
+            'view': self,
+            'transaction_table': table,
+            **self.get_page_context(tree),
+            **self.table_context,
+        }
+        response = self.render_to_response(context)
+        if revalidate is not None:
+            # Закрывающие функции ответа вызываются сервером после отправки тела
+            response._resource_closers.append(revalidate)
+            # Устаревшую таблицу не сохранять у клиента: её ETag уже указывает
+            # на новое состояние, и следующий запрос получил бы 304
+            add_never_cache_headers(response)
+        return response
+
+    def get(self, request, *args, **kwargs):
+        """
+        Таблица берётся из кэша фрагментов (см. fragments.py); при попадании
+        транзакции из БД не читаются, в контексте страницы нет page_obj
+        """
+        self.object_list = self.get_queryset()
+        self.table_context = {}
+        table, revalidate = fragments.cached_fragment(
+            self.get_fragment_key(), self.render_table, ledger_state(request)
+        )
+        return self.table_response(table, get_dictionaries(), revalidate)
+
+
+EXPORT_FORMATS = {
+    'csv': (stream_csv, 'text/csv; charset=utf-8'),
+    'xlsx': (stream_xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+
+@require_GET
+@conditional_ledger
+def export_transactions(request):
+    """
+    Выгрузка всех транзакций, подходящих под фильтры главной страницы,
+    в CSV (?format=csv, по умолчанию) или XLSX (?format=xlsx).
+    Ответ формируется потоково.
+    """
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        raise Http404('Неизвестный формат выгрузки')
+    stream, content_type = EXPORT_FORMATS[fmt]
 
-        if filters.get('status'):
-            qs = qs.filter(status__id=filters['status'])
+    rows = export_rows(get_filter_params(request.GET))
+    response = StreamingHttpResponse(stream(rows), content_type=content_type)
+    filename = f'transactions-{timezone.localdate():%Y%m%d}.{fmt}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
-        if filters.get('type'):
-            qs = qs.filter(operation__id=filters['type'])
 
-        if filters.get('category'):
-            qs = qs.filter(category__id=filters['category'])
+# ---------- СВОДКИ ----------
 
-        if filters.get('subcategory'):
-            qs = qs.filter(subcategory__id=filters['subcategory'])
+# Группировка сводки: параметр ?by= -> (поле DailyCashFlow, справочник в дереве, заголовок)
+SUMMARY_GROUPS = {
+    'type': ('operation_id', 'type_by_id', 'Тип'),
+    'category': ('category_id', 'category_by_id', 'Категория'),
+    'subcategory': ('subcategory_id', 'subcategory_by_id', 'Подкатегория'),
+    'status': ('status_id', 'status_by_id', 'Статус'),
+}
 
-        return qs
+# Период сводки: параметр ?period= -> выражение над днём
+SUMMARY_PERIODS = {
+    'day': lambda: F('day'),
+    'month': lambda: TruncMonth('day'),
+}
+
+
+def cashflow_summary(request):
+    """
+    Сводка движения средств по дням или месяцам, с разбивкой по типу,
+    категории, подкатегории или статусу. Читает только предрасчитанные
+    дневные сводки DailyCashFlow, таблицу транзакций не затрагивает.
+    """
+    filters = get_filter_params(request.GET)
+    period = request.GET.get('period') if request.GET.get('period') in SUMMARY_PERIODS else 'month'
+    by = request.GET.get('by') if request.GET.get('by') in SUMMARY_GROUPS else None
+
+    fields = ['period']
+    if by:
+        fields.append(SUMMARY_GROUPS[by][0])
+    rows = list(
+        filter_rollups(DailyCashFlow.objects.order_by(), filters)
+        .annotate(period=SUMMARY_PERIODS[period]())
+        .values(*fields)
+        .annotate(total=Sum('total'), count=Sum('count'))
+        .order_by('-period', *fields[1:])
+    )
+
+    # Названия справочников — из кэша, без JOIN
+    tree = get_dictionaries()
+    if by:
+        field, index, _ = SUMMARY_GROUPS[by]
+        names = getattr(tree, index)
+        for row in rows:
+            row['name'] = names[row[field]].name if row[field] in names else '—'
+
+    return render(request, 'DDSPosts/cashflow_summary.html', {
+        'rows': rows,
+        'total': sum((row['total'] for row in rows), Decimal(0)),
+        'count': sum(row['count'] for row in rows),
+        'period': period,
+        'by': by,
+        'group_title': SUMMARY_GROUPS[by][2] if by else None,
+        'filters': request.GET,
+        'types': tree.types,
+        'statuses': tree.statuses,
+    })
 
-    def get_context_data(self, **kwargs):
-        """Добавляет фильтры и справочники в контекст шаблона"""
-        context = super().get_context_data(**kwargs)
-        context['types'] = Type.objects.all()
-        context['statuses'] = Status.objects.all()
-        context['categories'] = Category.objects.all()
-        context['subcategories'] = Subcategory.objects.all()
-        context['filters'] = self.request.GET
-        return context
+
+@conditional_ledger
+def transaction_report(request):
+    """
+    Отчёт о движении средств по фильтрам главной страницы: поступления,
+    списания и сальдо с подытогами по типу, категории и подкатегории.
+    ?format=json — тот же отчёт в JSON.
+    """
+    return report_response(request, cashflow_report(get_filter_params(request.GET)), get_dictionaries())
+
+
+def report_response(request, report, tree):
+    """Ответ с отчётом: HTML или JSON (?format=json)"""
+    if request.GET.get('format') == 'json':
+        return JsonResponse(report.as_data(), json_dumps_params={'ensure_ascii': False})
+    return render(request, 'DDSPosts/report.html', {
+        'report': report,
+        'filters': request.GET,
+        'json_query': urlencode({**get_filter_params(request.GET), 'format': 'json'}),
+        'types': tree.types,
+        'statuses': tree.statuses,
+    })
 
 
 # ---------- AJAX каскадная фильтрация ----------
@@ -198,8 +565,7 @@ def load_categories(request):
     """
     AJAX: возвращает категории, связанные с выбранным типом
     """
-    type_id = request.GET.get('type_id')
-    categories = Category.objects.filter(type_id=type_id).order_by('name')
+    categories = get_dictionaries().categories_of(request.GET.get('type_id'))
     return render(request, 'DDSPosts/dropdown_category.html', {'categories': categories})
 
 
@@ -207,6 +573,149 @@ def load_subcategories(request):
     """
     AJAX: возвращает подкатегории, связанные с выбранной категорией
     """
-    category_id = request.GET.get('category_id')
-    subcategories = Subcategory.objects.filter(category_id=category_id).order_by('name')
+    subcategories = get_dictionaries().subcategories_of(request.GET.get('category_id'))
     return render(request, 'DDSPosts/dropdown_subcategory.html', {'subcategories': subcategories})
+
+
+def dictionary_branch(request):
+    """Запрошенная ветвь дерева справочников: (type_id, category_id)"""
+    return request.GET.get('type_id'), request.GET.get('category_id')
+
+
+def _dictionary_etag(request):
+    """
+    Строгий ETag дерева справочников: версия справочников и ветвь.
+    Вычисляется без обращения к БД.
+    """
+    return dictionary_branch_etag(request, get_dictionaries().version)
+
+
+def dictionary_branch_etag(request, version):
+    """ETag запрошенной ветви дерева справочников версии version"""
+    if version is None:
+        return None
+    type_id, category_id = dictionary_branch(request)
+    if category_id is not None:
+        return f'{version}-c{category_id}'
+    if type_id is not None:
+        return f'{version}-t{type_id}'
+    return f'{version}-all'
+
+
+@require_GET
+@cache_control(public=True, max_age=getattr(settings, 'DDS_DICTIONARY_MAX_AGE', 60))
+@condition(etag_func=_dictionary_etag)
+def load_dictionary_tree(request):
+    """
+    AJAX: дерево справочников в JSON.
+
+    Без параметров — статусы и все типы с категориями и подкатегориями,
+    ?type_id= — категории типа, ?category_id= — подкатегории категории.
+    Ответ снабжается ETag; при совпадении If-None-Match возвращается 304.
+    """
+    type_id, category_id = dictionary_branch(request)
+    data = get_dictionaries().as_data(type_id=type_id, category_id=category_id)
+    return JsonResponse(data, json_dumps_params={'ensure_ascii': False})
+
+
+# ---------- Метрики ----------
+
+@require_GET
+def metrics_view(request):
+    """
+    Метрики процесса в текстовом формате Prometheus. Если задан
+    DDS_METRICS_TOKEN, требуется заголовок Authorization: Bearer <токен>.
+    """
+    token = getattr(settings, 'DDS_METRICS_TOKEN', '')
+    if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.export(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# ---------- Фоновые задачи ----------
+
+def job_list(request):
+    """Последние фоновые задачи и формы постановки новых"""
+    return render(request, 'DDSPosts/jobs.html', {'jobs': Job.objects.all()[:20]})
+
+
+def job_data(job):
+    """Состояние задачи для JSON-ответа и опроса со страницы"""
+    data = {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'finished': job.finished,
+        'progress': job.progress,
+        'total': job.total,
+        'percent': job.percent,
+        'message': job.message,
+        'attempts': job.attempts,
+        'result': job.result,
+        'created_at': job.created_at,
+        'finished_at': job.finished_at,
+        'download_url': None,
+    }
+    if job.status == Job.DONE and job.kind == 'export':
+        data['download_url'] = reverse('job_download', args=[job.pk])
+    return data
+
+
+@require_POST
+def job_enqueue(request, kind):
+    """
+    Ставит задачу в очередь и отвечает сразу; выполняет её run_workers:
+    - export: выгрузка по фильтрам из строки запроса (?format=csv|xlsx);
+    - import: загруженный файл CSV или JSONL (поле file);
+    - rebuild: пересчёт дневных сводок и витрины списка.
+    JSON-клиенты (Accept: application/json) получают 202 и состояние задачи,
+    остальные — перенаправление на страницу задачи.
+    """
+    if kind == 'export':
+        fmt = request.GET.get('format', 'csv')
+        if fmt not in EXPORT_FORMATS:
+            raise Http404('Неизвестный формат выгрузки')
+        job = jobs.enqueue('export', filters=get_filter_params(request.GET), format=fmt)
+    elif kind == 'import':
+        upload = request.FILES.get('file')
+        if upload is None:
+            return HttpResponseBadRequest('Не выбран файл')
+        suffix = '.jsonl' if upload.name.endswith(('.jsonl', '.ndjson')) else '.csv'
+        name = f'import-{uuid.uuid4().hex}{suffix}'
+        with open(jobs.result_dir() / name, 'wb') as f:
+            for chunk in upload.chunks():
+                f.write(chunk)
+        job = jobs.enqueue('import', file=name)
+    elif kind == 'rebuild':
+        job = jobs.enqueue('rebuild')
+    else:
+        raise Http404('Неизвестная задача')
+
+    url = reverse('job_detail', args=[job.pk])
+    if 'application/json' in request.headers.get('Accept', ''):
+        response = JsonResponse(job_data(job), status=202, json_dumps_params={'ensure_ascii': False})
+        response['Location'] = url
+        return response
+    return redirect(url)
+
+
+@require_GET
+def job_detail(request, pk):
+    """Страница задачи с опросом состояния; ?format=json — состояние в JSON"""
+    job = get_object_or_404(Job, pk=pk)
+    if request.GET.get('format') == 'json':
+        return JsonResponse(job_data(job), json_dumps_params={'ensure_ascii': False})
+    return render(request, 'DDSPosts/job.html', {'job': job})
+
+
+@require_GET
+def job_download(request, pk):
+    """Файл выгрузки, подготовленный задачей export"""
+    job = get_object_or_404(Job, pk=pk, kind='export', status=Job.DONE)
+    path = jobs.result_dir() / Path(job.result['file']).name
+    if not path.exists():
+        raise Http404('Файл выгрузки удалён')
+    fmt = job.params.get('format', 'csv')
+    return FileResponse(open(path, 'rb'), as_attachment=True, content_type=EXPORT_FORMATS[fmt][1],
+                        filename=f'transactions-{timezone.localtime(job.created_at):%Y%m%d}-{job.pk}.{fmt}')